@@ -0,0 +1,101 @@
+"""
+Load benchmark so sánh chế độ Flask (python trading_api.py) và ASGI (uvicorn trading_api_asgi:app).
+
+Trong lúc có N client liên tục gọi các endpoint đọc chậm (balance, trades), benchmark gửi tín hiệu
+theo nhịp cố định và đo độ trễ của tín hiệu cùng throughput của các request đọc.
+
+Cách chạy (hai server chạy song song, cùng cấu hình .env, nên trỏ tới testnet hoặc mock):
+    python trading_api.py                                        # PORT=5234
+    uvicorn trading_api_asgi:app --port 5235
+    python benchmarks/bench_api_modes.py \\
+        --target flask=http://localhost:5234 --target asgi=http://localhost:5235 \\
+        --readers 32 --duration 30
+
+Mặc định tín hiệu là POST /api/v1/order_ema với body rỗng (trả 400 sau bước kiểm tra) để không
+đặt lệnh thật; truyền --signal-body signal.json để đo toàn bộ đường đặt lệnh.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+READ_PATHS = ['/api/v1/balance', '/api/v1/trades?status=all']
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] * 1000
+
+
+async def reader(client: httpx.AsyncClient, base_url: str, deadline: float, stats: dict):
+    index = 0
+    while time.monotonic() < deadline:
+        path = READ_PATHS[index % len(READ_PATHS)]
+        index += 1
+        started = time.monotonic()
+        try:
+            await client.get(base_url + path)
+            stats['read_latencies'].append(time.monotonic() - started)
+        except httpx.HTTPError:
+            stats['read_errors'] += 1
+
+
+async def signaller(client: httpx.AsyncClient, base_url: str, path: str, body: dict,
+                    interval: float, deadline: float, stats: dict):
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            await client.post(base_url + path, json=body)
+            stats['signal_latencies'].append(time.monotonic() - started)
+        except httpx.HTTPError:
+            stats['signal_errors'] += 1
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+async def run_target(base_url: str, args, body: dict) -> dict:
+    stats = {'read_latencies': [], 'signal_latencies': [], 'read_errors': 0, 'signal_errors': 0}
+    limits = httpx.Limits(max_connections=args.readers + 4, max_keepalive_connections=args.readers + 4)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(
+            signaller(client, base_url, args.signal_path, body, args.signal_interval, deadline, stats),
+            *(reader(client, base_url, deadline, stats) for _ in range(args.readers))
+        )
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Flask vs ASGI serving modes')
+    parser.add_argument('--target', action='append', required=True, help='name=http://host:port')
+    parser.add_argument('--readers', type=int, default=32, help='Số client đọc đồng thời')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--signal-path', default='/api/v1/order_ema')
+    parser.add_argument('--signal-body', help='File JSON body của tín hiệu')
+    parser.add_argument('--signal-interval', type=float, default=0.5)
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    body = {}
+    if args.signal_body:
+        with open(args.signal_body, encoding='utf-8') as f:
+            body = json.load(f)
+
+    print(f"{'mode':<8} {'signal p50':>11} {'signal p99':>11} {'signal max':>11} {'reads/s':>9} {'read p99':>10} {'errors':>7}")
+    for target in args.target:
+        name, base_url = target.split('=', 1)
+        stats = asyncio.run(run_target(base_url.rstrip('/'), args, body))
+        signals = stats['signal_latencies']
+        reads = stats['read_latencies']
+        print(
+            f"{name:<8} {percentile(signals, 0.5):9.1f}ms {percentile(signals, 0.99):9.1f}ms "
+            f"{percentile(signals, 1.0):9.1f}ms {len(reads) / args.duration:9.1f} "
+            f"{percentile(reads, 0.99):8.1f}ms {stats['read_errors'] + stats['signal_errors']:7d}"
+        )
+
+
+if __name__ == '__main__':
+    main()
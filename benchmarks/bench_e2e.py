@@ -0,0 +1,181 @@
+"""
+Benchmark end-to-end TradingBot với sàn giả lập (mock_bybit.py), không gọi testnet.
+
+Đo:
+    signal -> order   từ lúc đưa tín hiệu vào bot.execute_signal tới lúc mock nhận request đặt
+                      lệnh entry (to_exchange) và tới lúc create_order_best trả về (to_result,
+                      gồm ghi MySQL)
+    fill -> TP        từ lúc mock khớp lệnh entry (đẩy sự kiện Filled qua private WebSocket) tới
+                      lúc mock nhận lệnh TP reduce-only đầu tiên của giao dịch
+    /api/v1/trades    throughput và độ trễ khi --clients client gọi đồng thời
+
+Bot dùng MySQL theo cấu hình .env (schema.sql + migrations) như khi chạy thật; tín hiệu của
+benchmark có bot_name 'bench'. Độ trễ mạng và lỗi của sàn đặt bằng các tham số của mock.
+
+Cách chạy:
+    python benchmarks/bench_e2e.py --signals 40 --latency 0.02 --jitter 0.01 --ws-latency 0.005 \\
+        --clients 16 --duration 10
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import requests
+from werkzeug.serving import make_server
+
+from mock_bybit import MockBybit
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] * 1000
+
+
+def report(name: str, values: list, extra: str = ''):
+    print(
+        f"{name:<24} {len(values):>6} {percentile(values, 0.5):9.1f}ms {percentile(values, 0.99):9.1f}ms "
+        f"{percentile(values, 1.0):9.1f}ms {extra}"
+    )
+
+
+def build_signal(mock: MockBybit, symbol: str) -> dict:
+    """Tín hiệu LONG với giá entry thấp hơn giá hiện tại 3% để lệnh Limit nằm chờ."""
+    price = float(mock.exchange.prices[symbol])
+    entry = price * 0.97
+    return {
+        'asset': symbol,
+        'position': 'LONG',
+        'entry1': entry,
+        'leverage': 10,
+        'tp1': entry * 1.02,
+        'tp2': entry * 1.04,
+        'tp3': entry * 1.06,
+        'stoploss': entry * 0.95,
+        'bot': 'bench'
+    }
+
+
+def bench_signal_to_order(bot, mock: MockBybit, count: int) -> dict:
+    """Gửi count tín hiệu xoay vòng qua các symbol, trả về orderId entry cuối cùng của mỗi symbol."""
+    symbols = list(mock.exchange.prices)
+    pending = []
+    for index in range(count):
+        symbol = symbols[index % len(symbols)]
+        started = time.monotonic()
+        future = bot.execute_signal(build_signal(mock, symbol), 'best')
+        done = {}
+        future.add_done_callback(lambda _, done=done: done.setdefault('at', time.monotonic()))
+        pending.append((symbol, started, future, done))
+
+    to_exchange, to_result, errors = [], [], 0
+    last_orders = {}
+    for symbol, started, future, done in pending:
+        result = future.result()
+        if 'error' in result:
+            errors += 1
+            continue
+        to_result.append(done['at'] - started)
+        to_exchange.append(mock.exchange.received_at[result['order_id']] - started)
+        last_orders[symbol] = result['order_id']
+
+    report('signal -> order (sàn)', to_exchange, f"errors={errors}")
+    report('signal -> order (xong)', to_result)
+    return last_orders
+
+
+def bench_fill_to_tp(mock: MockBybit, entry_orders: dict, timeout: float):
+    latencies, missing = [], 0
+    for symbol, order_id in entry_orders.items():
+        filled_at = mock.exchange.fill(order_id)
+        tp_order = mock.exchange.wait_for_order(
+            lambda order: order['symbol'] == symbol and order['reduceOnly']
+            and mock.exchange.received_at[order['orderId']] >= filled_at,
+            timeout=timeout
+        )
+        if tp_order is None:
+            missing += 1
+            continue
+        latencies.append(mock.exchange.received_at[tp_order['orderId']] - filled_at)
+    report('fill -> TP', latencies, f"missing={missing}")
+
+
+def bench_trades_api(app, clients: int, duration: float):
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api/v1/trades?status=all"
+
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                response = session.get(url, timeout=30)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            with lock:
+                if ok:
+                    latencies.append(time.monotonic() - started)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+    report('/api/v1/trades', latencies, f"{len(latencies) / duration:.1f} req/s, errors={errors[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end latency benchmark against mock Bybit')
+    parser.add_argument('--signals', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=0.02, help='Độ trễ REST của mock (giây)')
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--ws-latency', type=float, default=0.005)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--tp-timeout', type=float, default=10)
+    args = parser.parse_args()
+
+    mock = MockBybit(
+        latency=args.latency, jitter=args.jitter, ws_latency=args.ws_latency, error_rate=args.error_rate
+    ).start()
+    os.environ.update(mock.env())
+    # Không gửi API key thật tới mock
+    os.environ['BYBIT_API_KEY'] = 'mock'
+    os.environ['BYBIT_API_SECRET'] = 'mock'
+    os.environ['SIGNAL_INGEST'] = '0'
+
+    # trading_api khởi tạo bot và WebSocket khi import
+    import trading_api
+    bot = trading_api.bot
+    deadline = time.monotonic() + 30
+    while not bot.order_mirror.seeded and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+    print(f"mock: latency={args.latency}s jitter={args.jitter}s ws_latency={args.ws_latency}s error_rate={args.error_rate}")
+    print(f"{'scenario':<24} {'count':>6} {'p50':>11} {'p99':>11} {'max':>11}")
+    entry_orders = bench_signal_to_order(bot, mock, args.signals)
+    bench_fill_to_tp(mock, entry_orders, args.tp_timeout)
+    bench_trades_api(trading_api.app, args.clients, args.duration)
+
+    bot.running = False
+    mock.stop()
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark độ trễ mỗi lời gọi REST qua pybit: kết nối lạnh và kết nối ấm.
+
+Chạy một server giả lập Bybit cục bộ (HTTP/1.1 keep-alive) và so sánh:
+    cold    mỗi lời gọi dùng một client pybit mới (session mới: resolve DNS + mở kết nối TCP mới),
+            giống unified_client được tạo lười trước đây
+    warm    một client dùng transport chung (http_transport), bỏ qua lời gọi đầu tiên
+    shared  --threads luồng gọi đồng thời qua session mặc định của pybit (pool 10 kết nối)
+            và qua transport chung (pool --pool-size kết nối); đếm số kết nối server nhận
+
+Server cục bộ không có TLS nên chênh lệch cold/warm ở đây nhỏ hơn thực tế với api.bybit.com,
+nơi mỗi kết nối mới còn tốn thêm TLS handshake.
+
+Cách chạy:
+    python benchmarks/bench_http_transport.py --calls 500 --threads 16 --pool-size 24
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pybit.unified_trading import HTTP
+
+import http_transport
+
+TICKERS = json.dumps({
+    'retCode': 0,
+    'retMsg': 'OK',
+    'result': {'category': 'linear', 'list': [{'symbol': 'BTCUSDT', 'lastPrice': '65000.10'}]},
+    'time': 0
+}).encode('utf-8')
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Header và body gửi bằng hai lần write; tắt Nagle để không dính độ trễ delayed ACK 40ms
+    disable_nagle_algorithm = True
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with MockHandler.lock:
+            MockHandler.connections += 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(TICKERS)))
+        self.end_headers()
+        self.wfile.write(TICKERS)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_client(base_url: str, session=None) -> HTTP:
+    client = HTTP(testnet=True)
+    client.endpoint = base_url
+    if session is not None:
+        client.client = session
+    return client
+
+
+def timed_call(client: HTTP) -> float:
+    started = time.perf_counter()
+    client.get_tickers(category='linear', symbol='BTCUSDT')
+    return time.perf_counter() - started
+
+
+def summary(name: str, latencies: list, connections: int):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+    print(
+        f"{name:<16} {len(latencies):>6} {percentile(0.5):9.3f}ms {percentile(0.99):9.3f}ms "
+        f"{sum(latencies) / len(latencies) * 1000:9.3f}ms {connections:>6}"
+    )
+
+
+def run_concurrent(client: HTTP, threads: int, calls: int) -> list:
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(lambda _: timed_call(client), range(calls)))
+
+
+def measure(name: str, func):
+    before = MockHandler.connections
+    latencies = func()
+    summary(name, latencies, MockHandler.connections - before)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cold vs warm HTTP connections to a mock Bybit server')
+    parser.add_argument('--calls', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--pool-size', type=int, default=24)
+    args = parser.parse_args()
+
+    server = start_server()
+    # Dùng tên miền để lần kết nối mới phải resolve DNS như khi gọi sàn thật
+    base_url = f"http://localhost:{server.server_address[1]}"
+
+    shared = make_client(base_url, http_transport.create_session(pool_size=args.pool_size))
+    timed_call(shared)
+
+    print(f"{'mode':<16} {'calls':>6} {'p50':>11} {'p99':>11} {'mean':>11} {'conns':>6}")
+    measure('cold', lambda: [timed_call(make_client(base_url)) for _ in range(args.calls)])
+    measure('warm', lambda: [timed_call(shared) for _ in range(args.calls)])
+    measure(f'default x{args.threads}', lambda: run_concurrent(make_client(base_url), args.threads, args.calls))
+    measure(f'shared x{args.threads}', lambda: run_concurrent(shared, args.threads, args.calls))
+    print(f"transport: {http_transport.get_stats(shared.client)}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Benchmark tra cứu order_id -> trade trên bảng trades 1 triệu dòng.
+
+So sánh ba cách tra cứu mà handler order stream đã/đang dùng:
+    1. full_scan:   WHERE order_id = %s OR tp1_order_id = %s ... khi chưa có index
+    2. index_merge: cùng câu OR nhưng dùng các index idx_*order_id
+    3. point:       JOIN qua bảng trade_orders theo khóa chính order_id
+
+Cách chạy (cần MySQL, dùng cấu hình DB_* trong .env):
+    python benchmarks/bench_trade_orders.py --rows 1000000 --lookups 200
+"""
+import argparse
+import os
+import random
+import re
+import time
+import uuid
+
+import mysql.connector
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schema.sql')
+SYMBOLS = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'XRPUSDT', 'DOGEUSDT', 'LINKUSDT', 'DOTUSDT', 'LTCUSDT']
+
+OR_QUERY = """
+    SELECT id, symbol, side, quantity, entry_price,
+           tp1_price, tp2_price, tp3_price, order_id,
+           tp1_order_id, tp2_order_id, tp3_order_id, status,
+           current_sl, filled_at
+    FROM trades {hint}
+    WHERE order_id = %s
+       OR tp1_order_id = %s
+       OR tp2_order_id = %s
+       OR tp3_order_id = %s
+"""
+
+POINT_QUERY = """
+    SELECT t.id, t.symbol, t.side, t.quantity, t.entry_price,
+           t.tp1_price, t.tp2_price, t.tp3_price, t.order_id,
+           t.tp1_order_id, t.tp2_order_id, t.tp3_order_id, t.status,
+           t.current_sl, t.filled_at, o.leg
+    FROM trade_orders o
+    JOIN trades t ON t.id = o.trade_id
+    WHERE o.order_id = %s
+"""
+
+NO_INDEX_HINT = "IGNORE INDEX (idx_order_id, idx_tp1_order_id, idx_tp2_order_id, idx_tp3_order_id)"
+
+
+def connect(database=None):
+    """Kết nối MySQL theo cấu hình trong .env."""
+    config = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'user': os.getenv('DB_USER', 'homestead'),
+        'password': os.getenv('DB_PASSWORD', 'secret'),
+        'autocommit': True
+    }
+    if database:
+        config['database'] = database
+    return mysql.connector.connect(**config)
+
+
+def create_schema(database: str):
+    """Tạo database benchmark từ schema.sql."""
+    with open(SCHEMA_PATH, encoding='utf-8') as f:
+        schema = f.read().replace('`auto_trader`', f'`{database}`')
+    schema = re.sub(r'--[^\n]*', '', schema)
+
+    connection = connect()
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    for statement in schema.split(';'):
+        if statement.strip():
+            cursor.execute(statement)
+    cursor.close()
+    connection.close()
+
+
+def seed(database: str, rows: int, batch_size: int = 10000) -> list:
+    """Sinh dữ liệu giao dịch giả lập, trả về mẫu các order_id để tra cứu."""
+    connection = connect(database)
+    cursor = connection.cursor()
+    samples = []
+    insert_query = """
+        INSERT INTO trades (
+            order_id, symbol, side, entry_price, quantity, position_size, leverage,
+            tp1_price, tp2_price, tp3_price, sl_price, current_sl, current_tp,
+            strategy_type, status, bot_name, tp1_order_id, tp2_order_id
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    started = time.time()
+    for offset in range(0, rows, batch_size):
+        batch = []
+        for _ in range(min(batch_size, rows - offset)):
+            entry = random.uniform(1, 1000)
+            order_ids = [str(uuid.uuid4()) for _ in range(3)]
+            batch.append((
+                order_ids[0], random.choice(SYMBOLS), random.choice(['Buy', 'Sell']), entry, 1, 300, 10,
+                entry * 1.01, entry * 1.02, entry * 1.03, entry * 0.99, entry * 0.99, entry * 1.01,
+                'strategy1', random.choice(['OPEN', 'FILLED', 'CANCELLED', 'CLOSED', 'TP1_HIT']), 'bestsignal',
+                order_ids[1], order_ids[2]
+            ))
+            if random.random() < 0.001:
+                samples.append(random.choice(order_ids))
+        cursor.executemany(insert_query, batch)
+        print(f"Seeded {offset + len(batch)}/{rows} trades ({time.time() - started:.1f}s)")
+
+    # Giống migrations/001_trade_orders.sql
+    for column, leg in (('order_id', 'entry'), ('tp1_order_id', 'tp1'), ('tp2_order_id', 'tp2')):
+        cursor.execute(
+            f"INSERT IGNORE INTO trade_orders (order_id, trade_id, leg) "
+            f"SELECT {column}, id, '{leg}' FROM trades WHERE {column} IS NOT NULL"
+        )
+    cursor.execute("ANALYZE TABLE trades, trade_orders")
+    cursor.fetchall()
+    cursor.close()
+    connection.close()
+    return samples
+
+
+def measure(cursor, query: str, params_list: list) -> dict:
+    """Chạy query với từng bộ tham số, trả về độ trễ p50/p99/max (ms)."""
+    durations = []
+    for params in params_list:
+        started = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        durations.append((time.perf_counter() - started) * 1000)
+    durations.sort()
+    return {
+        'p50': durations[len(durations) // 2],
+        'p99': durations[min(len(durations) - 1, int(len(durations) * 0.99))],
+        'max': durations[-1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark order_id -> trade lookup')
+    parser.add_argument('--database', default=os.getenv('BENCH_DB_NAME', 'auto_trader_bench'))
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--scan-lookups', type=int, default=10, help='Số lần chạy full scan (rất chậm)')
+    args = parser.parse_args()
+
+    create_schema(args.database)
+    samples = seed(args.database, args.rows)
+    # Thêm các order_id không tồn tại (lệnh thủ công, lệnh đóng vị thế)
+    samples += [str(uuid.uuid4()) for _ in range(len(samples) // 4)]
+    random.shuffle(samples)
+    samples = samples[:args.lookups]
+
+    connection = connect(args.database)
+    cursor = connection.cursor()
+    results = {
+        'full_scan': measure(cursor, OR_QUERY.format(hint=NO_INDEX_HINT), [(s, s, s, s) for s in samples[:args.scan_lookups]]),
+        'index_merge': measure(cursor, OR_QUERY.format(hint=''), [(s, s, s, s) for s in samples]),
+        'point': measure(cursor, POINT_QUERY, [(s,) for s in samples])
+    }
+    cursor.close()
+    connection.close()
+
+    print(f"\nLookup latency on {args.rows} trades (ms)")
+    for name, stats in results.items():
+        print(f"{name:<12} p50={stats['p50']:9.3f}  p99={stats['p99']:9.3f}  max={stats['max']:9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Microbenchmark kiểm tra ngưỡng TP/SL mỗi tick với nhiều giao dịch mở trên cùng một symbol.
+
+So sánh:
+    1. linear: duyệt toàn bộ giao dịch của symbol và gọi PositionManager.crossed
+    2. index:  TriggerIndex.crossed (bisect) rồi chỉ kiểm tra lại các giao dịch bị vượt ngưỡng
+
+Cách chạy (không cần MySQL/Bybit, chỉ cần cài requirements.txt):
+    python benchmarks/bench_trigger_index.py --trades 10000 --ticks 20000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trading_bot import PositionManager, TriggerIndex  # noqa: E402
+
+SYMBOL = 'BTCUSDT'
+
+
+def make_trades(count: int, price: float) -> list:
+    """Sinh giao dịch với ngưỡng rải quanh giá hiện tại, đủ các trạng thái FILLED/TP1_HIT/TP2_HIT."""
+    trades = []
+    for trade_id in range(1, count + 1):
+        side = random.choice(['Buy', 'Sell'])
+        entry = price * random.uniform(0.995, 1.005)
+        sign = 1 if side == 'Buy' else -1
+        trades.append({
+            'id': trade_id,
+            'symbol': SYMBOL,
+            'side': side,
+            'status': random.choice(['FILLED', 'FILLED', 'TP1_HIT', 'TP2_HIT']),
+            'filled_at': datetime.now(),
+            'entry_price': entry,
+            'tp1_price': entry * (1 + sign * random.uniform(0.01, 0.03)),
+            'tp2_price': entry * (1 + sign * random.uniform(0.03, 0.06)),
+            'sl_price': entry * (1 - sign * random.uniform(0.01, 0.03)),
+            'current_sl': None
+        })
+    return trades
+
+
+def make_ticks(count: int, price: float) -> list:
+    """Random walk quanh giá ban đầu, biên độ nhỏ như ticker thật."""
+    ticks = []
+    for _ in range(count):
+        price *= 1 + random.gauss(0, 0.0005)
+        ticks.append(price)
+    return ticks
+
+
+def apply(trade: dict, action: str) -> bool:
+    """Chuyển trạng thái như update_position; trả về False khi giao dịch đã đóng."""
+    if action == 'TP1_HIT':
+        trade.update(status='TP1_HIT', current_sl=trade['entry_price'])
+    elif action == 'TP2_HIT':
+        trade.update(status='TP2_HIT', current_sl=trade['tp1_price'])
+    else:
+        return False
+    return True
+
+
+def run_linear(trades: list, ticks: list) -> tuple:
+    trades = {trade['id']: dict(trade) for trade in trades}
+    hits = 0
+    started = time.perf_counter()
+    for price in ticks:
+        for trade_id, trade in list(trades.items()):
+            action = PositionManager.crossed(trade, price)
+            if action:
+                hits += 1
+                if not apply(trade, action):
+                    del trades[trade_id]
+    return time.perf_counter() - started, hits
+
+
+def run_index(trades: list, ticks: list) -> tuple:
+    index = TriggerIndex()
+    trades = {trade['id']: dict(trade) for trade in trades}
+    for trade in trades.values():
+        index.add(trade)
+    hits = 0
+    started = time.perf_counter()
+    for price in ticks:
+        for trade_id in index.crossed(SYMBOL, price):
+            trade = trades.get(trade_id)
+            action = trade and PositionManager.crossed(trade, price)
+            if action:
+                hits += 1
+                if apply(trade, action):
+                    index.add(trade)
+                else:
+                    index.remove(trade_id)
+                    del trades[trade_id]
+    return time.perf_counter() - started, hits
+
+
+def run_updates(trades: list, updates: int) -> float:
+    """Chi phí cập nhật tăng dần (dời SL như update_stoploss, bỏ khỏi chỉ mục như close_position)."""
+    index = TriggerIndex()
+    for trade in trades:
+        index.add(trade)
+    started = time.perf_counter()
+    for _ in range(updates):
+        trade = dict(random.choice(trades))
+        trade['current_sl'] = trade['entry_price']
+        index.add(trade)
+        index.remove(random.choice(trades)['id'])
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark TP/SL trigger evaluation per tick')
+    parser.add_argument('--trades', type=int, default=10000)
+    parser.add_argument('--ticks', type=int, default=20000)
+    parser.add_argument('--linear-ticks', type=int, default=500, help='Số tick cho cách duyệt tuyến tính (chậm)')
+    parser.add_argument('--updates', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    trades = make_trades(args.trades, 60000.0)
+    ticks = make_ticks(args.ticks, 60000.0)
+
+    linear_ticks = ticks[:args.linear_ticks]
+    linear_time, linear_hits = run_linear(trades, linear_ticks)
+    index_check_time, index_check_hits = run_index(trades, linear_ticks)
+    if linear_hits != index_check_hits:
+        raise SystemExit(f"Mismatch: linear={linear_hits} index={index_check_hits}")
+    index_time, index_hits = run_index(trades, ticks)
+    update_time = run_updates(trades, args.updates)
+
+    print(f"{args.trades} open trades on {SYMBOL}")
+    print(f"linear  {len(linear_ticks):>7} ticks  {linear_time / len(linear_ticks) * 1e6:10.1f} us/tick  hits={linear_hits}")
+    print(f"index   {len(ticks):>7} ticks  {index_time / len(ticks) * 1e6:10.1f} us/tick  hits={index_hits}")
+    print(f"update  {args.updates:>7} ops    {update_time / args.updates * 1e6:10.1f} us/op (add + remove)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+"""
+Kiểm tra query plan của các câu SQL trong trading_bot.py bằng EXPLAIN trên MySQL / MariaDB cục bộ.
+
+Script tạo một database riêng (mặc định auto_trader_explain) từ schema.sql, nạp --rows giao dịch
+giả lập cùng trade_orders, exchange_orders, exchange_executions và chạy ANALYZE TABLE. Sau đó nó
+EXPLAIN từng câu SELECT / UPDATE / DELETE tìm thấy trong trading_bot.py, cộng với các truy vấn
+trong ACCESS_PATHS. Câu lệnh nào đọc toàn bảng (type=ALL), hoặc đọc toàn index mà không có LIMIT,
+bị báo FAIL và script thoát với mã 1.
+
+Kết nối theo DB_HOST / DB_USER / DB_PASSWORD trong .env; user cần quyền CREATE / DROP database.
+
+Cách chạy:
+    python benchmarks/explain_queries.py --rows 20000
+    python benchmarks/explain_queries.py --database auto_trader_explain --keep
+"""
+import argparse
+import ast
+import os
+import random
+import re
+import sys
+from datetime import datetime, timedelta
+
+import mysql.connector
+from dotenv import load_dotenv
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SQL_VERBS = ('SELECT', 'UPDATE', 'DELETE')
+
+# Giá trị thay cho các biểu thức trong f-string SQL của trading_bot.py
+FSTRING_VALUES = {
+    "', '.join(update_fields)": ['status = %s, closed_at = %s, updated_at = %s'],
+    "', '.join((f'{leg}_order_id = %s' for leg in placed))": ['tp1_order_id = %s, tp2_order_id = %s'],
+    'placeholders': ['%s, %s, %s']
+}
+
+# Các biến thể WHERE mà query_exchange_orders / query_exchange_executions có thể tạo ra
+WHERE_VARIANTS = {
+    'exchange_orders': [
+        '',
+        'WHERE symbol = %s',
+        'WHERE status = %s',
+        'WHERE order_link_id LIKE %s',
+        'WHERE symbol = %s AND status = %s',
+        'WHERE (updated_time < %s OR (updated_time = %s AND order_id < %s))',
+        'WHERE status = %s AND (updated_time < %s OR (updated_time = %s AND order_id < %s))'
+    ],
+    'exchange_executions': [
+        '',
+        'WHERE order_id = %s',
+        'WHERE symbol = %s',
+        'WHERE (exec_time < %s OR (exec_time = %s AND exec_id < %s))'
+    ]
+}
+
+# Đường truy cập cần được index phục vụ dù chưa có câu lệnh tương ứng trong trading_bot.py
+ACCESS_PATHS = [
+    ('dashboard', "SELECT * FROM trades WHERE bot_name = %s AND status = %s ORDER BY created_at DESC"),
+    ('dashboard', "SELECT * FROM trades WHERE bot_name = %s"),
+    ('expiry', "SELECT id, order_id, symbol, created_at FROM trades WHERE status = 'OPEN' AND created_at <= %s")
+]
+
+STATUSES = ['CLOSED'] * 40 + ['CANCELLED'] * 40 + ['STOPLOSS'] * 8 + ['TAKEPROFIT'] * 6 + \
+           ['FILLED', 'TP1_HIT', 'TP2_HIT', 'OPEN', 'OPEN', 'OPEN']
+
+
+def extract_queries(path: str) -> list:
+    """Trả về (dòng, câu SQL) cho mọi chuỗi SQL trong file, f-string được dựng theo các biến thể đã biết."""
+    tree = ast.parse(open(path, encoding='utf-8').read())
+    fstring_parts = set()
+    queries = []
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.JoinedStr):
+            fstring_parts.update(id(value) for value in node.values)
+            templates = ['']
+            for value in node.values:
+                if isinstance(value, ast.Constant):
+                    templates = [template + value.value for template in templates]
+                    continue
+                expression = ast.unparse(value.value)
+                if expression == 'where':
+                    table = re.search(r'FROM\s+(\w+)', templates[0])
+                    options = WHERE_VARIANTS.get(table.group(1) if table else '')
+                else:
+                    options = FSTRING_VALUES.get(expression)
+                if options is None:
+                    templates = None
+                    break
+                templates = [template + option for template in templates for option in options]
+            if templates is None:
+                if node.values and isinstance(node.values[0], ast.Constant) and is_sql(node.values[0].value):
+                    queries.append((node.lineno, None))
+                continue
+            queries.extend((node.lineno, template) for template in templates if is_sql(template))
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and id(node) not in fstring_parts:
+            if is_sql(node.value):
+                queries.append((node.lineno, node.value))
+    return sorted(queries, key=lambda item: item[0])
+
+
+def is_sql(text: str) -> bool:
+    words = text.split(None, 1)
+    return bool(words) and words[0].upper() in SQL_VERBS
+
+
+def sample_value(before: str) -> str:
+    """Giá trị mẫu cho %s dựa trên cột đứng trước nó."""
+    if re.search(r'LIMIT\s*$', before, re.I):
+        return '50'
+    match = re.search(r'(\w+)\s*(?:=|<=|>=|<|>|!=|LIKE)\s*$', before, re.I) or \
+        re.search(r'(\w+)\s+IN\s*\((?:\s*[^()]*,)?\s*$', before, re.I)
+    column = match.group(1).lower() if match else ''
+    if column in ('id', 'trade_id', 'leverage') or column.endswith('_time'):
+        return '1700000000000' if column.endswith('_time') else '1'
+    if column.endswith('_at'):
+        return "'2024-01-01 00:00:00'"
+    if column == 'status':
+        return "'OPEN'"
+    if column == 'order_link_id':
+        return "'bot%'"
+    if column == 'symbol':
+        return "'BTCUSDT'"
+    if column == 'side':
+        return "'Buy'"
+    return "'1'"
+
+
+def bind(query: str) -> str:
+    parts = query.split('%s')
+    bound = parts[0]
+    for part in parts[1:]:
+        bound += sample_value(bound) + part
+    return bound
+
+
+def plan_problems(rows: list, query: str) -> list:
+    problems = []
+    has_limit = re.search(r'\bLIMIT\b', query, re.I) is not None
+    for row in rows:
+        if not row.get('table') or row['table'].startswith('<'):
+            continue
+        if row.get('type') == 'ALL':
+            problems.append(f"full table scan on {row['table']}")
+        elif row.get('type') == 'index' and not has_limit:
+            problems.append(f"full index scan on {row['table']} ({row.get('key')})")
+    return problems
+
+
+def create_database(cursor, database: str):
+    schema = open(os.path.join(ROOT, 'schema.sql'), encoding='utf-8').read()
+    schema = schema.replace('`auto_trader`', f'`{database}`')
+    cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    for statement in schema.split(';'):
+        if statement.strip():
+            cursor.execute(statement)
+
+
+def seed(connection, rows: int):
+    cursor = connection.cursor()
+    now = datetime.now()
+    symbols = [f"COIN{index}USDT" for index in range(60)] + ['BTCUSDT', 'ETHUSDT']
+    bots = [f"bot{index}" for index in range(12)]
+
+    trades, trade_orders = [], []
+    for index in range(1, rows + 1):
+        created = now - timedelta(minutes=random.randint(0, 90 * 24 * 60))
+        order_id = f"entry-{index}"
+        trades.append((
+            index, order_id, random.choice(symbols), random.choice(bots), random.choice(['Buy', 'Sell']),
+            100, 1, 100, 10, 101, 102, 103, 99, random.choice(['strategy1', 'strategy2']),
+            random.choice(STATUSES), created
+        ))
+        trade_orders.append((order_id, index, 'entry'))
+        if index % 3 == 0:
+            trade_orders.append((f"tp1-{index}", index, 'tp1'))
+    cursor.executemany(
+        """
+        INSERT INTO trades (id, order_id, symbol, bot_name, side, entry_price, quantity, position_size,
+                            leverage, tp1_price, tp2_price, tp3_price, sl_price, strategy_type, status, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """,
+        trades
+    )
+    cursor.executemany("INSERT INTO trade_orders (order_id, trade_id, leg) VALUES (%s, %s, %s)", trade_orders)
+
+    base_ms = int(now.timestamp() * 1000)
+    orders, executions = [], []
+    for index in range(rows):
+        updated = base_ms - random.randint(0, 90 * 24 * 3600 * 1000)
+        order_id = f"exchange-{index}"
+        status = random.choice(['Filled', 'Cancelled', 'New'])
+        display = {'Filled': 'FILLED', 'Cancelled': 'CANCELLED', 'New': 'OPEN'}[status]
+        orders.append((
+            order_id, random.choice(bots), random.choice(symbols), random.choice(['Buy', 'Sell']), 'Limit',
+            status, display, 100, 1, updated - 1000, updated
+        ))
+        executions.append((f"exec-{index}", order_id, orders[-1][2], orders[-1][3], 100, 1, updated))
+    cursor.executemany(
+        """
+        INSERT INTO exchange_orders (order_id, order_link_id, symbol, side, order_type, order_status, status,
+                                     price, qty, created_time, updated_time)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """,
+        orders
+    )
+    cursor.executemany(
+        """
+        INSERT INTO exchange_executions (exec_id, order_id, symbol, side, exec_price, exec_qty, exec_time)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """,
+        executions
+    )
+    connection.commit()
+    for table in ('trades', 'trade_orders', 'exchange_orders', 'exchange_executions', 'system_settings'):
+        cursor.execute(f"ANALYZE TABLE `{table}`")
+        cursor.fetchall()
+    cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EXPLAIN every SQL statement in trading_bot.py')
+    parser.add_argument('--database', default='auto_trader_explain')
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--keep', action='store_true', help='Giữ lại database sau khi chạy')
+    parser.add_argument('--verbose', action='store_true', help='In plan của cả các câu lệnh đạt')
+    args = parser.parse_args()
+
+    load_dotenv(os.path.join(ROOT, '.env'))
+    connection = mysql.connector.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        user=os.getenv('DB_USER', 'homestead'),
+        password=os.getenv('DB_PASSWORD', 'secret')
+    )
+    cursor = connection.cursor()
+    create_database(cursor, args.database)
+    cursor.close()
+    connection.database = args.database
+    seed(connection, args.rows)
+
+    statements = [(f"trading_bot.py:{line}", query) for line, query in extract_queries(os.path.join(ROOT, 'trading_bot.py'))]
+    statements += ACCESS_PATHS
+    failures = 0
+    skipped = 0
+    cursor = connection.cursor(dictionary=True)
+    for source, query in statements:
+        if query is None:
+            skipped += 1
+            print(f"SKIP {source}: dynamic SQL, add its expressions to FSTRING_VALUES")
+            continue
+        text = ' '.join(query.split())
+        try:
+            cursor.execute('EXPLAIN ' + bind(text))
+            plan = cursor.fetchall()
+        except mysql.connector.Error as e:
+            failures += 1
+            print(f"FAIL {source}: {e}\n     {text}")
+            continue
+        problems = plan_problems(plan, text)
+        if problems:
+            failures += 1
+            print(f"FAIL {source}: {'; '.join(problems)}\n     {text}")
+        else:
+            print(f"ok   {source}: {text[:100]}")
+        if problems or args.verbose:
+            for row in plan:
+                print(f"     table={row.get('table')} type={row.get('type')} key={row.get('key')} rows={row.get('rows')}")
+    cursor.close()
+
+    if not args.keep:
+        cursor = connection.cursor()
+        cursor.execute(f"DROP DATABASE IF EXISTS `{args.database}`")
+        cursor.close()
+    connection.close()
+
+    print(f"{len(statements)} statements, {failures} failed, {skipped} skipped")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Client REST Bybit v5 bất đồng bộ (httpx) dùng cho chế độ async của API.
+
+Dùng chung một httpx.AsyncClient giữ kết nối keep-alive tới sàn, ký request theo chuẩn v5
+(HMAC SHA256, header X-BAPI-*) giống pybit. Response trả về nguyên dict của sàn; retCode khác 0
+sẽ raise BybitAPIError như pybit raise InvalidRequestError.
+
+Khi có limiter, mỗi request lấy token của nhóm endpoint từ cùng RateLimiter với client đồng bộ
+(chờ bằng asyncio.sleep, không chặn event loop) và đồng bộ bucket theo header rate limit của
+response. Pool kết nối httpx là riêng của client này vì requests.Session của http_transport
+không dùng được trên event loop; kích thước đặt bằng ASGI_HTTP_CONNECTIONS.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from typing import Dict, Any
+from urllib.parse import urlencode
+
+import httpx
+
+from rate_limiter import ENDPOINT_GROUPS, NORMAL
+
+logger = logging.getLogger(__name__)
+
+MAINNET_URL = 'https://api.bybit.com'
+TESTNET_URL = 'https://api-testnet.bybit.com'
+
+
+class BybitAPIError(Exception):
+    def __init__(self, ret_code: int, ret_msg: str, path: str):
+        super().__init__(f"{ret_msg} (ErrCode: {ret_code}) ({path})")
+        self.ret_code = ret_code
+        self.ret_msg = ret_msg
+
+
+class AsyncBybitClient:
+    def __init__(self, testnet: bool = True, api_key: str = None, api_secret: str = None,
+                 base_url: str = None, max_connections: int = 20, timeout: float = 10.0,
+                 recv_window: int = 5000, limiter=None):
+        self.limiter = limiter
+        self.api_key = api_key if api_key is not None else os.getenv('BYBIT_API_KEY')
+        self.api_secret = api_secret if api_secret is not None else os.getenv('BYBIT_API_SECRET')
+        self.recv_window = str(recv_window)
+        self.client = httpx.AsyncClient(
+            base_url=base_url or (TESTNET_URL if testnet else MAINNET_URL),
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60
+            )
+        )
+
+    def _headers(self, payload: str) -> Dict[str, str]:
+        timestamp = str(int(time.time() * 1000))
+        signature = hmac.new(
+            self.api_secret.encode('utf-8'),
+            f"{timestamp}{self.api_key}{self.recv_window}{payload}".encode('utf-8'),
+            hashlib.sha256
+        ).hexdigest()
+        return {
+            'X-BAPI-API-KEY': self.api_key,
+            'X-BAPI-SIGN': signature,
+            'X-BAPI-SIGN-TYPE': '2',
+            'X-BAPI-TIMESTAMP': timestamp,
+            'X-BAPI-RECV-WINDOW': self.recv_window,
+            'Content-Type': 'application/json'
+        }
+
+    async def _acquire(self, group: str):
+        started = time.monotonic()
+        throttled = False
+        while True:
+            wait = self.limiter.try_acquire(group, NORMAL, started=started, throttled=throttled)
+            if wait <= 0:
+                break
+            throttled = True
+            await asyncio.sleep(wait)
+        waited = time.monotonic() - started
+        if waited > 1:
+            logger.warning(f"{group} waited {waited:.2f}s for rate limit (async)")
+
+    async def request(self, method: str, path: str, params: Dict[str, Any] = None, auth: bool = True,
+                      name: str = None) -> Dict[str, Any]:
+        """Gửi request; name là tên hàm pybit tương ứng, dùng để tra nhóm rate limit."""
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        group = ENDPOINT_GROUPS.get(name, 'default')
+        if self.limiter is not None:
+            await self._acquire(group)
+        if method == 'GET':
+            query = urlencode(params)
+            headers = self._headers(query) if auth else {}
+            response = await self.client.get(path, params=query, headers=headers)
+        else:
+            body = json.dumps(params)
+            headers = self._headers(body) if auth else {'Content-Type': 'application/json'}
+            response = await self.client.post(path, content=body, headers=headers)
+        if self.limiter is not None:
+            self.limiter.update(group, response.headers)
+        response.raise_for_status()
+        data = response.json()
+        if data.get('retCode') != 0:
+            raise BybitAPIError(data.get('retCode'), data.get('retMsg'), path)
+        return data
+
+    async def get_tickers(self, **params) -> Dict[str, Any]:
+        return await self.request('GET', '/v5/market/tickers', params, auth=False, name='get_tickers')
+
+    async def get_wallet_balance(self, **params) -> Dict[str, Any]:
+        return await self.request('GET', '/v5/account/wallet-balance', params, name='get_wallet_balance')
+
+    async def get_positions(self, **params) -> Dict[str, Any]:
+        return await self.request('GET', '/v5/position/list', params, name='get_positions')
+
+    async def get_open_orders(self, **params) -> Dict[str, Any]:
+        return await self.request('GET', '/v5/order/realtime', params, name='get_open_orders')
+
+    async def close(self):
+        await self.client.aclose()
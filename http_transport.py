@@ -0,0 +1,149 @@
+"""
+Transport HTTP dùng chung cho mọi client REST Bybit (pybit) của bot.
+
+Một requests.Session duy nhất với pool kết nối keep-alive đủ lớn cho số luồng gọi sàn đồng thời,
+TCP keepalive để kết nối rảnh không bị middlebox cắt, và cache DNS có TTL để kết nối mới không
+phải resolve lại tên miền. Các client pybit được gán session này thay cho session riêng của chúng.
+"""
+import logging
+import socket
+import threading
+import time
+from typing import Dict, Any, List
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+
+class DNSCache:
+    """Cache kết quả getaddrinfo theo (host, port) trong ttl giây."""
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}               # (host, port) -> (danh sách IP, thời điểm hết hạn)
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, host: str, port: int) -> List[str]:
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get((host, port))
+            if entry and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        with self.lock:
+            self.entries[(host, port)] = (addresses, now + self.ttl)
+        return addresses
+
+    def invalidate(self, host: str, port: int):
+        with self.lock:
+            self.entries.pop((host, port), None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {'hosts': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+dns_cache = DNSCache()
+connection_stats = {'opened': 0}
+stats_lock = threading.Lock()
+
+
+class CachedDNSConnectionMixin:
+    """Mở socket tới IP lấy từ dns_cache; TLS (SNI, kiểm tra chứng chỉ) vẫn dùng tên miền gốc."""
+
+    def _new_conn(self):
+        host = self._dns_host
+        addresses = dns_cache.resolve(host, self.port)
+        error = None
+        for address in addresses:
+            self._dns_host = address
+            try:
+                sock = super()._new_conn()
+                with stats_lock:
+                    connection_stats['opened'] += 1
+                return sock
+            except NewConnectionError as e:
+                error = e
+            finally:
+                self._dns_host = host
+        # IP trong cache có thể đã đổi, lần kết nối sau resolve lại
+        dns_cache.invalidate(host, self.port)
+        raise error
+
+
+class CachedDNSHTTPConnection(CachedDNSConnectionMixin, HTTPConnection):
+    pass
+
+
+class CachedDNSHTTPSConnection(CachedDNSConnectionMixin, HTTPSConnection):
+    pass
+
+
+class CachedDNSHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = CachedDNSHTTPConnection
+
+
+class CachedDNSHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = CachedDNSHTTPSConnection
+
+
+def keepalive_socket_options(idle: int = 30, interval: int = 10, count: int = 3) -> list:
+    """TCP_NODELAY mặc định của urllib3 cộng TCP keepalive (nếu hệ điều hành hỗ trợ)."""
+    options = list(HTTPConnection.default_socket_options) + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    for name, value in (('TCP_KEEPIDLE', idle), ('TCP_KEEPINTVL', interval), ('TCP_KEEPCNT', count)):
+        if hasattr(socket, name):
+            options.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return options
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    def __init__(self, pool_size: int, socket_options: list = None):
+        self.socket_options = socket_options or keepalive_socket_options()
+        # Không tự retry: pybit đã có cơ chế retry riêng theo retCode
+        super().__init__(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs['socket_options'] = self.socket_options
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CachedDNSHTTPConnectionPool,
+            'https': CachedDNSHTTPSConnectionPool
+        }
+
+
+def create_session(pool_size: int = 16, dns_ttl: float = None) -> requests.Session:
+    """Session có pool pool_size kết nối keep-alive cho mỗi host."""
+    if dns_ttl is not None:
+        dns_cache.ttl = dns_ttl
+    session = requests.Session()
+    adapter = PooledHTTPAdapter(pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    # Giống header mặc định của session pybit
+    session.headers.update({
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+    })
+    session.pool_size = pool_size
+    return session
+
+
+def get_stats(session: requests.Session = None) -> Dict[str, Any]:
+    with stats_lock:
+        opened = connection_stats['opened']
+    return {
+        'pool_size': getattr(session, 'pool_size', None),
+        'connections_opened': opened,
+        'dns': dns_cache.get_stats()
+    }
@@ -0,0 +1,232 @@
+"""
+Lịch chạy công việc định kỳ của bot dựa trên heap thời điểm đến hạn.
+
+Một luồng điều phối chờ đúng tới thời điểm đến hạn gần nhất (Condition.wait với timeout) rồi
+đưa công việc sang pool worker, nên công việc chạy đúng giờ thay vì trễ tới một chu kỳ poll, và
+một công việc chậm không chặn các công việc khác. Mỗi công việc không chạy chồng lên chính nó:
+lần đến hạn rơi vào lúc lần trước chưa xong bị bỏ qua và được đếm vào skipped.
+
+Công việc có thể thêm, thay thế hoặc xóa lúc đang chạy; interval=None là công việc chạy một lần.
+"""
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """Một công việc đã đăng ký và thống kê các lần chạy của nó."""
+
+    def __init__(self, name: str, func: Callable, interval: float = None, jitter: float = 0.0,
+                 allow_overlap: bool = False):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.allow_overlap = allow_overlap
+        self.next_due = None            # time.monotonic() của lần đến hạn kế tiếp (đã cộng jitter)
+        self.base_due = None            # lần đến hạn kế tiếp theo lịch chưa cộng jitter
+        self.token = None               # seq của mục hợp lệ trong heap, mục cũ hơn bị bỏ qua
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_run = None            # datetime lúc bắt đầu lần chạy gần nhất
+        self.last_duration = None
+        self.max_duration = 0.0
+        self.last_lateness = None       # thời gian từ lúc đến hạn tới lúc bắt đầu chạy
+        self.max_lateness = 0.0
+        self.last_error = None
+
+
+class JobScheduler:
+    """Chạy các Job theo heap thời điểm đến hạn trên một pool worker."""
+
+    def __init__(self, workers: int = 4, max_jitter: float = 5.0):
+        self.condition = threading.Condition()
+        self.heap = []                  # (thời điểm đến hạn, seq, tên công việc)
+        self.jobs = {}                  # tên -> Job
+        self.in_flight = {}             # tên -> số lần chạy chưa xong, dùng chung khi công việc bị thay thế
+        self.seq = itertools.count()
+        self.max_jitter = max_jitter
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='job')
+        self.running = False
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        threading.Thread(target=self._loop, daemon=True, name='job-scheduler').start()
+        logger.info(f"Job scheduler started with {len(self.jobs)} jobs")
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.executor.shutdown(wait=False)
+
+    def add_job(self, name: str, func: Callable, interval: float = None, delay: float = None,
+                jitter: float = 0.0, allow_overlap: bool = False) -> Job:
+        """
+        Đăng ký (hoặc thay thế) công việc name.
+
+        Args:
+            name (str): Tên công việc, dùng để thay thế / xóa và trong thống kê
+            func (Callable): Hàm không tham số cần chạy
+            interval (float, optional): Chu kỳ (giây); None là chạy một lần
+            delay (float, optional): Số giây tới lần chạy đầu, mặc định bằng interval
+            jitter (float): Độ lệch ngẫu nhiên thêm vào mỗi lần đến hạn, tối đa max_jitter giây,
+                            để các công việc cùng chu kỳ không dồn vào một thời điểm
+            allow_overlap (bool): Cho phép lần chạy mới bắt đầu khi lần trước chưa xong
+        """
+        if interval is None and delay is None:
+            raise ValueError(f"Job {name} needs an interval or a delay")
+        if interval is not None and interval <= 0:
+            raise ValueError(f"Job {name} interval must be positive")
+        job = Job(name, func, interval, min(max(jitter, 0.0), self.max_jitter), allow_overlap)
+        with self.condition:
+            previous = self.jobs.get(name)
+            if previous is not None:
+                # Giữ thống kê khi thay thế công việc cùng tên; lần chạy đang diễn ra vẫn được tính theo
+                # tên trong in_flight và ghi kết quả vào công việc mới
+                for field in ('runs', 'failures', 'skipped', 'last_run', 'last_duration',
+                              'max_duration', 'last_lateness', 'max_lateness', 'last_error'):
+                    setattr(job, field, getattr(previous, field))
+            self.jobs[name] = job
+            self._push(job, time.monotonic() + (interval if delay is None else delay))
+        logger.info(f"Scheduled job {name} (interval={interval}, delay={delay})")
+        return job
+
+    def remove_job(self, name: str) -> bool:
+        """Xóa công việc; lần chạy đang diễn ra (nếu có) vẫn chạy tới khi xong."""
+        with self.condition:
+            return self.jobs.pop(name, None) is not None
+
+    def run_now(self, name: str) -> bool:
+        """Đưa công việc lên chạy ngay, lịch chu kỳ tính lại từ bây giờ."""
+        with self.condition:
+            job = self.jobs.get(name)
+            if job is None:
+                return False
+            self._push(job, time.monotonic())
+            return True
+
+    def _push(self, job: Job, due: float):
+        """Thêm mục vào heap; gọi khi đang giữ condition. due là lịch chưa cộng jitter."""
+        job.base_due = due
+        if job.jitter:
+            due += random.uniform(0, job.jitter)
+        job.token = next(self.seq)
+        job.next_due = due
+        heapq.heappush(self.heap, (due, job.token, job.name))
+        self.condition.notify()
+
+    def _loop(self):
+        with self.condition:
+            while self.running:
+                now = time.monotonic()
+                while self.heap and self.heap[0][0] <= now:
+                    due, token, name = heapq.heappop(self.heap)
+                    job = self.jobs.get(name)
+                    if job is None or job.token != token:
+                        continue
+                    self._dispatch(job, due, now)
+                timeout = self.heap[0][0] - now if self.heap else None
+                self.condition.wait(timeout)
+
+    def _dispatch(self, job: Job, due: float, now: float):
+        """Chạy hoặc bỏ qua lần đến hạn, rồi xếp lịch lần kế tiếp; gọi khi đang giữ condition."""
+        if self.in_flight.get(job.name) and not job.allow_overlap:
+            job.skipped += 1
+            logger.warning(f"Job {job.name} still running, skipped this run ({job.skipped} skipped)")
+        else:
+            self.in_flight[job.name] = self.in_flight.get(job.name, 0) + 1
+            try:
+                self.executor.submit(self._run, job, due)
+            except RuntimeError:
+                # Executor đã shutdown
+                self._finish(job.name)
+                return
+
+        if job.interval is None:
+            if self.jobs.get(job.name) is job:
+                del self.jobs[job.name]
+            return
+        # Giữ nhịp cố định theo lịch chưa cộng jitter (jitter không cộng dồn thành lệch nhịp),
+        # bỏ qua các nhịp đã lỡ thay vì chạy dồn
+        next_due = job.base_due + job.interval
+        if next_due <= now:
+            next_due += ((now - next_due) // job.interval + 1) * job.interval
+        self._push(job, next_due)
+
+    def _finish(self, name: str):
+        """Giảm số lần chạy chưa xong của công việc name; gọi khi đang giữ condition."""
+        remaining = self.in_flight.get(name, 0) - 1
+        if remaining > 0:
+            self.in_flight[name] = remaining
+        else:
+            self.in_flight.pop(name, None)
+
+    def _run(self, job: Job, due: float):
+        func = job.func
+        started = time.monotonic()
+        lateness = started - due
+        with self.condition:
+            # Công việc có thể đã bị thay thế: thống kê ghi vào bản đang đăng ký
+            job = self.jobs.get(job.name, job)
+            job.last_run = datetime.now()
+            job.last_lateness = lateness
+            job.max_lateness = max(job.max_lateness, lateness)
+        error = None
+        try:
+            func()
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Job {job.name} failed: {error}", exc_info=True)
+        finally:
+            duration = time.monotonic() - started
+            with self.condition:
+                self._finish(job.name)
+                job = self.jobs.get(job.name, job)
+                job.runs += 1
+                job.last_duration = duration
+                job.max_duration = max(job.max_duration, duration)
+                if error is not None:
+                    job.failures += 1
+                    job.last_error = error
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """Lần chạy gần nhất, lần chạy kế tiếp, thời gian chạy và số lần bị bỏ qua của mỗi công việc."""
+        now = time.monotonic()
+        wall_now = time.time()
+
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        with self.condition:
+            return [
+                {
+                    'name': job.name,
+                    'interval': job.interval,
+                    'running': self.in_flight.get(job.name, 0) > 0,
+                    'runs': job.runs,
+                    'failures': job.failures,
+                    'skipped': job.skipped,
+                    'last_run': job.last_run.isoformat() if job.last_run else None,
+                    'next_run': datetime.fromtimestamp(wall_now + job.next_due - now).isoformat()
+                                if job.next_due is not None else None,
+                    'last_duration_ms': ms(job.last_duration),
+                    'max_duration_ms': ms(job.max_duration),
+                    'last_lateness_ms': ms(job.last_lateness),
+                    'max_lateness_ms': ms(job.max_lateness),
+                    'last_error': job.last_error
+                }
+                for job in sorted(self.jobs.values(), key=lambda j: j.next_due or 0)
+            ]
@@ -0,0 +1,31 @@
+-- Thêm bảng ánh xạ order_id -> trade và index cho các cột order id của bảng trades
+USE `auto_trader`;
+
+CREATE TABLE IF NOT EXISTS `trade_orders` (
+  `order_id` varchar(100) NOT NULL COMMENT 'ID lệnh từ sàn giao dịch',
+  `trade_id` bigint(20) NOT NULL,
+  `leg` enum('entry','tp1','tp2','tp3') NOT NULL COMMENT 'Vai trò của lệnh trong giao dịch',
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`order_id`),
+  KEY `idx_trade_id` (`trade_id`),
+  CONSTRAINT `fk_trade_orders_trade` FOREIGN KEY (`trade_id`) REFERENCES `trades` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+ALTER TABLE `trades`
+  ADD KEY `idx_order_id` (`order_id`),
+  ADD KEY `idx_tp1_order_id` (`tp1_order_id`),
+  ADD KEY `idx_tp2_order_id` (`tp2_order_id`),
+  ADD KEY `idx_tp3_order_id` (`tp3_order_id`);
+
+-- Nạp ánh xạ cho các giao dịch đã có
+INSERT IGNORE INTO `trade_orders` (`order_id`, `trade_id`, `leg`)
+SELECT `order_id`, `id`, 'entry' FROM `trades` WHERE `order_id` IS NOT NULL AND `order_id` != '';
+
+INSERT IGNORE INTO `trade_orders` (`order_id`, `trade_id`, `leg`)
+SELECT `tp1_order_id`, `id`, 'tp1' FROM `trades` WHERE `tp1_order_id` IS NOT NULL AND `tp1_order_id` != '';
+
+INSERT IGNORE INTO `trade_orders` (`order_id`, `trade_id`, `leg`)
+SELECT `tp2_order_id`, `id`, 'tp2' FROM `trades` WHERE `tp2_order_id` IS NOT NULL AND `tp2_order_id` != '';
+
+INSERT IGNORE INTO `trade_orders` (`order_id`, `trade_id`, `leg`)
+SELECT `tp3_order_id`, `id`, 'tp3' FROM `trades` WHERE `tp3_order_id` IS NOT NULL AND `tp3_order_id` != '';
@@ -0,0 +1,51 @@
+-- Bảng lưu lịch sử lệnh và khớp lệnh đồng bộ tăng dần từ Bybit (order history, executions)
+USE `auto_trader`;
+
+CREATE TABLE IF NOT EXISTS `exchange_orders` (
+  `order_id` varchar(100) NOT NULL COMMENT 'ID lệnh từ sàn giao dịch',
+  `order_link_id` varchar(100) NOT NULL DEFAULT '' COMMENT 'orderLinkId (tên bot)',
+  `symbol` varchar(20) NOT NULL,
+  `side` enum('Buy','Sell') NOT NULL,
+  `order_type` varchar(20) NOT NULL,
+  `order_status` varchar(30) NOT NULL COMMENT 'Trạng thái gốc của Bybit',
+  `status` varchar(30) NOT NULL COMMENT 'Trạng thái hiển thị (OPEN, FILLED, CANCELLED, ...)',
+  `price` decimal(20,8) DEFAULT NULL,
+  `trigger_price` decimal(20,8) DEFAULT NULL,
+  `qty` decimal(20,8) NOT NULL,
+  `cum_exec_qty` decimal(20,8) DEFAULT NULL,
+  `avg_price` decimal(20,8) DEFAULT NULL,
+  `stop_loss` decimal(20,8) DEFAULT NULL,
+  `take_profit` decimal(20,8) DEFAULT NULL,
+  `position_idx` tinyint(4) NOT NULL DEFAULT '0',
+  `reduce_only` tinyint(1) NOT NULL DEFAULT '0',
+  `created_time` bigint(20) NOT NULL COMMENT 'createdTime (ms)',
+  `updated_time` bigint(20) NOT NULL COMMENT 'updatedTime (ms)',
+  `synced_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`order_id`),
+  KEY `idx_updated` (`updated_time`, `order_id`),
+  KEY `idx_symbol_updated` (`symbol`, `updated_time`, `order_id`),
+  KEY `idx_status_updated` (`status`, `updated_time`, `order_id`),
+  KEY `idx_link_updated` (`order_link_id`, `updated_time`, `order_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+CREATE TABLE IF NOT EXISTS `exchange_executions` (
+  `exec_id` varchar(100) NOT NULL COMMENT 'execId từ sàn giao dịch',
+  `order_id` varchar(100) NOT NULL,
+  `symbol` varchar(20) NOT NULL,
+  `side` enum('Buy','Sell') NOT NULL,
+  `exec_type` varchar(20) NOT NULL DEFAULT 'Trade',
+  `exec_price` decimal(20,8) NOT NULL,
+  `exec_qty` decimal(20,8) NOT NULL,
+  `exec_fee` decimal(20,8) DEFAULT NULL,
+  `is_maker` tinyint(1) NOT NULL DEFAULT '0',
+  `exec_time` bigint(20) NOT NULL COMMENT 'execTime (ms)',
+  PRIMARY KEY (`exec_id`),
+  KEY `idx_order_id` (`order_id`),
+  KEY `idx_exec_time` (`exec_time`, `exec_id`),
+  KEY `idx_symbol_exec_time` (`symbol`, `exec_time`, `exec_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Mốc updatedTime / execTime đã đồng bộ xong, job đồng bộ tự ghi lại sau mỗi lần chạy
+INSERT IGNORE INTO `system_settings` (`setting_key`, `setting_value`, `description`) VALUES
+('exchange_orders_synced_until', NULL, 'Mốc updatedTime (ms) đã đồng bộ vào exchange_orders'),
+('exchange_executions_synced_until', NULL, 'Mốc execTime (ms) đã đồng bộ vào exchange_executions');
@@ -0,0 +1,10 @@
+-- Index ghép cho các truy vấn nóng của bảng trades:
+--   status = 'OPEN' AND created_at <= ?   (hàng đợi hết hạn lệnh, dọn lệnh cũ)
+--   bot_name = ? AND status = ?           (lọc giao dịch theo bot trên dashboard)
+-- idx_status được thay bằng idx_status_created (status là cột đầu của index mới)
+USE `auto_trader`;
+
+ALTER TABLE `trades`
+  ADD KEY `idx_status_created` (`status`, `created_at`),
+  ADD KEY `idx_bot_status` (`bot_name`, `status`),
+  DROP KEY `idx_status`;
@@ -0,0 +1,7 @@
+-- Index cho đường truy cập "giao dịch đang mở của một vị thế" (symbol, side, status) dùng khi
+-- TP/SL của vị thế khớp; idx_symbol được thay bằng index mới (symbol là cột đầu)
+USE `auto_trader`;
+
+ALTER TABLE `trades`
+  ADD KEY `idx_symbol_side_status` (`symbol`, `side`, `status`),
+  DROP KEY `idx_symbol`;
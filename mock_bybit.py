@@ -0,0 +1,979 @@
+"""
+Sàn Bybit v5 giả lập để chạy TradingBot và benchmark mà không gọi testnet.
+
+Gồm REST (các endpoint bot dùng) và WebSocket public/private giả lập: lệnh Limit khớp khi giá
+đi qua, lệnh Market khớp ngay, TP/SL của vị thế kích hoạt khi giá chạm; mọi thay đổi lệnh, khớp
+lệnh, vị thế được đẩy qua private stream (order, execution, position), giá qua tickers.<symbol>.
+Có thể thêm độ trễ, lỗi retCode / lỗi HTTP ngẫu nhiên và giới hạn request mỗi giây theo endpoint
+(trả header X-Bapi-Limit-* và retCode 10006 như sàn thật).
+
+Cách chạy độc lập:
+    python mock_bybit.py --port 9100 --ws-port 9101 --latency 0.02 --jitter 0.01 --error-rate 0.01
+
+rồi trỏ bot tới mock trong .env:
+    BYBIT_REST_URL=http://127.0.0.1:9100
+    BYBIT_WS_PUBLIC_URL=ws://127.0.0.1:9101/v5/public/linear
+    BYBIT_WS_PRIVATE_URL=ws://127.0.0.1:9101/v5/private
+
+Điều khiển khi đang chạy:
+    POST /mock/price  {"symbol": "BTCUSDT", "price": "64000"}   đổi giá, khớp lệnh / TP / SL bị vượt
+    POST /mock/fill   {"orderId": "..."}                         khớp ngay một lệnh đang mở
+    POST /mock/config {"latency": 0.05, "error_rate": 0.1}       đổi độ trễ / tỉ lệ lỗi
+"""
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import queue
+import random
+import socket
+import threading
+import time
+import uuid
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List
+from urllib.parse import urlsplit, parse_qsl
+
+logger = logging.getLogger(__name__)
+
+# symbol -> (giá ban đầu, tickSize, qtyStep)
+DEFAULT_INSTRUMENTS = {
+    'BTCUSDT': ('65000', '0.10', '0.001'),
+    'ETHUSDT': ('3200', '0.01', '0.01'),
+    'SOLUSDT': ('150', '0.010', '0.1'),
+    'BNBUSDT': ('580', '0.010', '0.01'),
+    'XRPUSDT': ('0.6', '0.0001', '1'),
+    'DOTUSDT': ('6.5', '0.001', '0.1'),
+    'ADAUSDT': ('0.45', '0.0001', '1'),
+    'AVAXUSDT': ('30', '0.001', '0.1')
+}
+
+OPEN_STATUSES = ('New', 'PartiallyFilled', 'Untriggered')
+PRIVATE_TOPICS = ('order', 'execution', 'position', 'wallet')
+SUBSCRIBE_REPLY_DELAY = 0.05
+
+ROUTES = {
+    ('GET', '/v5/market/tickers'): 'get_tickers',
+    ('GET', '/v5/market/instruments-info'): 'get_instruments_info',
+    ('GET', '/v5/position/list'): 'get_positions',
+    ('GET', '/v5/order/realtime'): 'get_open_orders',
+    ('GET', '/v5/order/history'): 'get_order_history',
+    ('GET', '/v5/execution/list'): 'get_executions',
+    ('GET', '/v5/account/wallet-balance'): 'get_wallet_balance',
+    ('POST', '/v5/order/create'): 'place_order',
+    ('POST', '/v5/order/cancel'): 'cancel_order',
+    ('POST', '/v5/order/create-batch'): 'place_batch_order',
+    ('POST', '/v5/order/cancel-batch'): 'cancel_batch_order',
+    ('POST', '/v5/position/set-leverage'): 'set_leverage',
+    ('POST', '/v5/position/switch-mode'): 'switch_position_mode',
+    ('POST', '/v5/position/trading-stop'): 'set_trading_stop'
+}
+
+# Giới hạn request mỗi giây theo endpoint (theo UID) như tài liệu Bybit v5
+ENDPOINT_LIMITS = {
+    '/v5/order/create': 10,
+    '/v5/order/cancel': 10,
+    '/v5/order/create-batch': 10,
+    '/v5/order/cancel-batch': 10,
+    '/v5/order/realtime': 50,
+    '/v5/order/history': 50,
+    '/v5/execution/list': 50,
+    '/v5/position/list': 50,
+    '/v5/position/set-leverage': 10,
+    '/v5/position/switch-mode': 10,
+    '/v5/position/trading-stop': 10,
+    '/v5/account/wallet-balance': 50
+}
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class MockError(Exception):
+    def __init__(self, ret_code: int, ret_msg: str):
+        super().__init__(f"{ret_msg} (ErrCode: {ret_code})")
+        self.ret_code = ret_code
+        self.ret_msg = ret_msg
+
+
+def paginate(items: list, params: Dict[str, Any], default_limit: int, max_limit: int) -> tuple:
+    """Cắt trang theo cursor (vị trí bắt đầu), trả về (trang, nextPageCursor)."""
+    limit = min(int(params.get('limit') or default_limit), max_limit)
+    start = int(params.get('cursor') or 0)
+    page = items[start:start + limit]
+    return page, str(start + limit) if start + limit < len(items) else ''
+
+
+class MockExchange:
+    """Trạng thái sàn giả lập: giá, hợp đồng, lệnh, vị thế, số dư và lịch sử khớp lệnh."""
+
+    def __init__(self, instruments: Dict[str, tuple] = None, balance: str = '100000'):
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self.instruments = {}
+        self.prices = {}
+        for symbol, (price, tick_size, qty_step) in (instruments or DEFAULT_INSTRUMENTS).items():
+            self.add_instrument(symbol, price, tick_size, qty_step)
+        self.orders = {}                # orderId -> lệnh theo định dạng Bybit
+        self.received_at = {}           # orderId -> time.monotonic() lúc nhận request đặt lệnh
+        self.positions = {}             # (symbol, positionIdx) -> vị thế
+        self.executions = []
+        self.modes = {}                 # symbol -> 0 (one-way) | 3 (hedge)
+        self.balance = Decimal(balance)
+        self.listeners = []             # callback(topic, data) cho WebSocket
+
+    def add_instrument(self, symbol: str, price: str, tick_size: str, qty_step: str):
+        self.prices[symbol] = Decimal(price)
+        self.instruments[symbol] = {
+            'symbol': symbol,
+            'contractType': 'LinearPerpetual',
+            'status': 'Trading',
+            'baseCoin': symbol[:-4],
+            'quoteCoin': 'USDT',
+            'settleCoin': 'USDT',
+            'priceScale': str(max(0, -Decimal(tick_size).as_tuple().exponent)),
+            'leverageFilter': {'minLeverage': '1', 'maxLeverage': '100.00', 'leverageStep': '0.01'},
+            'priceFilter': {'minPrice': tick_size, 'maxPrice': '1999999.80', 'tickSize': tick_size},
+            'lotSizeFilter': {
+                'maxOrderQty': '1000000', 'minOrderQty': qty_step, 'qtyStep': qty_step,
+                'postOnlyMaxOrderQty': '1000000', 'minNotionalValue': '5'
+            }
+        }
+
+    def publish(self, topic: str, data):
+        for listener in list(self.listeners):
+            listener(topic, data)
+
+    def symbol_price(self, symbol: str) -> Decimal:
+        if symbol not in self.prices:
+            raise MockError(10001, f"params error: symbol {symbol} invalid")
+        return self.prices[symbol]
+
+    def ticker(self, symbol: str) -> Dict[str, Any]:
+        price = self.prices[symbol]
+        return {
+            'symbol': symbol,
+            'lastPrice': str(price),
+            'markPrice': str(price),
+            'indexPrice': str(price),
+            'bid1Price': str(price),
+            'ask1Price': str(price),
+            'volume24h': '0',
+            'turnover24h': '0'
+        }
+
+    def position(self, symbol: str, position_idx: int) -> Dict[str, Any]:
+        key = (symbol, int(position_idx))
+        if key not in self.positions:
+            self.positions[key] = {
+                'symbol': symbol,
+                'positionIdx': int(position_idx),
+                'side': '',
+                'size': '0',
+                'avgPrice': '0',
+                'positionValue': '0',
+                'leverage': '10',
+                'markPrice': str(self.prices.get(symbol, 0)),
+                'liqPrice': '',
+                'takeProfit': '',
+                'stopLoss': '',
+                'unrealisedPnl': '0',
+                'cumRealisedPnl': '0',
+                'createdTime': str(now_ms()),
+                'updatedTime': str(now_ms()),
+                'category': 'linear'
+            }
+        return self.positions[key]
+
+    def refresh_position(self, position: Dict[str, Any]):
+        size = Decimal(position['size'])
+        price = self.prices[position['symbol']]
+        avg_price = Decimal(position['avgPrice'])
+        direction = 1 if position['side'] == 'Buy' else -1
+        position['markPrice'] = str(price)
+        position['positionValue'] = str(size * avg_price)
+        position['unrealisedPnl'] = str((price - avg_price) * size * direction if size else 0)
+
+    # REST: market
+
+    def get_tickers(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            symbols = [params['symbol']] if params.get('symbol') else list(self.prices)
+            return {'category': 'linear', 'list': [self.ticker(symbol) for symbol in symbols if symbol in self.prices]}
+
+    def get_instruments_info(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            if params.get('symbol'):
+                instruments = [self.instruments[params['symbol']]] if params['symbol'] in self.instruments else []
+            else:
+                instruments = list(self.instruments.values())
+        page, cursor = paginate(instruments, params, 500, 1000)
+        return {'category': 'linear', 'list': page, 'nextPageCursor': cursor}
+
+    # REST: account / position
+
+    def get_wallet_balance(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            unrealised = Decimal(0)
+            margin = Decimal(0)
+            for position in self.positions.values():
+                if Decimal(position['size']):
+                    self.refresh_position(position)
+                    unrealised += Decimal(position['unrealisedPnl'])
+                    margin += Decimal(position['positionValue']) / Decimal(position['leverage'])
+            equity = self.balance + unrealised
+            coin = {
+                'coin': 'USDT',
+                'walletBalance': str(self.balance),
+                'equity': str(equity),
+                'availableToWithdraw': str(max(Decimal(0), self.balance - margin)),
+                'unrealisedPnl': str(unrealised),
+                'cumRealisedPnl': '0',
+                'totalPositionIM': str(margin),
+                'totalPositionMM': str(margin / 2),
+                'usdValue': str(equity)
+            }
+            return {'list': [{
+                'accountType': 'UNIFIED',
+                'totalEquity': str(equity),
+                'totalWalletBalance': str(self.balance),
+                'totalAvailableBalance': coin['availableToWithdraw'],
+                'coin': [coin]
+            }]}
+
+    def get_positions(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            if params.get('symbol'):
+                symbol = params['symbol']
+                self.symbol_price(symbol)
+                indexes = (1, 2) if self.modes.get(symbol, 3) == 3 else (0,)
+                positions = [self.position(symbol, index) for index in indexes]
+            elif params.get('settleCoin'):
+                positions = [position for position in self.positions.values() if Decimal(position['size'])]
+            else:
+                raise MockError(10001, 'symbol or settleCoin is required')
+            for position in positions:
+                self.refresh_position(position)
+            positions = [dict(position) for position in positions]
+        page, cursor = paginate(positions, params, 20, 200)
+        return {'category': 'linear', 'list': page, 'nextPageCursor': cursor}
+
+    def set_leverage(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            symbol = params['symbol']
+            self.symbol_price(symbol)
+            leverage = str(Decimal(params['buyLeverage']).normalize())
+            positions = [self.position(symbol, index) for index in (0, 1, 2)]
+            if all(str(Decimal(position['leverage']).normalize()) == leverage for position in positions):
+                raise MockError(110043, 'Set leverage not modified')
+            for position in positions:
+                position['leverage'] = leverage
+        return {}
+
+    def switch_position_mode(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            symbol = params.get('symbol')
+            mode = int(params['mode'])
+            if self.modes.get(symbol, 3) == mode:
+                raise MockError(110025, 'Position mode is not modified')
+            self.modes[symbol] = mode
+        return {}
+
+    def set_trading_stop(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            position = self.position(params['symbol'], params.get('positionIdx', 0))
+            if not Decimal(position['size']):
+                raise MockError(10001, 'can not set tp/sl/ts for zero position')
+            for field in ('takeProfit', 'stopLoss'):
+                if field in params:
+                    position[field] = '' if Decimal(str(params[field]) or 0) == 0 else str(params[field])
+            position['updatedTime'] = str(now_ms())
+            self.publish('position', [dict(position)])
+        return {}
+
+    # REST: lệnh
+
+    def _query_orders(self, params: Dict[str, Any], open_orders: bool) -> List[Dict[str, Any]]:
+        orders = []
+        for order in self.orders.values():
+            if (order['orderStatus'] in OPEN_STATUSES) != open_orders:
+                continue
+            if any(params.get(field) and order[field] != params[field]
+                   for field in ('symbol', 'orderId', 'orderLinkId', 'side', 'orderStatus')):
+                continue
+            if params.get('startTime') and int(order['updatedTime']) < int(params['startTime']):
+                continue
+            if params.get('endTime') and int(order['updatedTime']) > int(params['endTime']):
+                continue
+            orders.append(dict(order))
+        orders.sort(key=lambda order: (int(order['updatedTime']), order['orderId']), reverse=True)
+        return orders
+
+    def get_open_orders(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            orders = self._query_orders(params, open_orders=True)
+        page, cursor = paginate(orders, params, 20, 50)
+        return {'category': 'linear', 'list': page, 'nextPageCursor': cursor}
+
+    def get_order_history(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Lệnh đã kết thúc, mới cập nhật trước; startTime / endTime lọc theo updatedTime."""
+        with self.lock:
+            orders = self._query_orders(params, open_orders=False)
+        page, cursor = paginate(orders, params, 20, 50)
+        return {'category': 'linear', 'list': page, 'nextPageCursor': cursor}
+
+    def get_executions(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            executions = [
+                dict(execution) for execution in reversed(self.executions)
+                if not any(params.get(field) and execution[field] != params[field] for field in ('symbol', 'orderId'))
+                and not (params.get('startTime') and int(execution['execTime']) < int(params['startTime']))
+                and not (params.get('endTime') and int(execution['execTime']) > int(params['endTime']))
+            ]
+        page, cursor = paginate(executions, params, 50, 100)
+        return {'category': 'linear', 'list': page, 'nextPageCursor': cursor}
+
+    def place_order(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            order = self._place(params)
+            return {'orderId': order['orderId'], 'orderLinkId': order['orderLinkId']}
+
+    def _place(self, params: Dict[str, Any], stop_order_type: str = '') -> Dict[str, Any]:
+        received_at = time.monotonic()
+        symbol = params.get('symbol')
+        last_price = self.symbol_price(symbol)
+        side = params.get('side')
+        order_type = params.get('orderType')
+        if side not in ('Buy', 'Sell') or order_type not in ('Market', 'Limit'):
+            raise MockError(10001, 'params error: side or orderType invalid')
+        qty = Decimal(str(params.get('qty') or 0))
+        if qty <= 0:
+            raise MockError(10001, 'params error: qty invalid')
+        price = Decimal(str(params['price'])) if order_type == 'Limit' else last_price
+        position_idx = int(params.get('positionIdx', 0))
+        reduce_only = params.get('reduceOnly') in (True, 'true', 'True')
+        if reduce_only and not Decimal(self.position(symbol, position_idx)['size']):
+            raise MockError(110017, 'Reduce-only rule not satisfied')
+
+        timestamp = str(now_ms())
+        order = {
+            'orderId': str(uuid.uuid4()),
+            'orderLinkId': params.get('orderLinkId', ''),
+            'symbol': symbol,
+            'side': side,
+            'orderType': order_type,
+            'price': str(price) if order_type == 'Limit' else '0',
+            'qty': str(qty),
+            'leavesQty': str(qty),
+            'cumExecQty': '0',
+            'cumExecValue': '0',
+            'avgPrice': '',
+            'orderStatus': 'New',
+            'timeInForce': params.get('timeInForce', 'GTC'),
+            'positionIdx': position_idx,
+            'reduceOnly': reduce_only,
+            'takeProfit': str(params.get('takeProfit') or ''),
+            'stopLoss': str(params.get('stopLoss') or ''),
+            'stopOrderType': stop_order_type,
+            'triggerPrice': '',
+            'category': 'linear',
+            'createdTime': timestamp,
+            'updatedTime': timestamp
+        }
+        self.orders[order['orderId']] = order
+        self.received_at[order['orderId']] = received_at
+        self.changed.notify_all()
+
+        marketable = order_type == 'Market' or (price >= last_price if side == 'Buy' else price <= last_price)
+        if marketable:
+            self._fill(order, price)
+        else:
+            self.publish('order', [dict(order)])
+        return order
+
+    def _fill(self, order: Dict[str, Any], price: Decimal):
+        qty = Decimal(order['qty'])
+        timestamp = str(now_ms())
+        position = self.position(order['symbol'], order['positionIdx'])
+        size = Decimal(position['size'])
+        closed_size = Decimal(0)
+
+        if order['reduceOnly'] or (size and position['side'] != order['side']):
+            closed_size = min(qty, size)
+            direction = 1 if position['side'] == 'Buy' else -1
+            pnl = (price - Decimal(position['avgPrice'])) * closed_size * direction
+            self.balance += pnl
+            position['cumRealisedPnl'] = str(Decimal(position['cumRealisedPnl']) + pnl)
+            position['size'] = str(size - closed_size)
+            if size - closed_size == 0:
+                position.update(side='', avgPrice='0', takeProfit='', stopLoss='')
+        else:
+            new_size = size + qty
+            position['avgPrice'] = str((Decimal(position['avgPrice']) * size + price * qty) / new_size)
+            position['size'] = str(new_size)
+            position['side'] = order['side']
+            if order['takeProfit']:
+                position['takeProfit'] = order['takeProfit']
+            if order['stopLoss']:
+                position['stopLoss'] = order['stopLoss']
+        position['updatedTime'] = timestamp
+        self.refresh_position(position)
+
+        order.update(
+            orderStatus='Filled', leavesQty='0', cumExecQty=str(qty),
+            cumExecValue=str(qty * price), avgPrice=str(price), updatedTime=timestamp
+        )
+        execution = {
+            'symbol': order['symbol'],
+            'orderId': order['orderId'],
+            'orderLinkId': order['orderLinkId'],
+            'side': order['side'],
+            'orderType': order['orderType'],
+            'stopOrderType': order['stopOrderType'],
+            'orderPrice': order['price'],
+            'orderQty': order['qty'],
+            'leavesQty': '0',
+            'execId': str(uuid.uuid4()),
+            'execPrice': str(price),
+            'execQty': str(qty),
+            'execValue': str(qty * price),
+            'execFee': str(qty * price * Decimal('0.00055')),
+            'execType': 'Trade',
+            'closedSize': str(closed_size),
+            'isMaker': order['orderType'] == 'Limit',
+            'execTime': timestamp,
+            'category': 'linear'
+        }
+        self.executions.append(execution)
+        self.changed.notify_all()
+        self.publish('order', [dict(order)])
+        self.publish('execution', [dict(execution)])
+        self.publish('position', [dict(position)])
+
+    def cancel_order(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            order = self._cancel(params)
+            return {'orderId': order['orderId'], 'orderLinkId': order['orderLinkId']}
+
+    def _cancel(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        order = self.orders.get(params.get('orderId'))
+        if order is None or order['symbol'] != params.get('symbol') or order['orderStatus'] not in OPEN_STATUSES:
+            raise MockError(110001, 'Order does not exist.')
+        order.update(orderStatus='Cancelled', updatedTime=str(now_ms()))
+        self.changed.notify_all()
+        self.publish('order', [dict(order)])
+        return order
+
+    def _batch(self, action, requests: List[Dict[str, Any]]) -> tuple:
+        results, infos = [], []
+        for request in requests:
+            try:
+                order = action(request)
+                results.append({'category': 'linear', 'symbol': order['symbol'],
+                                'orderId': order['orderId'], 'orderLinkId': order['orderLinkId']})
+                infos.append({'code': 0, 'msg': 'OK'})
+            except MockError as e:
+                results.append({'category': 'linear', 'symbol': request.get('symbol'), 'orderId': '', 'orderLinkId': ''})
+                infos.append({'code': e.ret_code, 'msg': e.ret_msg})
+        return {'list': results}, {'list': infos}
+
+    def place_batch_order(self, params: Dict[str, Any]) -> tuple:
+        with self.lock:
+            return self._batch(self._place, params.get('request', []))
+
+    def cancel_batch_order(self, params: Dict[str, Any]) -> tuple:
+        with self.lock:
+            return self._batch(self._cancel, params.get('request', []))
+
+    # Điều khiển mô phỏng
+
+    def set_price(self, symbol: str, price) -> List[str]:
+        """Đổi giá, khớp các lệnh Limit và TP/SL bị vượt qua; trả về orderId đã khớp."""
+        with self.lock:
+            price = Decimal(str(price))
+            self.symbol_price(symbol)
+            self.prices[symbol] = price
+            self.publish(f"tickers.{symbol}", self.ticker(symbol))
+
+            filled = []
+            for order in list(self.orders.values()):
+                if order['symbol'] != symbol or order['orderStatus'] not in OPEN_STATUSES or order['orderType'] != 'Limit':
+                    continue
+                limit = Decimal(order['price'])
+                if (order['side'] == 'Buy' and price <= limit) or (order['side'] == 'Sell' and price >= limit):
+                    self._fill(order, limit)
+                    filled.append(order['orderId'])
+
+            for (position_symbol, position_idx), position in list(self.positions.items()):
+                if position_symbol != symbol or not Decimal(position['size']):
+                    continue
+                long = position['side'] == 'Buy'
+                for field, stop_type in (('stopLoss', 'StopLoss'), ('takeProfit', 'TakeProfit')):
+                    if not position[field] or not Decimal(position['size']):
+                        continue
+                    level = Decimal(position[field])
+                    hit = (price <= level if long else price >= level) if field == 'stopLoss' \
+                        else (price >= level if long else price <= level)
+                    if hit:
+                        order = self._place({
+                            'symbol': symbol, 'side': 'Sell' if long else 'Buy', 'orderType': 'Market',
+                            'qty': position['size'], 'positionIdx': position_idx, 'reduceOnly': True
+                        }, stop_order_type=stop_type)
+                        filled.append(order['orderId'])
+            return filled
+
+    def fill(self, order_id: str) -> float:
+        """Khớp ngay một lệnh đang mở theo giá của lệnh; trả về time.monotonic() lúc khớp."""
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is None or order['orderStatus'] not in OPEN_STATUSES:
+                raise MockError(110001, 'Order does not exist.')
+            price = Decimal(order['price']) if order['orderType'] == 'Limit' else self.prices[order['symbol']]
+            self.prices[order['symbol']] = price
+            self.publish(f"tickers.{order['symbol']}", self.ticker(order['symbol']))
+            filled_at = time.monotonic()
+            self._fill(order, price)
+            return filled_at
+
+    def wait_for_order(self, predicate, timeout: float = 10.0) -> Dict[str, Any]:
+        """Chờ tới khi có lệnh thỏa predicate (vd. lệnh TP được đặt sau khi entry khớp)."""
+        deadline = time.monotonic() + timeout
+        with self.changed:
+            while True:
+                for order in self.orders.values():
+                    if predicate(order):
+                        return dict(order)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.changed.wait(remaining)
+
+
+class RateWindow:
+    """Đếm request mỗi giây theo endpoint để trả header X-Bapi-Limit-* như sàn."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.windows = {}               # path -> (giây hiện tại, số request)
+
+    def hit(self, path: str) -> tuple:
+        """Trả về (header, còn trong giới hạn hay không)."""
+        limit = ENDPOINT_LIMITS.get(path)
+        if limit is None:
+            return {}, True
+        second = int(time.time())
+        with self.lock:
+            window, count = self.windows.get(path, (second, 0))
+            if window != second:
+                window, count = second, 0
+            count += 1
+            self.windows[path] = (window, count)
+        headers = {
+            'X-Bapi-Limit': str(limit),
+            'X-Bapi-Limit-Status': str(max(0, limit - count)),
+            'X-Bapi-Limit-Reset-Timestamp': str((second + 1) * 1000)
+        }
+        return headers, count <= limit
+
+
+class MockRESTHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.dispatch('GET', url.path, dict(parse_qsl(url.query)))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        try:
+            params = json.loads(body) if body else {}
+        except ValueError:
+            self.send_json(400, {'retCode': 10001, 'retMsg': 'invalid json'})
+            return
+        self.dispatch('POST', urlsplit(self.path).path, params)
+
+    def dispatch(self, method: str, path: str, params: Dict[str, Any]):
+        mock = self.server.mock
+        if path.startswith('/mock/'):
+            self.handle_control(mock, path, params)
+            return
+
+        name = ROUTES.get((method, path))
+        if name is None:
+            self.send_json(404, {'retCode': 10001, 'retMsg': f'{method} {path} not supported by mock'})
+            return
+
+        mock.delay(path)
+        if mock.http_error_rate and random.random() < mock.http_error_rate:
+            self.send_json(503, {'retCode': 10016, 'retMsg': 'Service Unavailable'})
+            return
+
+        headers, allowed = mock.rate_window.hit(path) if mock.enforce_limits else ({}, True)
+        if not allowed:
+            body = {'retCode': 10006, 'retMsg': 'Too many visits!'}
+        elif mock.error_rate and random.random() < mock.error_rate:
+            body = {'retCode': mock.error_code, 'retMsg': 'Injected error'}
+        else:
+            try:
+                result = getattr(mock.exchange, name)(params)
+                ext_info = {}
+                if isinstance(result, tuple):
+                    result, ext_info = result
+                body = {'retCode': 0, 'retMsg': 'OK', 'result': result, 'retExtInfo': ext_info}
+            except MockError as e:
+                body = {'retCode': e.ret_code, 'retMsg': e.ret_msg}
+            except Exception as e:
+                logger.error(f"Mock {path} failed: {str(e)}", exc_info=True)
+                body = {'retCode': 10016, 'retMsg': str(e)}
+        body.setdefault('result', {})
+        body.setdefault('retExtInfo', {})
+        body['time'] = now_ms()
+        self.send_json(200, body, headers)
+
+    def handle_control(self, mock, path: str, params: Dict[str, Any]):
+        try:
+            if path == '/mock/price':
+                result = {'filled': mock.exchange.set_price(params['symbol'], params['price'])}
+            elif path == '/mock/fill':
+                mock.exchange.fill(params['orderId'])
+                result = {'filled': [params['orderId']]}
+            elif path == '/mock/config':
+                mock.configure(**params)
+                result = mock.get_config()
+            else:
+                self.send_json(404, {'error': f'{path} not found'})
+                return
+            self.send_json(200, result)
+        except (MockError, KeyError, TypeError, ValueError) as e:
+            self.send_json(400, {'error': str(e)})
+
+    def send_json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockWSConnection:
+    """Một kết nối WebSocket; mọi frame gửi đi qua một luồng để giữ thứ tự và độ trễ."""
+
+    def __init__(self, sock: socket.socket, path: str, latency_getter):
+        self.sock = sock
+        self.path = path
+        self.private = path.rstrip('/').endswith('/private')
+        self.topics = set()
+        self.latency_getter = latency_getter
+        self.outbox = queue.Queue()
+        self.closed = False
+        threading.Thread(target=self._send_loop, daemon=True).start()
+
+    def send(self, message: Dict[str, Any], delayed: bool = False, min_delay: float = 0.0):
+        due = time.monotonic() + max(min_delay, self.latency_getter() if delayed else 0.0)
+        self.outbox.put((due, 0x1, json.dumps(message).encode('utf-8')))
+
+    def send_frame(self, opcode: int, payload: bytes = b''):
+        self.outbox.put((time.monotonic(), opcode, payload))
+
+    def _send_loop(self):
+        while not self.closed:
+            due, opcode, payload = self.outbox.get()
+            if due > time.monotonic():
+                time.sleep(due - time.monotonic())
+            try:
+                self.sock.sendall(encode_frame(opcode, payload))
+            except OSError:
+                self.closed = True
+
+    def close(self):
+        self.closed = True
+        self.outbox.put((0, 0x8, b''))
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def encode_frame(opcode: int, payload: bytes) -> bytes:
+    length = len(payload)
+    header = bytes([0x80 | opcode])
+    if length < 126:
+        header += bytes([length])
+    elif length < 65536:
+        header += bytes([126]) + length.to_bytes(2, 'big')
+    else:
+        header += bytes([127]) + length.to_bytes(8, 'big')
+    return header + payload
+
+
+def read_exact(sock_file, size: int) -> bytes:
+    data = sock_file.read(size)
+    if len(data) < size:
+        raise ConnectionError('WebSocket closed')
+    return data
+
+
+def read_frame(sock_file) -> tuple:
+    """Đọc một frame từ client (luôn có mask), trả về (opcode, payload)."""
+    first, second = read_exact(sock_file, 2)
+    opcode = first & 0x0f
+    length = second & 0x7f
+    if length == 126:
+        length = int.from_bytes(read_exact(sock_file, 2), 'big')
+    elif length == 127:
+        length = int.from_bytes(read_exact(sock_file, 8), 'big')
+    mask = read_exact(sock_file, 4) if second & 0x80 else None
+    payload = read_exact(sock_file, length)
+    if mask:
+        payload = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+    return opcode, payload
+
+
+class MockWebSocketServer:
+    """WebSocket public (/v5/public/linear) và private (/v5/private) trên cùng một cổng."""
+
+    GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+    def __init__(self, mock, host: str, port: int):
+        self.mock = mock
+        self.server = socket.create_server((host, port))
+        self.port = self.server.getsockname()[1]
+        self.lock = threading.Lock()
+        self.connections = set()
+        self.running = False
+        mock.exchange.listeners.append(self.broadcast)
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._accept_loop, daemon=True, name='mock-ws').start()
+
+    def stop(self):
+        self.running = False
+        self.server.close()
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            connection.close()
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._handle, args=(sock,), daemon=True).start()
+
+    def _handshake(self, sock_file, sock: socket.socket) -> str:
+        request_line = sock_file.readline().decode('latin-1')
+        headers = {}
+        while True:
+            line = sock_file.readline().decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        accept = base64.b64encode(
+            hashlib.sha1((headers['sec-websocket-key'] + self.GUID).encode('ascii')).digest()
+        ).decode('ascii')
+        sock.sendall((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode('ascii'))
+        return request_line.split(' ')[1]
+
+    def _handle(self, sock: socket.socket):
+        sock_file = sock.makefile('rb')
+        connection = None
+        try:
+            path = self._handshake(sock_file, sock)
+            connection = MockWSConnection(sock, path, lambda: self.mock.ws_latency)
+            with self.lock:
+                self.connections.add(connection)
+            while self.running and not connection.closed:
+                opcode, payload = read_frame(sock_file)
+                if opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    connection.send_frame(0xA, payload)
+                elif opcode == 0x1:
+                    self._handle_op(connection, json.loads(payload))
+        except (ConnectionError, OSError, KeyError, ValueError):
+            pass
+        finally:
+            if connection is not None:
+                with self.lock:
+                    self.connections.discard(connection)
+                connection.close()
+            else:
+                sock.close()
+
+    def _handle_op(self, connection: MockWSConnection, message: Dict[str, Any]):
+        op = message.get('op')
+        reply = {'success': True, 'ret_msg': '', 'conn_id': str(id(connection)), 'req_id': message.get('req_id', ''), 'op': op}
+        if op == 'ping':
+            reply['ret_msg'] = 'pong'
+        elif op == 'subscribe':
+            connection.topics.update(message.get('args', []))
+        elif op == 'unsubscribe':
+            connection.topics.difference_update(message.get('args', []))
+        # pybit chỉ ghi nhận req_id sau khi gửi subscribe; trả lời ngay sẽ tới trước và bị báo lỗi
+        min_delay = SUBSCRIBE_REPLY_DELAY if op == 'subscribe' else 0.0
+        connection.send(reply, min_delay=min_delay)
+
+        # Như sàn thật: đăng ký tickers nhận ngay một snapshot
+        if op == 'subscribe' and not connection.private:
+            with self.mock.exchange.lock:
+                snapshots = [
+                    (topic, self.mock.exchange.ticker(topic.split('.', 1)[1]))
+                    for topic in message.get('args', [])
+                    if topic.startswith('tickers.') and topic.split('.', 1)[1] in self.mock.exchange.prices
+                ]
+            for topic, data in snapshots:
+                connection.send(self.ticker_message(topic, data), min_delay=min_delay)
+
+    @staticmethod
+    def ticker_message(topic: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        return {'topic': topic, 'type': 'snapshot', 'data': data, 'cs': now_ms(), 'ts': now_ms()}
+
+    def broadcast(self, topic: str, data):
+        if topic in PRIVATE_TOPICS:
+            message = {'id': str(uuid.uuid4()), 'topic': topic, 'creationTime': now_ms(), 'data': data}
+        else:
+            message = self.ticker_message(topic, data)
+        with self.lock:
+            connections = [
+                connection for connection in self.connections
+                if topic in connection.topics and connection.private == (topic in PRIVATE_TOPICS)
+            ]
+        for connection in connections:
+            connection.send(message, delayed=True)
+
+
+class MockBybit:
+    """Chạy REST và WebSocket giả lập cùng một MockExchange."""
+
+    CONFIG_FIELDS = ('latency', 'jitter', 'path_latency', 'error_rate', 'error_code',
+                     'http_error_rate', 'ws_latency', 'enforce_limits')
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, ws_port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, path_latency: Dict[str, float] = None,
+                 error_rate: float = 0.0, error_code: int = 10016, http_error_rate: float = 0.0,
+                 ws_latency: float = 0.0, enforce_limits: bool = True, instruments: Dict[str, tuple] = None):
+        self.host = host
+        self.port = port
+        self.ws_port = ws_port
+        self.latency = latency
+        self.jitter = jitter
+        self.path_latency = path_latency or {}
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.http_error_rate = http_error_rate
+        self.ws_latency = ws_latency
+        self.enforce_limits = enforce_limits
+        self.exchange = MockExchange(instruments)
+        self.rate_window = RateWindow()
+        self.http_server = None
+        self.ws_server = None
+
+    def start(self) -> 'MockBybit':
+        self.http_server = ThreadingHTTPServer((self.host, self.port), MockRESTHandler)
+        self.http_server.daemon_threads = True
+        self.http_server.mock = self
+        self.port = self.http_server.server_address[1]
+        threading.Thread(target=self.http_server.serve_forever, daemon=True, name='mock-rest').start()
+
+        self.ws_server = MockWebSocketServer(self, self.host, self.ws_port)
+        self.ws_port = self.ws_server.port
+        self.ws_server.start()
+        logger.info(f"Mock Bybit started: REST {self.rest_url}, WS {self.ws_private_url}")
+        return self
+
+    def stop(self):
+        if self.http_server:
+            self.http_server.shutdown()
+            self.http_server.server_close()
+        if self.ws_server:
+            self.ws_server.stop()
+
+    @property
+    def rest_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws_public_url(self) -> str:
+        return f"ws://{self.host}:{self.ws_port}/v5/public/linear"
+
+    @property
+    def ws_private_url(self) -> str:
+        return f"ws://{self.host}:{self.ws_port}/v5/private"
+
+    def env(self) -> Dict[str, str]:
+        """Biến môi trường để TradingBot dùng mock thay cho Bybit."""
+        return {
+            'BYBIT_REST_URL': self.rest_url,
+            'BYBIT_WS_PUBLIC_URL': self.ws_public_url,
+            'BYBIT_WS_PRIVATE_URL': self.ws_private_url
+        }
+
+    def configure(self, **options):
+        for name, value in options.items():
+            if name not in self.CONFIG_FIELDS:
+                raise ValueError(f"Unknown mock option {name}")
+            setattr(self, name, value)
+
+    def get_config(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.CONFIG_FIELDS}
+
+    def delay(self, path: str):
+        latency = self.path_latency.get(path, self.latency)
+        if self.jitter:
+            latency += random.uniform(0, self.jitter)
+        if latency > 0:
+            time.sleep(latency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock Bybit v5 REST + WebSocket server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--ws-port', type=int, default=9101)
+    parser.add_argument('--latency', type=float, default=0.0, help='Độ trễ cố định mỗi request REST (giây)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Độ trễ ngẫu nhiên thêm vào, 0..jitter (giây)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Tỉ lệ request trả retCode lỗi')
+    parser.add_argument('--error-code', type=int, default=10016)
+    parser.add_argument('--http-error-rate', type=float, default=0.0, help='Tỉ lệ request trả HTTP 503')
+    parser.add_argument('--ws-latency', type=float, default=0.0, help='Độ trễ đẩy sự kiện WebSocket (giây)')
+    parser.add_argument('--no-limits', action='store_true', help='Không giới hạn request mỗi giây')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    mock = MockBybit(
+        host=args.host, port=args.port, ws_port=args.ws_port,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, error_code=args.error_code,
+        http_error_rate=args.http_error_rate, ws_latency=args.ws_latency, enforce_limits=not args.no_limits
+    ).start()
+    for name, value in mock.env().items():
+        print(f"{name}={value}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""
+Giới hạn tốc độ gọi REST Bybit v5 phía client.
+
+Mỗi nhóm endpoint có một token bucket theo giới hạn công bố của Bybit (theo UID, mỗi giây),
+cộng thêm một bucket chung cho giới hạn theo IP (600 request / 5 giây). Lệnh quan trọng
+(đặt / hủy lệnh, set_trading_stop) được ưu tiên: request đọc phải nhường khi có lệnh quan trọng
+đang chờ và không được dùng phần token dự phòng của bucket chung.
+
+Sau mỗi response, bucket của nhóm được đồng bộ theo header X-Bapi-Limit, X-Bapi-Limit-Status
+và X-Bapi-Limit-Reset-Timestamp mà sàn trả về.
+"""
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, Any
+
+from pybit.exceptions import FailedRequestError, InvalidRequestError
+
+logger = logging.getLogger(__name__)
+
+CRITICAL = 'critical'
+NORMAL = 'normal'
+
+# Giới hạn mặc định (request / giây) theo tài liệu rate limit của Bybit v5 cho category linear
+ENDPOINT_LIMITS = {
+    'order_create': 10,
+    'order_amend': 10,
+    'order_cancel': 10,
+    'order_cancel_all': 1,
+    'batch_create': 10,
+    'batch_amend': 10,
+    'batch_cancel': 10,
+    'order_realtime': 50,
+    'order_history': 50,
+    'execution_list': 50,
+    'position_list': 50,
+    'set_leverage': 10,
+    'switch_mode': 10,
+    'trading_stop': 10,
+    'wallet_balance': 50,
+    'market': 120,
+    'default': 10
+}
+
+ENDPOINT_GROUPS = {
+    'place_order': 'order_create',
+    'amend_order': 'order_amend',
+    'cancel_order': 'order_cancel',
+    'cancel_all_orders': 'order_cancel_all',
+    'place_batch_order': 'batch_create',
+    'amend_batch_order': 'batch_amend',
+    'cancel_batch_order': 'batch_cancel',
+    'get_open_orders': 'order_realtime',
+    'get_order_history': 'order_history',
+    'get_executions': 'execution_list',
+    'get_positions': 'position_list',
+    'set_leverage': 'set_leverage',
+    'switch_position_mode': 'switch_mode',
+    'set_trading_stop': 'trading_stop',
+    'get_wallet_balance': 'wallet_balance',
+    'get_tickers': 'market',
+    'get_instruments_info': 'market',
+    'get_kline': 'market',
+    'get_orderbook': 'market',
+    'get_server_time': 'market'
+}
+
+CRITICAL_METHODS = {
+    'place_order', 'amend_order', 'cancel_order', 'cancel_all_orders',
+    'place_batch_order', 'amend_batch_order', 'cancel_batch_order', 'set_trading_stop'
+}
+
+# Lệnh batch tính mỗi lệnh con là một request
+BATCH_METHODS = {'place_batch_order', 'amend_batch_order', 'cancel_batch_order'}
+
+
+class TokenBucket:
+    """Token bucket nạp đều rate token mỗi giây, tối đa capacity token. Không tự khóa."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self.remaining = None           # X-Bapi-Limit-Status gần nhất
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float, cost: float, reserve: float = 0.0) -> float:
+        """Số giây cần chờ để lấy được cost token mà vẫn còn lại reserve token."""
+        self.refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        needed = cost + reserve - self.tokens
+        if needed > 0:
+            wait = max(wait, needed / self.rate)
+        return wait
+
+    def sync(self, limit: int, remaining: int, reset_at: float, now: float):
+        """Đồng bộ với giới hạn sàn báo về; reset_at là thời điểm monotonic cửa sổ được làm mới."""
+        if limit and limit != self.rate:
+            logger.info(f"Rate limit adjusted from {self.rate:g}/s to {limit}/s")
+            self.rate = self.capacity = float(limit)
+        self.refill(now)
+        self.remaining = remaining
+        self.tokens = min(self.tokens, float(remaining))
+        if remaining <= 0 and reset_at > now:
+            self.blocked_until = max(self.blocked_until, reset_at)
+
+
+class RateLimiter:
+    """Cấp token cho các nhóm endpoint, ưu tiên lệnh quan trọng và ghi nhận thời gian chờ."""
+
+    def __init__(self, limits: Dict[str, float] = None, ip_limit: float = 120,
+                 critical_reserve: float = 20, history: int = 1000):
+        self.condition = threading.Condition()
+        self.buckets = {group: TokenBucket(rate) for group, rate in (limits or ENDPOINT_LIMITS).items()}
+        self.ip_bucket = TokenBucket(ip_limit)
+        self.critical_reserve = critical_reserve
+        self.critical_waiting = 0
+        self.waits = {CRITICAL: deque(maxlen=history), NORMAL: deque(maxlen=history)}
+        self.counts = {CRITICAL: 0, NORMAL: 0}
+
+    def bucket(self, group: str) -> TokenBucket:
+        if group not in self.buckets:
+            self.buckets[group] = TokenBucket(ENDPOINT_LIMITS['default'])
+        return self.buckets[group]
+
+    def acquire(self, group: str, priority: str = NORMAL, cost: int = 1) -> float:
+        """Chờ tới khi lấy được token, trả về thời gian đã chờ (giây)."""
+        started = time.monotonic()
+        with self.condition:
+            bucket = self.bucket(group)
+            cost = min(cost, bucket.capacity)
+            throttled = False
+            if priority == CRITICAL:
+                self.critical_waiting += 1
+            try:
+                while True:
+                    wait = self._wait_time(bucket, time.monotonic(), priority, cost)
+                    if wait <= 0:
+                        break
+                    throttled = True
+                    self.condition.wait(wait)
+                self._take(bucket, priority, cost, throttled)
+            finally:
+                if priority == CRITICAL:
+                    self.critical_waiting -= 1
+                    self.condition.notify_all()
+
+            waited = time.monotonic() - started
+            self.waits[priority].append(waited)
+        return waited
+
+    def try_acquire(self, group: str, priority: str = NORMAL, cost: int = 1, started: float = None,
+                    throttled: bool = False) -> float:
+        """
+        Lấy token nếu có ngay và trả về 0, ngược lại trả về số giây nên chờ trước khi thử lại.
+
+        Không chặn luồng gọi, dùng cho client async (chờ bằng asyncio.sleep). started là
+        time.monotonic() lúc request bắt đầu chờ, throttled cho biết request đã phải chờ lần nào chưa.
+        """
+        with self.condition:
+            bucket = self.bucket(group)
+            cost = min(cost, bucket.capacity)
+            now = time.monotonic()
+            wait = self._wait_time(bucket, now, priority, cost)
+            if wait > 0:
+                return wait
+            self._take(bucket, priority, cost, throttled)
+            self.waits[priority].append(now - started if started is not None else 0.0)
+        return 0.0
+
+    def _wait_time(self, bucket: TokenBucket, now: float, priority: str, cost: float) -> float:
+        """Số giây cần chờ để lấy cost token của bucket và bucket chung; gọi khi đang giữ condition."""
+        wait = bucket.wait_time(now, cost)
+        if priority == CRITICAL:
+            return max(wait, self.ip_bucket.wait_time(now, cost))
+        wait = max(wait, self.ip_bucket.wait_time(now, cost, self.critical_reserve))
+        if self.critical_waiting:
+            # Nhường lệnh quan trọng; được đánh thức khi chúng lấy xong token
+            wait = max(wait, 0.05)
+        return wait
+
+    def _take(self, bucket: TokenBucket, priority: str, cost: float, throttled: bool):
+        bucket.tokens -= cost
+        self.ip_bucket.tokens -= cost
+        bucket.throttled += throttled
+        self.counts[priority] += 1
+
+    def update(self, group: str, headers):
+        """Đồng bộ bucket của nhóm theo header rate limit của response."""
+        if not headers or 'X-Bapi-Limit-Status' not in headers:
+            return
+        try:
+            limit = int(headers.get('X-Bapi-Limit', 0))
+            remaining = int(headers['X-Bapi-Limit-Status'])
+            reset_ms = int(headers.get('X-Bapi-Limit-Reset-Timestamp', 0))
+        except (TypeError, ValueError):
+            return
+        with self.condition:
+            now = time.monotonic()
+            reset_at = now + max(0.0, reset_ms / 1000 - time.time()) if reset_ms else 0.0
+            self.bucket(group).sync(limit, remaining, reset_at, now)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Thời gian chờ (ms) theo mức ưu tiên và trạng thái các bucket đã dùng."""
+        with self.condition:
+            waits = {priority: sorted(values) for priority, values in self.waits.items()}
+            counts = dict(self.counts)
+            now = time.monotonic()
+            for bucket in list(self.buckets.values()) + [self.ip_bucket]:
+                bucket.refill(now)
+            buckets = {
+                group: {
+                    'rate': bucket.rate,
+                    'tokens': round(bucket.tokens, 2),
+                    'remaining': bucket.remaining,
+                    'throttled': bucket.throttled
+                }
+                for group, bucket in self.buckets.items()
+                if bucket.throttled or bucket.remaining is not None or bucket.tokens < bucket.capacity
+            }
+            ip_tokens = round(self.ip_bucket.tokens, 2)
+
+        def percentile(values, p):
+            if not values:
+                return 0.0
+            return round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 2)
+
+        return {
+            'wait_ms': {
+                priority: {
+                    'requests': counts[priority],
+                    'p50': percentile(values, 0.5),
+                    'p99': percentile(values, 0.99),
+                    'max': percentile(values, 1.0)
+                }
+                for priority, values in waits.items()
+            },
+            'ip_tokens': ip_tokens,
+            'buckets': buckets
+        }
+
+
+class RateLimitedHTTP:
+    """
+    Bọc pybit HTTP: mỗi lời gọi lấy token của nhóm endpoint trước khi gửi.
+
+    Client bên trong phải tạo với return_response_headers=True để đọc header rate limit;
+    kết quả trả về cho bên gọi vẫn chỉ là dict response như pybit thông thường.
+    """
+
+    def __init__(self, client, limiter: RateLimiter):
+        self.client = client
+        self.limiter = limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+        return functools.partial(self._call, name, attr)
+
+    def _call(self, name: str, method, *args, **kwargs):
+        group = ENDPOINT_GROUPS.get(name, 'default')
+        priority = CRITICAL if name in CRITICAL_METHODS else NORMAL
+        cost = (len(kwargs.get('request') or []) or 1) if name in BATCH_METHODS else 1
+
+        waited = self.limiter.acquire(group, priority, cost)
+        if waited > 1:
+            logger.warning(f"{name} waited {waited:.2f}s for rate limit ({group})")
+
+        try:
+            response = method(*args, **kwargs)
+        except (InvalidRequestError, FailedRequestError) as e:
+            self.limiter.update(group, getattr(e, 'resp_headers', None))
+            raise
+
+        if isinstance(response, tuple):
+            response, _, headers = response
+            self.limiter.update(group, headers)
+        return response
@@ -0,0 +1,124 @@
+"""
+Hàng đợi tín hiệu bền vững trên SQLite (WAL) cho chế độ ingest.
+
+API chỉ kiểm tra, chuyển đổi và ghi tín hiệu vào hàng đợi rồi trả về ticket; tiến trình
+signal_worker.py lấy tín hiệu ra và chạy create_order_best. Tín hiệu đang chờ vẫn còn sau khi
+khởi động lại.
+
+Trạng thái ticket: queued -> processing -> done | failed
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Any
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    result TEXT,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_signals_status ON signals (status, id);
+"""
+
+
+class SignalQueue:
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv('SIGNAL_QUEUE_PATH', 'signal_queue.db')
+        self.local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Mỗi thread một kết nối SQLite (sqlite3 không dùng chung kết nối giữa các thread)."""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            # FULL: tín hiệu đã trả 202 không bị mất kể cả khi mất điện
+            connection.execute("PRAGMA synchronous=FULL")
+            self.local.connection = connection
+        return connection
+
+    def enqueue(self, kind: str, payload: Dict[str, Any]) -> str:
+        """Ghi tín hiệu vào hàng đợi, trả về ticket."""
+        ticket = uuid.uuid4().hex
+        self._connection().execute(
+            "INSERT INTO signals (ticket, kind, payload, created_at) VALUES (?, ?, ?, ?)",
+            (ticket, kind, json.dumps(payload), time.time())
+        )
+        return ticket
+
+    def claim(self, worker: str) -> Dict[str, Any]:
+        """Lấy tín hiệu cũ nhất đang chờ và đánh dấu processing; None nếu hàng đợi rỗng."""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT * FROM signals WHERE status = 'queued' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            started_at = time.time()
+            connection.execute(
+                "UPDATE signals SET status = 'processing', worker = ?, started_at = ? WHERE id = ?",
+                (worker, started_at, row['id'])
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        signal = dict(row)
+        signal.update(status='processing', worker=worker, started_at=started_at, payload=json.loads(row['payload']))
+        return signal
+
+    def finish(self, signal_id: int, status: str, result: Dict[str, Any]):
+        self._connection().execute(
+            "UPDATE signals SET status = ?, result = ?, finished_at = ? WHERE id = ?",
+            (status, json.dumps(result, default=str), time.time(), signal_id)
+        )
+
+    def fail_interrupted(self) -> int:
+        """
+        Đánh dấu failed các tín hiệu đang processing khi worker trước đó dừng giữa chừng.
+
+        Không chạy lại vì lệnh có thể đã được đặt trên sàn trước khi worker dừng.
+        """
+        return self._connection().execute(
+            "UPDATE signals SET status = 'failed', result = ?, finished_at = ? WHERE status = 'processing'",
+            (json.dumps({'error': 'Worker stopped while processing signal'}), time.time())
+        ).rowcount
+
+    def get(self, ticket: str) -> Dict[str, Any]:
+        row = self._connection().execute("SELECT * FROM signals WHERE ticket = ?", (ticket,)).fetchone()
+        if row is None:
+            return None
+        signal = dict(row)
+        signal['payload'] = json.loads(signal['payload'])
+        signal['result'] = json.loads(signal['result']) if signal['result'] else None
+        return signal
+
+    def stats(self) -> Dict[str, Any]:
+        """Số tín hiệu theo trạng thái và tuổi của tín hiệu cũ nhất đang chờ (giây)."""
+        connection = self._connection()
+        counts = {row['status']: row['total'] for row in connection.execute(
+            "SELECT status, COUNT(*) AS total FROM signals GROUP BY status"
+        )}
+        oldest = connection.execute(
+            "SELECT MIN(created_at) AS created_at FROM signals WHERE status = 'queued'"
+        ).fetchone()['created_at']
+        return {
+            'counts': counts,
+            'oldest_queued_age': round(time.time() - oldest, 3) if oldest else 0.0
+        }
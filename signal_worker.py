@@ -0,0 +1,83 @@
+"""
+Tiến trình đặt lệnh cho chế độ ingest (SIGNAL_INGEST=1).
+
+Lấy các tín hiệu từ hàng đợi SQLite do trading_api ghi vào và chạy create_order_best qua
+SymbolExecutor: các symbol khác nhau chạy song song, cùng symbol chạy đúng thứ tự trong hàng đợi.
+Số tín hiệu đã lấy ra nhưng chưa xong được giới hạn bởi SIGNAL_WORKER_PREFETCH.
+Tiến trình không mở WebSocket và không chạy công việc định kỳ; các việc đó vẫn do tiến trình API
+đảm nhận. Chỉ chạy một tiến trình worker cho mỗi file hàng đợi.
+
+Cách chạy:
+    python signal_worker.py
+"""
+import logging
+import os
+import socket
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from signal_queue import SignalQueue
+from trading_bot import TradingBot
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.getenv('SIGNAL_WORKER_POLL_INTERVAL', 0.2))
+
+
+def finish(signal_queue: SignalQueue, queued_signal: dict, future, slots: threading.Semaphore):
+    try:
+        result = future.result()
+        status = 'failed' if 'error' in result else 'done'
+    except Exception as e:
+        logger.error(f"Error processing signal {queued_signal['ticket']}: {str(e)}", exc_info=True)
+        result, status = {'error': str(e)}, 'failed'
+    finally:
+        slots.release()
+
+    signal_queue.finish(queued_signal['id'], status, result)
+    timings = future.timings
+    logger.info(
+        f"Signal {queued_signal['ticket']} {status}: "
+        f"queued {queued_signal['started_at'] - queued_signal['created_at']:.3f}s "
+        f"+ {timings['queued_ms'] / 1000:.3f}s, executed {timings['exec_ms'] / 1000:.3f}s"
+    )
+
+
+def main():
+    env = os.getenv('EVN', 'testnet')
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    signal_queue = SignalQueue()
+    bot = TradingBot(testnet=(env == 'testnet'), start_jobs=False)
+
+    interrupted = signal_queue.fail_interrupted()
+    if interrupted:
+        logger.warning(f"Marked {interrupted} interrupted signals as failed")
+    # Lấy trước nhiều hơn số luồng để tín hiệu của symbol khác không bị chặn sau một symbol bận
+    prefetch = int(os.getenv('SIGNAL_WORKER_PREFETCH', bot.signal_executor.concurrency * 4))
+    slots = threading.Semaphore(prefetch)
+    logger.info(f"Signal worker {worker} started, queue: {signal_queue.path}, prefetch: {prefetch}")
+
+    while bot.running:
+        slots.acquire()
+        queued_signal = signal_queue.claim(worker)
+        if queued_signal is None:
+            slots.release()
+            time.sleep(POLL_INTERVAL)
+            continue
+        payload = queued_signal['payload']
+        future = bot.execute_signal(payload['signal'], payload['order_type'])
+        future.add_done_callback(
+            lambda future, queued_signal=queued_signal: finish(signal_queue, queued_signal, future, slots)
+        )
+
+
+if __name__ == '__main__':
+    main()
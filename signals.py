@@ -0,0 +1,115 @@
+"""
+Kiểm tra và chuyển đổi tín hiệu nhận từ các endpoint order_best / order_ema / orders.
+
+Các hàm ở đây không gọi sàn hay database để dùng chung giữa trading_api (Flask) và
+trading_api_asgi (chế độ async).
+"""
+from datetime import datetime
+from typing import Dict, Any
+
+SIGNAL_REQUIRED_FIELDS = ['asset', 'position', 'entry1', 'leverage', 'tp1', 'stoploss', 'bot', 'tp2', 'tp3']
+ORDER_REQUIRED_FIELDS = ['symbol', 'side', 'entry', 'strategy_type', 'leverage', 'tp1_price', 'sl_price', 'bot_name', 'tp2_price']
+
+
+def check_signal_window(now: datetime = None) -> str:
+    """Tín hiệu chỉ được nhận trong 10 phút đầu mỗi giờ; trả về thông báo lỗi hoặc None."""
+    now = now or datetime.now()
+    if now.minute > 10:
+        return 'Minutes must be less than 10'
+    return None
+
+
+def has_fields(data: Dict[str, Any], required_fields: list) -> bool:
+    return bool(data) and all(field in data for field in required_fields)
+
+
+def format_symbol(asset: str) -> str:
+    """'BTC/USDT' -> 'BTCUSDT'."""
+    base, quote = asset.split('/')
+    return f"{base}{quote}"
+
+
+def build_best_signal(data: Dict[str, Any], last_price: float) -> tuple:
+    """
+    Chuyển tín hiệu order_best theo giá hiện tại.
+
+    Returns:
+        tuple: (signal, loại lệnh 'ema'|'best') hoặc (None, thông báo lỗi)
+    """
+    formated_symbol = format_symbol(data['asset'])
+    percentage = (float(data['entry1']) - last_price) / last_price * 100
+
+    signal = {
+        'asset': formated_symbol,
+        'position': data['position'],
+        'entry1': float(data['entry1']),
+        'leverage': int(data['leverage']),
+        'tp1': float(data['tp1']),
+        'tp2': float(data['tp2']),
+        'tp3': float(data['tp3']),
+        'stoploss': float(data['stoploss']),
+        'bot': "bestsignal"
+    }
+
+    if signal["asset"] == "BNBUSDT" and signal["asset"] == "ADAUSDT" and signal["asset"] == "ATOMUSDT" and signal["asset"] == "AVAXUSDT":
+        return None, 'BNBUSDT is not supported'
+
+    if percentage > -1 and percentage < 1:
+        # signal["stoploss"] = signal["stoploss"] - percentage*last_price/100
+        signal["tp1"] = signal["tp1"] - percentage*last_price/100
+        signal["tp2"] = signal["tp2"] - percentage*last_price/100
+        signal["tp3"] = signal["tp3"] - percentage*last_price/100
+        signal["entry1"] = signal["entry1"] - percentage*last_price/100
+        if signal["position"] == "LONG" and (signal["tp1"] - signal["entry1"])/signal["tp1"] > 0.017:
+            signal["tp1"] = signal["entry1"] + 0.017*signal["tp1"]
+        if signal["position"] == "SHORT" and (signal["entry1"] - signal["tp1"])/signal["entry1"] > 0.017:
+            signal["tp1"] = signal["entry1"] - 0.017*signal["entry1"]
+        return signal, 'ema'
+
+    if signal["position"] == "LONG":
+        signal["stoploss"] = signal["stoploss"] + signal["stoploss"] * 0.01
+        signal["tp1"] = signal["tp1"] + signal["tp1"] * 0.01
+        signal["tp2"] = signal["tp2"] + signal["tp2"] * 0.01
+        signal["tp3"] = signal["tp3"] + signal["tp3"] * 0.01
+        signal["entry1"] = signal["entry1"] + signal["entry1"] * 0.01
+    else:
+        signal["stoploss"] = signal["stoploss"] - signal["stoploss"] * 0.01
+        signal["tp1"] = signal["tp1"] - signal["tp1"] * 0.01
+        signal["tp2"] = signal["tp2"] - signal["tp2"] * 0.01
+        signal["tp3"] = signal["tp3"] - signal["tp3"] * 0.01
+        signal["entry1"] = signal["entry1"] - signal["entry1"] * 0.01
+    if signal["position"] == "LONG" and (signal["tp1"] - signal["entry1"])/signal["tp1"] > 0.017:
+        signal["tp1"] = signal["entry1"] + 0.017*signal["tp1"]
+    if signal["position"] == "SHORT" and (signal["entry1"] - signal["tp1"])/signal["entry1"] > 0.017:
+        signal["tp1"] = signal["entry1"] - 0.017*signal["entry1"]
+    return signal, 'best'
+
+
+def build_ema_signal(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Tín hiệu order_ema được dùng nguyên giá, chỉ chuẩn hóa kiểu dữ liệu."""
+    return {
+        'asset': data['asset'],
+        'position': data['position'],
+        'entry1': float(data['entry1']),
+        'leverage': int(data['leverage']),
+        'tp1': float(data['tp1']),
+        'tp2': float(data['tp2']),
+        'tp3': float(data['tp3']),
+        'stoploss': float(data['stoploss']),
+        'bot': "ema"
+    }
+
+
+def build_order_signal(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Tín hiệu cho /api/v1/orders (create_order)."""
+    return {
+        'symbol': data['symbol'],
+        'side': data['side'],
+        'entry': float(data['entry']),
+        'strategy_type': data['strategy_type'],
+        'leverage': int(data['leverage']),
+        'tp1_price': float(data['tp1_price']),
+        'tp2_price': float(data['tp2_price']),
+        'sl_price': float(data['sl_price']),
+        'bot_name': data['bot_name']
+    }
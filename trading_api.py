@@ -1,7 +1,11 @@
 from flask import Flask, request, jsonify
 from trading_bot import TradingBot
+from signal_queue import SignalQueue
+from signals import (
+    SIGNAL_REQUIRED_FIELDS, ORDER_REQUIRED_FIELDS, check_signal_window, has_fields,
+    format_symbol, build_best_signal, build_ema_signal, build_order_signal
+)
 import logging
-from datetime import datetime
 import threading
 from flask_cors import CORS
 import os
@@ -23,6 +27,8 @@ CORS(app)
 
 env = os.getenv('EVN', 'testnet')
 bot = TradingBot(testnet=(env == 'testnet'))
+# Chế độ ingest: tín hiệu được ghi vào hàng đợi, signal_worker.py đặt lệnh
+signal_queue = SignalQueue() if os.getenv('SIGNAL_INGEST', '0') == '1' else None
 
 # Khởi động WebSocket tự động khi ứng dụng bắt đầu
 try:
@@ -39,82 +45,45 @@ def signal_handler(sig, frame):
     sys.exit(0)
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
+def submit_signal(kind, signal, order_type):
+    """
+    Đặt lệnh ngay, hoặc ở chế độ ingest thì ghi vào hàng đợi.
+
+    Returns:
+        tuple: (body, HTTP status)
+    """
+    if signal_queue is not None:
+        ticket = signal_queue.enqueue(kind, {'signal': signal, 'order_type': order_type})
+        logger.info(f"Signal {signal.get('asset')} queued with ticket {ticket}")
+        return {'ticket': ticket, 'status': 'queued'}, 202
+
+    return signal_response(bot.execute_signal(signal, order_type).result())
+
+def signal_response(result):
+    if 'error' in result:
+        return {'error': result['error']}, 400
+    return result, 201
+
 @app.route('/api/v1/order_best', methods=['POST'])
 def create_order_best():
     """API để lấy danh sách lệnh giao dịch."""
-    current_time = datetime.now()
-    minutes = current_time.minute
-
-    if minutes > 10:
-        return jsonify({'error': 'Minutes must be less than 10'}), 400
+    window_error = check_signal_window()
+    if window_error:
+        return jsonify({'error': window_error}), 400
     try:
         data = request.get_json()
-        required_fields = ['asset', 'position', 'entry1', 'leverage', 'tp1', 'stoploss', 'bot', 'tp2', 'tp3']
         print("12345", data)
-        if not all(field in data for field in required_fields):
+        if not has_fields(data, SIGNAL_REQUIRED_FIELDS):
             return jsonify({'error': 'Missing required fields'}), 400
-        base, quote = data['asset'].split('/')
-        formated_symbol = f"{base}{quote}"
 
-        resp = bot.client.get_tickers(
-            category="linear",   # linear = USDT Perp (futures)
-            symbol=formated_symbol
-        )
-        last_price = float(resp['result']['list'][0]['lastPrice'])
-
-        percentage = (float(data['entry1']) - last_price) / last_price * 100
-
-        signal = {
-            'asset': formated_symbol,
-            'position': data['position'],
-            'entry1': float(data['entry1']),
-            'leverage': int(data['leverage']),
-            'tp1': float(data['tp1']),
-            'tp2': float(data['tp2']),
-            'tp3': float(data['tp3']),
-            'stoploss': float(data['stoploss']),
-            'bot': "bestsignal"
-        }
-
-        if signal["asset"] == "BNBUSDT" and signal["asset"] == "ADAUSDT" and signal["asset"] == "ATOMUSDT" and signal["asset"] == "AVAXUSDT":
-           return jsonify({'error': 'BNBUSDT is not supported'}), 400
+        last_price = bot.prices.get(format_symbol(data['asset']))
+        signal, order_type = build_best_signal(data, last_price)
+        if signal is None:
+            return jsonify({'error': order_type}), 400
 
         print(signal)
-        result = []
-        if percentage > -1 and percentage < 1:
-            # signal["stoploss"] = signal["stoploss"] - percentage*last_price/100
-            signal["tp1"] = signal["tp1"] - percentage*last_price/100
-            signal["tp2"] = signal["tp2"] - percentage*last_price/100
-            signal["tp3"] = signal["tp3"] - percentage*last_price/100
-            signal["entry1"] = signal["entry1"] - percentage*last_price/100
-            if signal["position"] == "LONG" and (signal["tp1"] - signal["entry1"])/signal["tp1"] > 0.017:
-                signal["tp1"] = signal["entry1"] + 0.017*signal["tp1"]
-            if signal["position"] == "SHORT" and (signal["entry1"] - signal["tp1"])/signal["entry1"] > 0.017:
-                signal["tp1"] = signal["entry1"] - 0.017*signal["entry1"]
-
-            result = bot.create_order_best(signal,'ema')
-        else:
-            if signal["position"] == "LONG":
-                signal["stoploss"] = signal["stoploss"] + signal["stoploss"] * 0.01
-                signal["tp1"] = signal["tp1"] + signal["tp1"] * 0.01
-                signal["tp2"] = signal["tp2"] + signal["tp2"] * 0.01
-                signal["tp3"] = signal["tp3"] + signal["tp3"] * 0.01
-                signal["entry1"] = signal["entry1"] + signal["entry1"] * 0.01
-            else:
-                signal["stoploss"] = signal["stoploss"] - signal["stoploss"] * 0.01
-                signal["tp1"] = signal["tp1"] - signal["tp1"] * 0.01
-                signal["tp2"] = signal["tp2"] - signal["tp2"] * 0.01
-                signal["tp3"] = signal["tp3"] - signal["tp3"] * 0.01
-                signal["entry1"] = signal["entry1"] - signal["entry1"] * 0.01
-            if signal["position"] == "LONG" and (signal["tp1"] - signal["entry1"])/signal["tp1"] > 0.017:
-                signal["tp1"] = signal["entry1"] + 0.017*signal["tp1"]
-            if signal["position"] == "SHORT" and (signal["entry1"] - signal["tp1"])/signal["entry1"] > 0.017:
-                signal["tp1"] = signal["entry1"] - 0.017*signal["entry1"]
-            result = bot.create_order_best(signal,'best')
-
-        if 'error' in result:
-            return jsonify({'error': result['error']}), 400
-        return jsonify(result), 201
+        body, status = submit_signal('order_best', signal, order_type)
+        return jsonify(body), status
 
     except Exception as e:
         logger.error(f"Error in create_order_best API: {str(e)}")
@@ -124,33 +93,16 @@ def create_order_best():
 def create_order_ema():
     """API để lấy danh sách lệnh giao dịch."""
     try:
-        current_time = datetime.now()
-        minutes = current_time.minute
-
-        if minutes > 10:
-            return jsonify({'error': 'Minutes must be less than 10'}), 400
+        window_error = check_signal_window()
+        if window_error:
+            return jsonify({'error': window_error}), 400
 
         data = request.get_json()
-        required_fields = ['asset', 'position', 'entry1', 'leverage', 'tp1', 'stoploss', 'bot', 'tp2', 'tp3']
-        if not all(field in data for field in required_fields):
+        if not has_fields(data, SIGNAL_REQUIRED_FIELDS):
             return jsonify({'error': 'Missing required fields'}), 400
 
-        signal = {
-            'asset': data['asset'],
-            'position': data['position'],
-            'entry1': float(data['entry1']),
-            'leverage': int(data['leverage']),
-            'tp1': float(data['tp1']),
-            'tp2': float(data['tp2']),
-            'tp3': float(data['tp3']),
-            'stoploss': float(data['stoploss']),
-            'bot': "ema"
-        }
-
-        result = bot.create_order_best(signal,'ema')
-        if 'error' in result:
-            return jsonify({'error': result['error']}), 400
-        return jsonify(result), 201
+        body, status = submit_signal('order_ema', build_ema_signal(data), 'ema')
+        return jsonify(body), status
 
     except Exception as e:
         logger.error(f"Error in create_order_ema API: {str(e)}")
@@ -160,23 +112,10 @@ def create_order():
     """API để tạo lệnh giao dịch mới."""
     try:
         data = request.get_json()
-        required_fields = ['symbol', 'side', 'entry', 'strategy_type', 'leverage', 'tp1_price', 'sl_price', 'bot_name', 'tp2_price']
-        if not all(field in data for field in required_fields):
+        if not has_fields(data, ORDER_REQUIRED_FIELDS):
             return jsonify({'error': 'Missing required fields'}), 400
 
-        signal = {
-            'symbol': data['symbol'],
-            'side': data['side'],
-            'entry': float(data['entry']),
-            'strategy_type': data['strategy_type'],
-            'leverage': int(data['leverage']),
-            'tp1_price': float(data['tp1_price']),
-            'tp2_price': float(data['tp2_price']),
-            'sl_price': float(data['sl_price']),
-            'bot_name': data['bot_name']
-        }
-
-        result = bot.create_order(signal)
+        result = bot.create_order(build_order_signal(data))
         if 'error' in result:
             return jsonify({'error': result['error']}), 400
         return jsonify(result), 201
@@ -185,6 +124,20 @@ def create_order():
         logger.error(f"Error in create_order API: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/v1/signals/<ticket>', methods=['GET'])
+def get_signal(ticket):
+    """API để xem trạng thái tín hiệu đã ghi vào hàng đợi (chế độ ingest)."""
+    try:
+        if signal_queue is None:
+            return jsonify({'error': 'Signal ingest mode is disabled'}), 404
+        queued_signal = signal_queue.get(ticket)
+        if not queued_signal:
+            return jsonify({'error': 'Ticket not found'}), 404
+        return jsonify(queued_signal), 200
+    except Exception as e:
+        logger.error(f"Error in get_signal API: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/v1/orders/<int:trade_id>/status', methods=['GET'])
 def check_order_status(trade_id):
     """API để kiểm tra trạng thái lệnh."""
@@ -247,10 +200,11 @@ def close_position(trade_id):
         if not trade:
             return jsonify({'error': 'Trade not found'}), 404
 
-        ticker = bot.client.get_tickers(category='linear', symbol=trade['symbol'])
-        if ticker['retCode'] != 0:
+        try:
+            current_price = bot.prices.get(trade['symbol'])
+        except Exception as e:
+            logger.error(f"Error getting price for {trade['symbol']}: {str(e)}")
             return jsonify({'error': 'Failed to get current price'}), 500
-        current_price = float(ticker['result']['list'][0]['lastPrice'])
 
         success = bot.close_position(trade_id, percentage, current_price)
         if not success:
@@ -261,6 +215,33 @@ def close_position(trade_id):
         logger.error(f"Error in close_position API: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def serialize_trade(trade):
+    """Chuyển dòng trades (Decimal, datetime) sang dict JSON."""
+    return {
+        'id': trade['id'],
+        'order_id': trade['order_id'],
+        'symbol': trade['symbol'],
+        'side': trade['side'],
+        'entry_price': float(trade['entry_price']) if trade['entry_price'] is not None else None,
+        'quantity': float(trade['quantity']) if trade['quantity'] is not None else None,
+        'position_size': float(trade['position_size']) if trade['position_size'] is not None else None,
+        'leverage': int(trade['leverage']) if trade['leverage'] is not None else None,
+        'tp1_price': float(trade['tp1_price']) if trade['tp1_price'] is not None else None,
+        'tp2_price': float(trade['tp2_price']) if trade['tp2_price'] is not None else None,
+        'tp3_price': float(trade['tp3_price']) if trade['tp3_price'] is not None else None,
+        'sl_price': float(trade['sl_price']) if trade['sl_price'] is not None else None,
+        'current_sl': float(trade['current_sl']) if trade['current_sl'] is not None else None,
+        'current_tp': float(trade['current_tp']) if trade['current_tp'] is not None else None,
+        'strategy_type': trade['strategy_type'],
+        'status': trade['status'],
+        'bot_name': trade['bot_name'] if trade['bot_name'] is not None else 'N/A',
+        'pnl': float(trade['pnl']) if trade['pnl'] is not None else None,
+        'pnl_percent': float(trade['pnl_percent']) if trade['pnl_percent'] is not None else None,
+        'filled_at': trade['filled_at'].isoformat() if trade['filled_at'] is not None else None,
+        'closed_at': trade['closed_at'].isoformat() if trade['closed_at'] is not None else None,
+        'updated_at': trade['updated_at'].isoformat() if trade['updated_at'] is not None else None
+    }
+
 @app.route('/api/v1/trades/<int:trade_id>', methods=['GET'])
 def get_trade(trade_id):
     """API để lấy thông tin giao dịch."""
@@ -268,30 +249,7 @@ def get_trade(trade_id):
         trade = bot.get_trade_by_id(trade_id)
         if not trade:
             return jsonify({'error': 'Trade not found'}), 404
-        return jsonify({
-            'id': trade['id'],
-            'order_id': trade['order_id'],
-            'symbol': trade['symbol'],
-            'side': trade['side'],
-            'entry_price': float(trade['entry_price']) if trade['entry_price'] is not None else None,
-            'quantity': float(trade['quantity']) if trade['quantity'] is not None else None,
-            'position_size': float(trade['position_size']) if trade['position_size'] is not None else None,
-            'leverage': int(trade['leverage']) if trade['leverage'] is not None else None,
-            'tp1_price': float(trade['tp1_price']) if trade['tp1_price'] is not None else None,
-            'tp2_price': float(trade['tp2_price']) if trade['tp2_price'] is not None else None,
-            'tp3_price': float(trade['tp3_price']) if trade['tp3_price'] is not None else None,
-            'sl_price': float(trade['sl_price']) if trade['sl_price'] is not None else None,
-            'current_sl': float(trade['current_sl']) if trade['current_sl'] is not None else None,
-            'current_tp': float(trade['current_tp']) if trade['current_tp'] is not None else None,
-            'strategy_type': trade['strategy_type'],
-            'status': trade['status'],
-            'bot_name': trade['bot_name'] if trade['bot_name'] is not None else 'N/A',
-            'pnl': float(trade['pnl']) if trade['pnl'] is not None else None,
-            'pnl_percent': float(trade['pnl_percent']) if trade['pnl_percent'] is not None else None,
-            'filled_at': trade['filled_at'].isoformat() if trade['filled_at'] is not None else None,
-            'closed_at': trade['closed_at'].isoformat() if trade['closed_at'] is not None else None,
-            'updated_at': trade['updated_at'].isoformat() if trade['updated_at'] is not None else None
-        }), 200
+        return jsonify(serialize_trade(trade)), 200
 
     except Exception as e:
         logger.error(f"Error in get_trade API: {str(e)}")
@@ -327,6 +285,18 @@ def health_check():
         logger.error(f"Health check failed: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/v1/metrics', methods=['GET'])
+def get_metrics():
+    """API để lấy các chỉ số vận hành của bot."""
+    try:
+        metrics = bot.get_metrics()
+        if signal_queue is not None:
+            metrics['signal_queue'] = signal_queue.stats()
+        return jsonify(metrics), 200
+    except Exception as e:
+        logger.error(f"Error getting metrics: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/v1/balance', methods=['GET'])
 def get_balance():
     """API để lấy thông tin số dư tài khoản."""
@@ -363,32 +333,15 @@ def get_balance():
 @app.route('/api/v1/trades', methods=['GET'])
 def get_trades():
     """API để lấy danh sách lệnh giao dịch với bộ lọc bot_nasme và status."""
-    resp = bot.client.get_tickers(
-    category="linear",   # linear = USDT Perp (futures)
-    symbol="BNBUSDT"
-    )
-    last_price = resp['result']['list'][0]['lastPrice']
-    mark_price = resp['result']['list'][0]['markPrice']
-    index_price = resp['result']['list'][0]['indexPrice']
-
-    print(f"Futures BNBUSDT: last={last_price}, mark={mark_price}, index={index_price}")
     try:
         bot_name = request.args.get('bot_name', '')
         status = request.args.get('status', '')
 
-        # Lấy tất cả lệnh từ hàm get_trade
-        trades = bot.get_all_orders()
-
-
-        # Áp dụng bộ lọc
-        filtered_trades = trades
-        if bot_name:
-            filtered_trades = [trade for trade in filtered_trades if bot_name.lower() in trade['bot_name'].lower()]
-        if status:
-            if status == 'all':
-                filtered_trades = trades
-            else:
-                filtered_trades = [trade for trade in filtered_trades if trade['status'] == status]
+        # Lấy lệnh từ bản sao trong bộ nhớ, lọc qua chỉ mục
+        if status == 'all':
+            filtered_trades = bot.get_orders()
+        else:
+            filtered_trades = bot.get_orders(bot_name=bot_name, status=status)
 
         logger.info(f"Retrieved {len(filtered_trades)} trades with filters bot_name='{bot_name}', status='{status}'")
         return jsonify(filtered_trades), 200
@@ -397,6 +350,39 @@ def get_trades():
         logger.error(f"Error fetching trades: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/v1/orders/history', methods=['GET'])
+def get_order_history():
+    """API để lấy lịch sử lệnh đã đồng bộ vào exchange_orders, phân trang bằng cursor."""
+    try:
+        result = bot.query_exchange_orders(
+            symbol=request.args.get('symbol') or None,
+            bot_name=request.args.get('bot_name') or None,
+            status=request.args.get('status') or None,
+            cursor=request.args.get('cursor') or None,
+            limit=request.args.get('limit', 50, type=int)
+        )
+        return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching order history: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+@app.route('/api/v1/executions', methods=['GET'])
+def get_executions():
+    """API để lấy danh sách khớp lệnh đã đồng bộ vào exchange_executions, phân trang bằng cursor."""
+    try:
+        result = bot.query_exchange_executions(
+            symbol=request.args.get('symbol') or None,
+            order_id=request.args.get('order_id') or None,
+            cursor=request.args.get('cursor') or None,
+            limit=request.args.get('limit', 50, type=int)
+        )
+        return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error fetching executions: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 @app.route('/api/v1/cancel_order', methods=['POST'])
 def cancel_order():
     """API để hủy lệnh giao dịch."""
@@ -0,0 +1,322 @@
+"""
+Chế độ chạy async (ASGI) của trading_api.
+
+Các endpoint nóng chạy trên event loop:
+    - Tín hiệu (order_best, order_ema, orders): kiểm tra và chuyển đổi trên event loop, lấy giá
+      qua PriceCache / client REST async, create_order_best chạy trên SymbolExecutor của bot
+      (song song giữa các symbol, tuần tự trong cùng symbol).
+    - Đọc (trades, trades/<id>, orders/history, executions, balance, health, metrics): gọi sàn
+      qua AsyncBybitClient (keep-alive, lấy token từ RateLimiter của bot), truy vấn MySQL trên
+      executor đọc có giới hạn.
+Hai executor tách biệt nên tín hiệu không phải xếp hàng sau các request đọc chậm.
+Các endpoint còn lại chuyển cho Flask app qua WSGI với pool thread riêng.
+
+Cách chạy:
+    uvicorn trading_api_asgi:app --host 0.0.0.0 --port 5234
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse as StarletteJSONResponse
+from starlette.routing import Mount, Route
+
+from bybit_async import AsyncBybitClient
+from signals import (
+    SIGNAL_REQUIRED_FIELDS, ORDER_REQUIRED_FIELDS, check_signal_window, has_fields,
+    format_symbol, build_best_signal, build_ema_signal, build_order_signal
+)
+from trading_api import (
+    app as flask_app, bot, logger, serialize_trade, signal_queue, signal_response, submit_signal
+)
+
+SIGNAL_WORKERS = int(os.getenv('ASGI_SIGNAL_WORKERS', 8))
+READ_WORKERS = int(os.getenv('ASGI_READ_WORKERS', 8))
+WSGI_WORKERS = int(os.getenv('ASGI_WSGI_WORKERS', 8))
+
+signal_executor = ThreadPoolExecutor(max_workers=SIGNAL_WORKERS, thread_name_prefix='asgi-signal')
+read_executor = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix='asgi-read')
+exchange = None
+price_fetches = {}                      # symbol -> task lấy giá REST đang chạy (single-flight)
+
+
+class JSONResponse(StarletteJSONResponse):
+    """Serialize giống jsonify của Flask (Decimal, datetime) để hai chế độ trả cùng dữ liệu."""
+
+    def render(self, content) -> bytes:
+        return flask_app.json.dumps(content).encode('utf-8')
+
+
+def run_in(executor, func, *args):
+    return asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+async def fetch_price(symbol: str) -> float:
+    response = await exchange.get_tickers(category='linear', symbol=symbol)
+    price = float(response['result']['list'][0]['lastPrice'])
+    bot.prices.update(symbol, price)
+    # Nhận giá tiếp theo qua WebSocket
+    await run_in(read_executor, bot.prices.watch_requested, symbol)
+    return price
+
+
+async def get_last_price(symbol: str) -> float:
+    """Giá từ PriceCache; khi cũ thì các request đồng thời chờ chung một lần gọi REST async."""
+    price = bot.prices.peek(symbol)
+    if price is not None:
+        return price
+    task = price_fetches.get(symbol)
+    if task is None:
+        bot.prices.record_fetch()
+        task = asyncio.ensure_future(fetch_price(symbol))
+        price_fetches[symbol] = task
+        task.add_done_callback(lambda _: price_fetches.pop(symbol, None))
+    else:
+        bot.prices.record_fetch(coalesced=True)
+    return await asyncio.shield(task)
+
+
+async def dispatch_signal(kind: str, signal: dict, order_type: str):
+    """Ở chế độ ingest ghi vào hàng đợi; ngược lại chờ SymbolExecutor mà không giữ thread nào."""
+    if signal_queue is not None:
+        return await run_in(signal_executor, submit_signal, kind, signal, order_type)
+    return signal_response(await asyncio.wrap_future(bot.execute_signal(signal, order_type)))
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def create_order_best(request):
+    window_error = check_signal_window()
+    if window_error:
+        return JSONResponse({'error': window_error}, status_code=400)
+    try:
+        data = await read_json(request)
+        if not has_fields(data, SIGNAL_REQUIRED_FIELDS):
+            return JSONResponse({'error': 'Missing required fields'}, status_code=400)
+
+        last_price = await get_last_price(format_symbol(data['asset']))
+        signal, order_type = build_best_signal(data, last_price)
+        if signal is None:
+            return JSONResponse({'error': order_type}, status_code=400)
+
+        body, status = await dispatch_signal('order_best', signal, order_type)
+        return JSONResponse(body, status_code=status)
+
+    except Exception as e:
+        logger.error(f"Error in create_order_best API: {str(e)}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def create_order_ema(request):
+    try:
+        window_error = check_signal_window()
+        if window_error:
+            return JSONResponse({'error': window_error}, status_code=400)
+
+        data = await read_json(request)
+        if not has_fields(data, SIGNAL_REQUIRED_FIELDS):
+            return JSONResponse({'error': 'Missing required fields'}, status_code=400)
+
+        body, status = await dispatch_signal('order_ema', build_ema_signal(data), 'ema')
+        return JSONResponse(body, status_code=status)
+
+    except Exception as e:
+        logger.error(f"Error in create_order_ema API: {str(e)}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def create_order(request):
+    try:
+        data = await read_json(request)
+        if not has_fields(data, ORDER_REQUIRED_FIELDS):
+            return JSONResponse({'error': 'Missing required fields'}, status_code=400)
+
+        result = await run_in(signal_executor, bot.create_order, build_order_signal(data))
+        if 'error' in result:
+            return JSONResponse({'error': result['error']}, status_code=400)
+        return JSONResponse(result, status_code=201)
+
+    except Exception as e:
+        logger.error(f"Error in create_order API: {str(e)}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def get_trades(request):
+    try:
+        bot_name = request.query_params.get('bot_name', '')
+        status = request.query_params.get('status', '')
+        # get_orders đọc bản sao trong bộ nhớ, chỉ gọi REST khi bản sao chưa được nạp
+        if status == 'all':
+            filtered_trades = await run_in(read_executor, bot.get_orders)
+        else:
+            filtered_trades = await run_in(read_executor, bot.get_orders, bot_name, status)
+        return JSONResponse(filtered_trades)
+
+    except Exception as e:
+        logger.error(f"Error fetching trades: {str(e)}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def get_order_history(request):
+    params = request.query_params
+    try:
+        result = await run_in(
+            read_executor, bot.query_exchange_orders, params.get('symbol') or None,
+            params.get('bot_name') or None, params.get('status') or None, params.get('cursor') or None,
+            int(params.get('limit', 50))
+        )
+        return JSONResponse(result)
+
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"Error fetching order history: {str(e)}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def get_executions(request):
+    params = request.query_params
+    try:
+        result = await run_in(
+            read_executor, bot.query_exchange_executions, params.get('symbol') or None,
+            params.get('order_id') or None, params.get('cursor') or None, int(params.get('limit', 50))
+        )
+        return JSONResponse(result)
+
+    except ValueError as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"Error fetching executions: {str(e)}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def get_trade(request):
+    try:
+        trade = await run_in(read_executor, bot.get_trade_by_id, request.path_params['trade_id'])
+        if not trade:
+            return JSONResponse({'error': 'Trade not found'}, status_code=404)
+        return JSONResponse(serialize_trade(trade))
+
+    except Exception as e:
+        logger.error(f"Error in get_trade API: {str(e)}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def get_account_info() -> dict:
+    try:
+        return bot.parse_account_info(await exchange.get_wallet_balance(accountType='UNIFIED'))
+    except Exception as e:
+        logger.error(f"Lỗi trong get_account_info: {str(e)}")
+        return {}
+
+
+async def get_positions() -> list:
+    try:
+        return bot.parse_positions(await exchange.get_positions(category='linear', settleCoin='USDT'))
+    except Exception as e:
+        logger.error(f"Lỗi trong get_positions: {str(e)}")
+        return []
+
+
+async def get_balance(request):
+    try:
+        account_info, positions = await asyncio.gather(get_account_info(), get_positions())
+        used_margin = sum(
+            float(pos.get('position_margin', 0))
+            for pos in positions
+            if pos.get('position_margin')
+        )
+        return JSONResponse({
+            'success': True,
+            'available_balance': float(account_info.get('available_balance', 0)),
+            'equity': float(account_info.get('total_equity', 0)),
+            'used_margin': used_margin,
+            'wallet_balance': float(account_info.get('wallet_balance', 0)),
+            'currency': 'USDT'
+        })
+    except Exception as e:
+        logger.error(f"Error getting balance: {str(e)}")
+        return JSONResponse({
+            'success': False,
+            'error': f'Không thể lấy số dư tài khoản: {str(e)}'
+        }, status_code=500)
+
+
+async def health_check(request):
+    try:
+        return JSONResponse({
+            'status': 'running',
+            'exchange': 'bybit',
+            'testnet': bot.testnet,
+            'account_info': await get_account_info()
+        })
+    except Exception as e:
+        logger.error(f"Health check failed: {str(e)}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+def executor_stats(executor: ThreadPoolExecutor) -> dict:
+    return {'workers': executor._max_workers, 'queued': executor._work_queue.qsize()}
+
+
+async def get_metrics(request):
+    try:
+        metrics = bot.get_metrics()
+        if signal_queue is not None:
+            metrics['signal_queue'] = await run_in(read_executor, signal_queue.stats)
+        metrics['asgi'] = {
+            'signal_executor': executor_stats(signal_executor),
+            'read_executor': executor_stats(read_executor)
+        }
+        return JSONResponse(metrics)
+    except Exception as e:
+        logger.error(f"Error getting metrics: {str(e)}")
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global exchange
+    exchange = AsyncBybitClient(
+        testnet=bot.testnet,
+        base_url=os.getenv('BYBIT_REST_URL'),
+        max_connections=int(os.getenv('ASGI_HTTP_CONNECTIONS', 20)),
+        limiter=bot.rate_limiter
+    )
+    logger.info(f"ASGI mode started: signal_workers={SIGNAL_WORKERS}, read_workers={READ_WORKERS}")
+    try:
+        yield
+    finally:
+        await exchange.close()
+        signal_executor.shutdown(wait=False)
+        read_executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/api/v1/order_best', create_order_best, methods=['POST']),
+        Route('/api/v1/order_ema', create_order_ema, methods=['POST']),
+        Route('/api/v1/orders', create_order, methods=['POST']),
+        Route('/api/v1/trades', get_trades, methods=['GET']),
+        Route('/api/v1/trades/{trade_id:int}', get_trade, methods=['GET']),
+        Route('/api/v1/orders/history', get_order_history, methods=['GET']),
+        Route('/api/v1/executions', get_executions, methods=['GET']),
+        Route('/api/v1/balance', get_balance, methods=['GET']),
+        Route('/api/v1/health', health_check, methods=['GET']),
+        Route('/api/v1/metrics', get_metrics, methods=['GET']),
+        # Các endpoint còn lại dùng nguyên handler Flask
+        Mount('/', app=WSGIMiddleware(flask_app, workers=WSGI_WORKERS))
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan
+)
@@ -1,6 +1,6 @@
 import os
 import threading
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
 from pybit.unified_trading import HTTP, WebSocket
 import mysql.connector
@@ -14,8 +14,20 @@ import sys
 import uuid
 import random
 import math
-import schedule
 from datetime import timedelta
+from collections import OrderedDict, deque
+import heapq
+import bisect
+import functools
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, Future
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+import itertools
+import queue
+
+import http_transport
+from rate_limiter import RateLimiter, RateLimitedHTTP
+from job_scheduler import JobScheduler
 # Thiết lập logging
 logging.basicConfig(
     level=logging.INFO,
@@ -29,49 +41,1294 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+class EndpointWebSocket(WebSocket):
+    """WebSocket pybit luôn kết nối (và kết nối lại) tới endpoint cho trước."""
+
+    def __init__(self, endpoint: str, **kwargs):
+        self.fixed_endpoint = endpoint
+        super().__init__(**kwargs)
+
+    def _connect(self, url):
+        super()._connect(self.fixed_endpoint)
+
+
+class OrderMirror:
+    """
+    Bản sao các lệnh Bybit trong bộ nhớ, được cập nhật từ private WebSocket.
+
+    Lệnh được lưu theo orderId, kèm chỉ mục theo symbol, trạng thái hiển thị và bot_name
+    để endpoint /api/v1/trades không phải gọi Bybit mỗi lần tải dashboard.
+    """
+    ACTIVE_STATUSES = ('New', 'PartiallyFilled', 'Untriggered')
+
+    def __init__(self, history_limit: int = 500):
+        self.lock = threading.RLock()
+        self.history_limit = history_limit
+        self.orders = {}                # orderId -> lệnh gốc từ Bybit
+        self.by_symbol = {}             # symbol -> set(orderId)
+        self.by_status = {}             # trạng thái hiển thị -> set(orderId)
+        self.by_bot = {}                # orderLinkId (lowercase) -> set(orderId)
+        self.history = OrderedDict()    # các lệnh đã kết thúc, cũ nhất đứng đầu
+        # Vị thế theo (symbol, positionIdx), cùng cấu trúc với get_position_snapshot
+        self.snapshot = {'positions': {}, 'missing': {}, 'client': None}
+        self.seeded = False
+
+    @staticmethod
+    def display_status(order: Dict[str, Any]) -> str:
+        """Trạng thái hiển thị giống như get_all_orders trả về."""
+        order_status = order.get('orderStatus')
+        if order_status in ['New', 'PartiallyFilled']:
+            return 'OPEN'
+        if order_status == 'Filled':
+            return 'FILLED'
+        if order_status in ['Cancelled', 'Rejected']:
+            return 'CANCELLED'
+        return order_status or 'UNKNOWN'
+
+    def _index(self, order: Dict[str, Any]) -> tuple:
+        return (
+            order.get('symbol'),
+            self.display_status(order),
+            (order.get('orderLinkId', 'N/A') or '').lower()
+        )
+
+    def _add_index(self, order_id: str, keys: tuple):
+        symbol, status, bot = keys
+        self.by_symbol.setdefault(symbol, set()).add(order_id)
+        self.by_status.setdefault(status, set()).add(order_id)
+        self.by_bot.setdefault(bot, set()).add(order_id)
+
+    def _remove_index(self, order_id: str, keys: tuple):
+        for index, key in zip((self.by_symbol, self.by_status, self.by_bot), keys):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(order_id)
+                if not ids:
+                    del index[key]
+
+    def _remove(self, order_id: str):
+        order = self.orders.pop(order_id, None)
+        if order is not None:
+            self._remove_index(order_id, self._index(order))
+        self.history.pop(order_id, None)
+
+    def upsert(self, order: Dict[str, Any]) -> bool:
+        """Thêm hoặc cập nhật một lệnh; bỏ qua bản cập nhật cũ hơn bản đang lưu."""
+        order_id = order.get('orderId')
+        if not order_id:
+            return False
+        with self.lock:
+            current = self.orders.get(order_id)
+            if current is not None:
+                if int(order.get('updatedTime') or 0) < int(current.get('updatedTime') or 0):
+                    return False
+                self._remove_index(order_id, self._index(current))
+            self.orders[order_id] = order
+            self._add_index(order_id, self._index(order))
+
+            if order.get('orderStatus') in self.ACTIVE_STATUSES:
+                self.history.pop(order_id, None)
+            else:
+                self.history[order_id] = True
+                self.history.move_to_end(order_id)
+                while len(self.history) > self.history_limit:
+                    oldest_id, _ = self.history.popitem(last=False)
+                    self._remove(oldest_id)
+            return True
+
+    def update_position(self, position: Dict[str, Any]):
+        """Cập nhật vị thế từ topic position của private WebSocket."""
+        with self.lock:
+            self.snapshot['positions'][(position.get('symbol'), position.get('positionIdx'))] = position
+
+    def has_symbol_positions(self, symbol: str) -> bool:
+        with self.lock:
+            if symbol in self.snapshot['missing']:
+                return True
+            return any(key[0] == symbol for key in self.snapshot['positions'])
+
+    def seed(self, orders: List[Dict[str, Any]], snapshot: Dict[str, Any]):
+        """Nạp dữ liệu ban đầu từ REST snapshot."""
+        with self.lock:
+            # Bản WebSocket đã nhận trong lúc seed được ưu tiên vì mới hơn
+            for position_key, position in snapshot.get('positions', {}).items():
+                self.snapshot['positions'].setdefault(position_key, position)
+            self.snapshot['missing'].update(snapshot.get('missing', {}))
+            for order in sorted(orders, key=lambda o: int(o.get('updatedTime') or 0)):
+                self.upsert(order)
+            self.seeded = True
+
+    def query(self, symbol: str = None, order_id: str = None, bot_name: str = None,
+              status: str = None) -> List[Dict[str, Any]]:
+        """Lọc lệnh qua các chỉ mục, sắp xếp theo updatedTime mới nhất."""
+        with self.lock:
+            candidates = None
+
+            def narrow(ids):
+                return set(ids) if candidates is None else candidates & ids
+
+            if order_id:
+                candidates = {order_id} if order_id in self.orders else set()
+            if symbol:
+                candidates = narrow(self.by_symbol.get(symbol, set()))
+            if status:
+                candidates = narrow(self.by_status.get(status, set()))
+            if bot_name:
+                needle = bot_name.lower()
+                matched = set()
+                for bot, ids in self.by_bot.items():
+                    if needle in bot:
+                        matched |= ids
+                candidates = narrow(matched)
+
+            if candidates is None:
+                orders = list(self.orders.values())
+            else:
+                orders = [self.orders[oid] for oid in candidates]
+
+        orders.sort(key=lambda o: int(o.get('updatedTime') or 0), reverse=True)
+        return orders
+
+class OrderEventDispatcher:
+    """
+    Phân phối sự kiện lệnh từ private WebSocket cho các worker mà không chặn luồng callback của pybit.
+
+    Sự kiện được chia shard theo symbol nên các sự kiện của cùng một giao dịch luôn được xử lý
+    theo thứ tự. Khi handler trả về False (lệnh mới đặt, ánh xạ giao dịch chưa ghi xong), sự kiện
+    được đưa vào hàng đợi thử lại sắp xếp theo thời điểm đến hạn; chỉ các sự kiện sau của cùng
+    orderId chờ phía sau nó, các lệnh khác của symbol vẫn được xử lý ngay.
+
+    Lịch thử lại (0.2, 0.5, 1, 2, 2, ... giây) kéo dài tổng cộng retry_window giây.
+    """
+
+    def __init__(self, handler, workers: int = 4, retry_window: float = 10.0, latency_window: int = 1000):
+        self.handler = handler
+        self.retry_delays = self.retry_schedule(retry_window)
+        self.queues = [queue.Queue() for _ in range(max(1, workers))]
+        self.lock = threading.Lock()
+        self.retry_cond = threading.Condition(self.lock)
+        self.retry_heap = []            # (thời điểm đến hạn, seq, sự kiện)
+        self.blocked = {}               # orderId -> deque các sự kiện chờ sau sự kiện đang thử lại
+        self.seq = itertools.count()
+        self.latencies = deque(maxlen=latency_window)
+        self.applied = 0
+        self.retried = 0
+        self.dropped = 0
+        self.running = False
+
+    @staticmethod
+    def retry_schedule(window: float) -> tuple:
+        """Các khoảng chờ tăng dần tới tối đa 2 giây, tổng vừa đủ window giây."""
+        delays = []
+        for delay in itertools.chain((0.2, 0.5, 1), itertools.repeat(2)):
+            if sum(delays) >= window:
+                break
+            delays.append(min(delay, window - sum(delays)))
+        return tuple(delays)
+
+    def start(self):
+        """Khởi động các worker và luồng thử lại."""
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+        for index, event_queue in enumerate(self.queues):
+            threading.Thread(target=self._worker, args=(event_queue,), daemon=True,
+                             name=f"order-event-worker-{index}").start()
+        threading.Thread(target=self._retry_loop, daemon=True, name="order-event-retry").start()
+        logger.info(f"Order event dispatcher started with {len(self.queues)} workers")
+
+    def stop(self):
+        """Dừng các worker, các sự kiện còn trong hàng đợi bị bỏ qua."""
+        with self.retry_cond:
+            self.running = False
+            self.retry_cond.notify_all()
+        for event_queue in self.queues:
+            event_queue.put(None)
+
+    def submit(self, order: Dict[str, Any]):
+        """Đưa sự kiện vào hàng đợi của shard tương ứng, trả về ngay."""
+        event = {
+            'order': order,
+            'key': order.get('symbol') or order.get('orderId'),
+            'order_id': order.get('orderId'),
+            'received_at': time.monotonic(),
+            'attempt': 0
+        }
+        self._queue_for(event['key']).put(event)
+
+    def _queue_for(self, key) -> queue.Queue:
+        return self.queues[hash(key) % len(self.queues)]
+
+    def _worker(self, event_queue: queue.Queue):
+        while self.running:
+            event = event_queue.get()
+            if event is None:
+                break
+            with self.lock:
+                # Lệnh đang có sự kiện chờ thử lại: xếp sau để giữ thứ tự
+                if event['attempt'] == 0 and event['order_id'] in self.blocked:
+                    self.blocked[event['order_id']].append(event)
+                    continue
+            self._process(event)
+
+    def _process(self, event: Dict[str, Any]):
+        key = event['order_id']
+        while event is not None:
+            try:
+                applied = self.handler(event['order'])
+            except Exception as e:
+                logger.error(f"Error processing order event {event['order'].get('orderId')}: {str(e)}", exc_info=True)
+                applied = True
+
+            with self.lock:
+                if not applied and event['attempt'] < len(self.retry_delays):
+                    delay = self.retry_delays[event['attempt']]
+                    event['attempt'] += 1
+                    self.blocked.setdefault(key, deque())
+                    heapq.heappush(self.retry_heap, (time.monotonic() + delay, next(self.seq), event))
+                    self.retried += 1
+                    self.retry_cond.notify()
+                    return
+
+                if applied:
+                    self.applied += 1
+                    self.latencies.append(time.monotonic() - event['received_at'])
+                else:
+                    self.dropped += 1
+                    logger.warning(f"Dropped order event {event['order'].get('orderId')} after {event['attempt']} retries")
+
+                # Xử lý tiếp các sự kiện đang chờ của cùng lệnh
+                pending = self.blocked.get(key)
+                if pending:
+                    event = pending.popleft()
+                else:
+                    self.blocked.pop(key, None)
+                    event = None
+
+    def _retry_loop(self):
+        with self.retry_cond:
+            while self.running:
+                if not self.retry_heap:
+                    self.retry_cond.wait()
+                    continue
+                wait = self.retry_heap[0][0] - time.monotonic()
+                if wait > 0:
+                    self.retry_cond.wait(wait)
+                    continue
+                _, _, event = heapq.heappop(self.retry_heap)
+                self._queue_for(event['key']).put(event)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Độ sâu hàng đợi và độ trễ từ lúc nhận sự kiện đến lúc áp dụng (ms)."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            parked = len(self.retry_heap)
+            waiting = sum(len(pending) for pending in self.blocked.values())
+            applied, retried, dropped = self.applied, self.retried, self.dropped
+        queued = sum(event_queue.qsize() for event_queue in self.queues)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+        return {
+            'queue_depth': queued + parked + waiting,
+            'queued': queued,
+            'retry_parked': parked,
+            'waiting_behind_retry': waiting,
+            'applied': applied,
+            'retried': retried,
+            'dropped': dropped,
+            'latency_ms': {
+                'p50': percentile(0.5),
+                'p99': percentile(0.99),
+                'max': percentile(1.0)
+            }
+        }
+
+
+class OrderExpiryQueue:
+    """
+    Hàng đợi hết hạn lệnh entry theo deadline (heap).
+
+    Mỗi giao dịch OPEN có một deadline = thời điểm tạo + max_age. Luồng hết hạn chờ đúng tới
+    deadline gần nhất rồi gọi handler với các giao dịch đã đến hạn trong cùng một đợt. Khi lệnh
+    entry khớp hoặc bị hủy, giao dịch được xóa khỏi hàng đợi; mục tương ứng trong heap bị bỏ qua
+    khi tới lượt. Hàng đợi chỉ nhận giao dịch khi đã start: tiến trình không chạy hàng đợi (signal_worker)
+    không giữ deadline, lệnh của nó được thêm khi tiến trình API nhận sự kiện New của lệnh entry.
+    """
+
+    def __init__(self, handler, max_age: float, latency_window: int = 200):
+        self.handler = handler
+        self.max_age = max_age
+        self.condition = threading.Condition()
+        self.heap = []                  # (deadline theo time.monotonic(), trade_id)
+        self.entries = {}               # trade_id -> (deadline, order_id, symbol)
+        self.lateness = deque(maxlen=latency_window)
+        self.expired = 0
+        self.removed = 0
+        self.running = False
+
+    def start(self, trades: List[Dict[str, Any]] = None):
+        """Nạp lại các giao dịch OPEN (sau khi khởi động lại) và chạy luồng hết hạn."""
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        for trade in trades or []:
+            self.add(trade['id'], trade['order_id'], trade['symbol'], created_at=trade.get('created_at'))
+        threading.Thread(target=self._loop, daemon=True, name='order-expiry').start()
+        logger.info(f"Order expiry queue started with {len(trades or [])} open trades, max age {self.max_age:g}s")
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def add(self, trade_id: int, order_id: str, symbol: str, created_at: datetime = None):
+        """
+        Đặt deadline cho giao dịch; created_at là lúc tạo lệnh, mặc định là bây giờ.
+
+        Giao dịch đã có trong hàng đợi giữ deadline cũ. Không làm gì khi hàng đợi chưa start.
+        """
+        age = (datetime.now() - created_at).total_seconds() if created_at else 0
+        deadline = time.monotonic() + max(0.0, self.max_age - age)
+        with self.condition:
+            if not self.running or trade_id in self.entries:
+                return
+            self.entries[trade_id] = (deadline, order_id, symbol)
+            heapq.heappush(self.heap, (deadline, trade_id))
+            if self.heap[0][1] == trade_id:
+                self.condition.notify()
+
+    def remove(self, trade_id: int) -> bool:
+        """Bỏ deadline của giao dịch khi lệnh entry đã khớp hoặc bị hủy."""
+        with self.condition:
+            if self.entries.pop(trade_id, None) is None:
+                return False
+            self.removed += 1
+            return True
+
+    def _pop_due(self, now: float) -> List[Dict[str, Any]]:
+        """Lấy các giao dịch đã đến hạn; gọi khi đang giữ condition."""
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            deadline, trade_id = heapq.heappop(self.heap)
+            entry = self.entries.get(trade_id)
+            if entry is None or entry[0] != deadline:
+                continue
+            del self.entries[trade_id]
+            self.lateness.append(now - deadline)
+            due.append({'id': trade_id, 'order_id': entry[1], 'symbol': entry[2]})
+        return due
+
+    def _loop(self):
+        while True:
+            with self.condition:
+                due = []
+                while self.running:
+                    now = time.monotonic()
+                    due = self._pop_due(now)
+                    if due:
+                        break
+                    self.condition.wait(self.heap[0][0] - now if self.heap else None)
+                if not self.running:
+                    return
+            try:
+                self.handler(due)
+            except Exception as e:
+                logger.error(f"Error expiring {len(due)} orders: {str(e)}", exc_info=True)
+            with self.condition:
+                self.expired += len(due)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.condition:
+            lateness = sorted(self.lateness)
+            next_in = None
+            live = [deadline for deadline, trade_id in self.heap
+                    if self.entries.get(trade_id, (None,))[0] == deadline]
+            if live:
+                next_in = round(max(0.0, min(live) - time.monotonic()), 1)
+            stats = {
+                'pending': len(self.entries),
+                'expired': self.expired,
+                'removed': self.removed,
+                'next_expiry_in_s': next_in
+            }
+        if lateness:
+            stats['lateness_ms'] = {
+                'p50': round(lateness[len(lateness) // 2] * 1000, 1),
+                'max': round(lateness[-1] * 1000, 1)
+            }
+        return stats
+
+
+class SymbolExecutor:
+    """
+    Chạy tín hiệu song song giữa các symbol và tuần tự trong cùng một symbol.
+
+    Tín hiệu của symbol đang chạy được xếp hàng phía sau, nên chuỗi đóng vị thế / hủy lệnh /
+    đặt lệnh mới của cùng symbol không bị xen kẽ. Số symbol chạy đồng thời tối đa là concurrency.
+    """
+
+    def __init__(self, concurrency: int = 4, history: int = 200):
+        self.concurrency = max(1, concurrency)
+        self.pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='signal')
+        self.lock = threading.Lock()
+        self.pending = {}               # symbol đang chạy -> deque các tín hiệu chờ phía sau
+        self.timings = deque(maxlen=history)
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, symbol: str, func, *args) -> Future:
+        """Đưa tín hiệu vào hàng đợi của symbol; Future có thêm thuộc tính timings khi xong."""
+        job = {'symbol': symbol, 'func': func, 'args': args, 'future': Future(), 'queued_at': time.monotonic()}
+        with self.lock:
+            jobs = self.pending.get(symbol)
+            if jobs is not None:
+                jobs.append(job)
+                return job['future']
+            self.pending[symbol] = deque()
+        self.pool.submit(self._run, job)
+        return job['future']
+
+    def _run(self, job: Dict[str, Any]):
+        started_at = time.monotonic()
+        try:
+            result, error = job['func'](*job['args']), None
+        except Exception as e:
+            result, error = None, e
+        finished_at = time.monotonic()
+
+        timings = {
+            'symbol': job['symbol'],
+            'queued_ms': round((started_at - job['queued_at']) * 1000, 2),
+            'exec_ms': round((finished_at - started_at) * 1000, 2),
+            'finished_at': datetime.now().isoformat(timespec='seconds')
+        }
+        failed = error is not None or (isinstance(result, dict) and 'error' in result)
+        logger.info(f"Signal {job['symbol']}: queued {timings['queued_ms']} ms, executed {timings['exec_ms']} ms")
+
+        with self.lock:
+            self.timings.append(timings)
+            self.failed += failed
+            self.completed += not failed
+            # Tín hiệu tiếp theo của symbol được đưa lại cuối pool để các symbol khác không phải chờ
+            jobs = self.pending[job['symbol']]
+            if jobs:
+                next_job = jobs.popleft()
+            else:
+                del self.pending[job['symbol']]
+                next_job = None
+        if next_job is not None:
+            self.pool.submit(self._run, next_job)
+
+        job['future'].timings = timings
+        if error is not None:
+            job['future'].set_exception(error)
+        else:
+            job['future'].set_result(result)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Thời gian chờ và thời gian chạy (ms) của các tín hiệu gần nhất."""
+        with self.lock:
+            timings = list(self.timings)
+            running = len(self.pending)
+            waiting = sum(len(jobs) for jobs in self.pending.values())
+            completed, failed = self.completed, self.failed
+
+        def percentile(key, p):
+            values = sorted(timing[key] for timing in timings)
+            if not values:
+                return 0.0
+            return values[min(len(values) - 1, int(p * len(values)))]
+
+        return {
+            'concurrency': self.concurrency,
+            'running_symbols': running,
+            'waiting': waiting,
+            'completed': completed,
+            'failed': failed,
+            'queued_ms': {'p50': percentile('queued_ms', 0.5), 'p99': percentile('queued_ms', 0.99)},
+            'exec_ms': {'p50': percentile('exec_ms', 0.5), 'p99': percentile('exec_ms', 0.99)},
+            'recent': timings[-20:]
+        }
+
+
+class InstrumentCache:
+    """
+    Cache thông số hợp đồng (qtyStep, tickSize, số lượng tối thiểu) dùng chung cho các hàm đặt lệnh.
+
+    Toàn bộ hợp đồng linear được nạp một lần khi khởi động, làm mới định kỳ theo TTL ở luồng nền,
+    symbol chưa có trong cache được lấy riêng khi cần.
+    """
+
+    def __init__(self, client, ttl: int = 3600):
+        self.client = client
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.specs = {}
+        self.loaded_at = 0.0
+        self.running = False
+
+    @staticmethod
+    def _parse(instrument: Dict[str, Any]) -> Dict[str, Decimal]:
+        lot_size = instrument.get('lotSizeFilter', {})
+        price_filter = instrument.get('priceFilter', {})
+        return {
+            'qty_step': Decimal(lot_size.get('qtyStep') or '0'),
+            'min_qty': Decimal(lot_size.get('minOrderQty') or '0'),
+            'max_qty': Decimal(lot_size.get('maxOrderQty') or '0'),
+            'tick_size': Decimal(price_filter.get('tickSize') or '0')
+        }
+
+    def load_all(self) -> int:
+        """Nạp toàn bộ hợp đồng linear, trả về số hợp đồng đã nạp."""
+        specs = {}
+        params = {'category': 'linear', 'limit': 1000}
+        while True:
+            response = self.client.get_instruments_info(**params)
+            if response.get('retCode') != 0:
+                raise Exception(f"Failed to load instruments: {response.get('retMsg', 'Unknown error')}")
+            result = response.get('result', {})
+            for instrument in result.get('list', []):
+                specs[instrument['symbol']] = self._parse(instrument)
+            if not result.get('nextPageCursor'):
+                break
+            params['cursor'] = result['nextPageCursor']
+
+        with self.lock:
+            self.specs.update(specs)
+            self.loaded_at = time.time()
+        logger.info(f"Loaded {len(specs)} instrument specs")
+        return len(specs)
+
+    def get(self, symbol: str) -> Dict[str, Decimal]:
+        """Lấy thông số của symbol, gọi API nếu symbol chưa có trong cache."""
+        with self.lock:
+            spec = self.specs.get(symbol)
+        if spec is not None:
+            return spec
+
+        response = self.client.get_instruments_info(category='linear', symbol=symbol)
+        instruments = response.get('result', {}).get('list', []) if response.get('retCode') == 0 else []
+        if not instruments:
+            raise ValueError(f"Instrument {symbol} not found: {response.get('retMsg', 'Unknown error')}")
+        spec = self._parse(instruments[0])
+        with self.lock:
+            self.specs[symbol] = spec
+        return spec
+
+    def round_qty(self, symbol: str, qty: float) -> float:
+        """Làm tròn xuống số lượng theo qtyStep."""
+        step = self.get(symbol)['qty_step']
+        if step <= 0:
+            return qty
+        return float((Decimal(str(qty)) / step).to_integral_value(rounding=ROUND_DOWN) * step)
+
+    def round_price(self, symbol: str, price: float) -> float:
+        """Làm tròn giá về bội số gần nhất của tickSize."""
+        tick = self.get(symbol)['tick_size']
+        if tick <= 0 or price is None:
+            return price
+        return float((Decimal(str(price)) / tick).to_integral_value(rounding=ROUND_HALF_UP) * tick)
+
+    def start(self):
+        """Nạp cache lần đầu và khởi động luồng làm mới theo TTL."""
+        try:
+            self.load_all()
+        except Exception as e:
+            logger.warning(f"Instrument cache warm-up failed, falling back to lazy loading: {str(e)}")
+        self.running = True
+        threading.Thread(target=self._refresh_loop, daemon=True, name="instrument-refresh").start()
+
+    def stop(self):
+        self.running = False
+
+    def _refresh_loop(self):
+        while self.running:
+            time.sleep(min(self.ttl, 60))
+            if time.time() - self.loaded_at < self.ttl:
+                continue
+            try:
+                self.load_all()
+            except Exception as e:
+                logger.warning(f"Error refreshing instrument cache: {str(e)}")
+
+
+class AccountStateCache:
+    """
+    Cache chế độ vị thế và đòn bẩy theo symbol.
+
+    Được cập nhật từ topic position của private WebSocket và từ các snapshot REST sẵn có,
+    giúp bỏ qua switch_position_mode/set_leverage khi trạng thái trên sàn đã đúng.
+    """
+    HEDGE_MODE = 3
+    ONE_WAY_MODE = 0
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.states = {}    # symbol -> {'mode': int, 'leverage': str}
+
+    def get(self, symbol: str) -> Dict[str, Any]:
+        with self.lock:
+            return dict(self.states.get(symbol, {}))
+
+    def update_from_position(self, position: Dict[str, Any]):
+        """Cập nhật trạng thái từ một bản ghi vị thế (REST hoặc WebSocket)."""
+        symbol = position.get('symbol')
+        if not symbol:
+            return
+        mode = self.HEDGE_MODE if int(position.get('positionIdx') or 0) in (1, 2) else self.ONE_WAY_MODE
+        leverage = position.get('leverage')
+        with self.lock:
+            state = self.states.setdefault(symbol, {})
+            if state.get('mode', mode) != mode:
+                logger.info(f"Position mode changed for {symbol}: {state['mode']} -> {mode}")
+            state['mode'] = mode
+            if leverage:
+                if state.get('leverage', str(leverage)) != str(leverage):
+                    logger.info(f"Leverage changed for {symbol}: {state['leverage']} -> {leverage}")
+                state['leverage'] = str(leverage)
+
+    def set_mode(self, symbol: str, mode: int):
+        with self.lock:
+            self.states.setdefault(symbol, {})['mode'] = mode
+
+    def set_leverage(self, symbol: str, leverage):
+        with self.lock:
+            self.states.setdefault(symbol, {})['leverage'] = str(leverage)
+
+    def invalidate(self, symbol: str):
+        """Xóa trạng thái của symbol để lần sau kiểm tra lại trên sàn."""
+        with self.lock:
+            self.states.pop(symbol, None)
+
+    def is_hedge_mode(self, symbol: str) -> bool:
+        return self.get(symbol).get('mode') == self.HEDGE_MODE
+
+    def leverage_matches(self, symbol: str, leverage) -> bool:
+        current = self.get(symbol).get('leverage')
+        try:
+            return current is not None and float(current) == float(leverage)
+        except (TypeError, ValueError):
+            return False
+
+
+class DBSession:
+    """Các câu lệnh SQL chạy trên cùng một kết nối, trong transaction do TradingBot.db_session quản lý."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.touched_trades = set()     # id các giao dịch đã ghi vào TradeCache trong transaction
+
+    def execute(self, query, params=None, fetch=True):
+        """Thực thi câu lệnh, giá trị trả về giống TradingBot.execute_query."""
+        cursor = self.connection.cursor(dictionary=True)
+        try:
+            cursor.execute(query, params or ())
+            if fetch:
+                if cursor.with_rows:
+                    result = cursor.fetchall()
+                    return result if result else None
+                return None
+            if cursor.lastrowid:
+                return cursor.lastrowid
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def execute_many(self, query, rows):
+        """Thực thi một câu lệnh cho nhiều bộ tham số (executemany), trả về số dòng bị ảnh hưởng."""
+        cursor = self.connection.cursor()
+        try:
+            cursor.executemany(query, rows)
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+
+class TradeCache:
+    """
+    Cache write-through các dòng trades theo id.
+
+    Được nạp khi bot insert giao dịch hoặc đọc bằng get_trade_by_id, và cập nhật theo các câu UPDATE
+    do chính bot thực hiện. Giá trị được chuẩn hóa về cùng kiểu với dữ liệu MySQL trả về.
+    """
+    DECIMAL_COLUMNS = {
+        'entry_price', 'quantity', 'position_size', 'tp1_price', 'tp2_price', 'tp3_price',
+        'sl_price', 'current_sl', 'current_tp', 'pnl', 'pnl_percent'
+    }
+    DATETIME_COLUMNS = {'created_at', 'updated_at', 'closed_at', 'filled_at'}
+
+    def __init__(self, max_size: int = 5000):
+        self.lock = threading.Lock()
+        self.max_size = max_size
+        self.trades = OrderedDict()
+
+    @classmethod
+    def normalize(cls, column: str, value):
+        if value is None:
+            return None
+        if column in cls.DECIMAL_COLUMNS:
+            return Decimal(str(value)).quantize(Decimal('0.00000001'))
+        if column in cls.DATETIME_COLUMNS:
+            if isinstance(value, str):
+                value = datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+            return value.replace(microsecond=0)
+        if column == 'leverage':
+            return int(value)
+        return value
+
+    def get(self, trade_id: int) -> Dict[str, Any]:
+        with self.lock:
+            trade = self.trades.get(trade_id)
+            if trade is None:
+                return None
+            self.trades.move_to_end(trade_id)
+            return dict(trade)
+
+    def put(self, trade: Dict[str, Any]):
+        """Lưu nguyên một dòng trades (đã đọc từ database)."""
+        with self.lock:
+            self.trades[trade['id']] = dict(trade)
+            self.trades.move_to_end(trade['id'])
+            while len(self.trades) > self.max_size:
+                self.trades.popitem(last=False)
+
+    def update(self, trade_id: int, fields: Dict[str, Any]):
+        """Áp dụng các cột vừa được UPDATE; bỏ qua nếu giao dịch chưa có trong cache."""
+        with self.lock:
+            trade = self.trades.get(trade_id)
+            if trade is not None:
+                # updated_at có ON UPDATE CURRENT_TIMESTAMP
+                fields.setdefault('updated_at', datetime.now())
+                for column, value in fields.items():
+                    trade[column] = self.normalize(column, value)
+
+    def invalidate(self, trade_id: int):
+        with self.lock:
+            self.trades.pop(trade_id, None)
+
+    def invalidate_symbol(self, symbol: str):
+        """Xóa các giao dịch của symbol sau các câu UPDATE theo symbol."""
+        with self.lock:
+            for trade_id in [tid for tid, trade in self.trades.items() if trade.get('symbol') == symbol]:
+                del self.trades[trade_id]
+
+
+class TriggerIndex:
+    """
+    Chỉ mục ngưỡng TP/SL theo symbol, mỗi loại ngưỡng là một mảng đã sắp xếp (bisect).
+
+    Mỗi giao dịch có tối đa một ngưỡng TP đang hiệu lực (TP1 khi FILLED, TP2 khi TP1_HIT) và một
+    ngưỡng SL (stoploss hiện tại). Với mỗi tick chỉ các giao dịch có ngưỡng bị vượt được trả về,
+    chi phí O(log n + k) thay vì duyệt toàn bộ giao dịch của symbol.
+    """
+
+    def __init__(self):
+        self.levels = {}                # (symbol, side, 'tp'|'sl') -> list (mức giá, trade_id) đã sắp xếp
+        self.entries = {}               # trade_id -> [(key, mức giá)]
+
+    @staticmethod
+    def trade_levels(trade: Dict[str, Any]) -> List[tuple]:
+        tp = {'FILLED': trade.get('tp1_price'), 'TP1_HIT': trade.get('tp2_price')}.get(trade['status'])
+        levels = [('sl', float(PositionManager.stop_level(trade)))]
+        if tp is not None:
+            levels.append(('tp', float(tp)))
+        return levels
+
+    def add(self, trade: Dict[str, Any]):
+        """Thêm hoặc cập nhật các ngưỡng của giao dịch."""
+        self.remove(trade['id'])
+        entries = []
+        for kind, level in self.trade_levels(trade):
+            key = (trade['symbol'], trade['side'], kind)
+            bisect.insort(self.levels.setdefault(key, []), (level, trade['id']))
+            entries.append((key, level))
+        self.entries[trade['id']] = entries
+
+    def remove(self, trade_id: int):
+        for key, level in self.entries.pop(trade_id, ()):
+            levels = self.levels[key]
+            index = bisect.bisect_left(levels, (level, trade_id))
+            if index < len(levels) and levels[index] == (level, trade_id):
+                del levels[index]
+            if not levels:
+                del self.levels[key]
+
+    def crossed(self, symbol: str, price: float) -> List[int]:
+        """Các giao dịch có ngưỡng bị vượt tại giá price."""
+        hits = []
+        # Buy: TP khi giá >= mức, SL khi giá <= mức; Sell ngược lại
+        for side, kind, below in (('Buy', 'tp', True), ('Buy', 'sl', False), ('Sell', 'tp', False), ('Sell', 'sl', True)):
+            levels = self.levels.get((symbol, side, kind))
+            if not levels:
+                continue
+            if below:
+                hits.extend(trade_id for _, trade_id in levels[:bisect.bisect_right(levels, (price, math.inf))])
+            else:
+                hits.extend(trade_id for _, trade_id in levels[bisect.bisect_left(levels, (price, -math.inf)):])
+        return hits
+
+
+class PriceCache:
+    """
+    Cache giá gần nhất (lastPrice) theo symbol, được cập nhật từ ticker của public WebSocket.
+
+    Quản lý đăng ký ticker theo từng người dùng (owner) của symbol: chỉ hủy đăng ký khi không còn
+    ai theo dõi. Khi dữ liệu cũ hơn max_age giây, get() gọi REST get_tickers; các request đồng thời
+    cho cùng symbol chờ chung một lần gọi REST (single-flight).
+
+    Symbol lấy giá REST thành công được theo dõi với owner 'requests'; owner này bị bỏ khi symbol
+    không được hỏi giá (get / peek) trong request_idle giây (mặc định 12 × max_age).
+    """
+
+    def __init__(self, client, ws, max_age: float = 5.0, fetch_timeout: float = 10.0,
+                 request_idle: float = None):
+        self.client = client
+        self.ws = ws
+        self.max_age = max_age
+        self.fetch_timeout = fetch_timeout
+        self.lock = threading.Lock()
+        self.prices = {}                # symbol -> (giá, thời điểm nhận theo time.monotonic)
+        self.watchers = {}              # symbol -> set owner đang theo dõi
+        self.in_flight = {}             # symbol -> lần gọi REST đang chạy
+        self.requested = {}             # symbol -> lần hỏi giá gần nhất của symbol theo dõi cho 'requests'
+        self.request_idle = request_idle if request_idle is not None else max_age * 12
+        self.last_expiry = time.monotonic()
+        self.listeners = []
+        self.hits = 0
+        self.rest_fetches = 0
+        self.coalesced = 0
+
+    def add_listener(self, listener):
+        """Đăng ký hàm listener(symbol, price) được gọi mỗi khi ticker có lastPrice mới."""
+        self.listeners.append(listener)
+
+    def watch(self, symbol: str, owner: str):
+        """Đăng ký ticker cho symbol (nếu chưa có) thay cho owner."""
+        with self.lock:
+            owners = self.watchers.setdefault(symbol, set())
+            subscribe = not owners
+            owners.add(owner)
+        if subscribe:
+            try:
+                self.ws.ticker_stream(symbol=symbol, callback=self.handle_ticker)
+                logger.info(f"Subscribed ticker for {symbol}")
+            except Exception as e:
+                with self.lock:
+                    self.watchers.pop(symbol, None)
+                logger.error(f"Error subscribing ticker for {symbol}: {str(e)}")
+
+    def unwatch(self, symbol: str, owner: str):
+        """Bỏ theo dõi của owner; hủy đăng ký ticker khi symbol không còn ai theo dõi."""
+        with self.lock:
+            owners = self.watchers.get(symbol)
+            if not owners or owner not in owners:
+                return
+            owners.discard(owner)
+            if owners:
+                return
+            del self.watchers[symbol]
+            self.prices.pop(symbol, None)
+        topic = f"tickers.{symbol}"
+        try:
+            self.ws.ws.send(json.dumps({'op': 'unsubscribe', 'args': [topic]}))
+            # pybit giữ callback và message subscribe để đăng ký lại khi reconnect
+            self.ws.callback_directory.pop(topic, None)
+            subscriptions = getattr(self.ws, 'subscriptions', None)
+            if isinstance(subscriptions, list):
+                subscriptions[:] = [message for message in subscriptions if topic not in str(message)]
+            elif isinstance(subscriptions, dict):
+                for req_id in [k for k, message in subscriptions.items() if topic in str(message)]:
+                    del subscriptions[req_id]
+            logger.info(f"Unsubscribed ticker for {symbol}")
+        except Exception as e:
+            logger.error(f"Error unsubscribing ticker for {symbol}: {str(e)}")
+
+    def handle_ticker(self, msg):
+        data = msg.get('data') or {}
+        symbol = data.get('symbol') or msg.get('topic', '').split('.')[-1]
+        price = data.get('lastPrice')
+        if not price:
+            # Tin delta không có lastPrice khi giá không đổi: giá đang lưu vẫn còn đúng
+            with self.lock:
+                if symbol in self.prices:
+                    self.prices[symbol] = (self.prices[symbol][0], time.monotonic())
+            return
+        price = float(price)
+        self.update(symbol, price)
+        for listener in self.listeners:
+            listener(symbol, price)
+        self.expire_requests()
+
+    def watch_requested(self, symbol: str):
+        """Symbol vừa lấy giá REST thành công thì nhiều khả năng sẽ được hỏi tiếp: nhận giá qua WebSocket."""
+        with self.lock:
+            self.requested[symbol] = time.monotonic()
+            subscribe = 'requests' not in self.watchers.get(symbol, ())
+        if subscribe:
+            self.watch(symbol, 'requests')
+
+    def expire_requests(self):
+        """Bỏ owner 'requests' của các symbol không được hỏi giá trong request_idle giây (tối đa mỗi max_age giây một lần)."""
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_expiry < self.max_age:
+                return
+            self.last_expiry = now
+            idle = [symbol for symbol, requested_at in self.requested.items() if now - requested_at > self.request_idle]
+            for symbol in idle:
+                del self.requested[symbol]
+        for symbol in idle:
+            self.unwatch(symbol, 'requests')
+
+    def update(self, symbol: str, price: float):
+        with self.lock:
+            self.prices[symbol] = (price, time.monotonic())
+
+    def peek(self, symbol: str) -> float:
+        """Giá còn mới trong cache hoặc None, không gọi REST (dùng cho chế độ async)."""
+        with self.lock:
+            if symbol in self.requested:
+                self.requested[symbol] = time.monotonic()
+            cached = self.prices.get(symbol)
+            if cached and time.monotonic() - cached[1] <= self.max_age:
+                self.hits += 1
+                return cached[0]
+            return None
+
+    def record_fetch(self, coalesced: bool = False):
+        """Ghi nhận một lần lấy giá ngoài cache do caller tự gọi REST."""
+        with self.lock:
+            if coalesced:
+                self.coalesced += 1
+            else:
+                self.rest_fetches += 1
+
+    def get(self, symbol: str) -> float:
+        """Giá gần nhất của symbol; gọi REST khi dữ liệu WebSocket đã cũ hoặc chưa có."""
+        with self.lock:
+            if symbol in self.requested:
+                self.requested[symbol] = time.monotonic()
+            cached = self.prices.get(symbol)
+            if cached and time.monotonic() - cached[1] <= self.max_age:
+                self.hits += 1
+                return cached[0]
+            flight = self.in_flight.get(symbol)
+            leader = flight is None
+            if leader:
+                flight = {'done': threading.Event(), 'price': None, 'error': None}
+                self.in_flight[symbol] = flight
+                self.rest_fetches += 1
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                response = self.client.get_tickers(category='linear', symbol=symbol)
+                flight['price'] = float(response['result']['list'][0]['lastPrice'])
+                self.update(symbol, flight['price'])
+            except Exception as e:
+                flight['error'] = e
+            finally:
+                with self.lock:
+                    self.in_flight.pop(symbol, None)
+                flight['done'].set()
+            if flight['error'] is None:
+                self.watch_requested(symbol)
+        elif not flight['done'].wait(self.fetch_timeout):
+            raise TimeoutError(f"Timed out waiting for {symbol} ticker")
+
+        if flight['error'] is not None:
+            raise flight['error']
+        return flight['price']
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Tỉ lệ trúng cache và tuổi dữ liệu (giây) của từng symbol."""
+        with self.lock:
+            now = time.monotonic()
+            total = self.hits + self.rest_fetches + self.coalesced
+            return {
+                'hits': self.hits,
+                'rest_fetches': self.rest_fetches,
+                'coalesced': self.coalesced,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+                'max_age': self.max_age,
+                'age_seconds': {symbol: round(now - received, 3) for symbol, (_, received) in self.prices.items()},
+                'watched': {symbol: sorted(owners) for symbol, owners in self.watchers.items()}
+            }
+
+
+class PositionManager:
+    """
+    Theo dõi giá từ public WebSocket và chạy state machine của update_position theo từng tick.
+
+    Giữ chỉ mục các giao dịch đang mở vị thế (FILLED/TP1_HIT/TP2_HIT) theo symbol, chỉ theo dõi
+    ticker (qua PriceCache) cho các symbol có giao dịch và bỏ theo dõi khi giao dịch cuối cùng của
+    symbol đóng. Ngưỡng TP/SL được tra trong TriggerIndex; chỉ khi ngưỡng bị vượt mới gọi handler
+    (trên executor, không chặn luồng callback của pybit). Giao dịch có handler lỗi (exception hoặc
+    kết quả có 'error') chỉ được gọi lại sau thời gian chờ tăng gấp đôi sau mỗi lần lỗi liên tiếp.
+    """
+    LIVE_STATUSES = ('FILLED', 'TP1_HIT', 'TP2_HIT')
+    RETRY_BASE = 1.0                    # giây chờ sau lần lỗi đầu tiên
+    RETRY_MAX = 60.0
+
+    def __init__(self, prices: PriceCache, handler, executor):
+        self.prices = prices
+        self.handler = handler
+        self.executor = executor
+        self.lock = threading.Lock()
+        self.trades = {}                # trade_id -> giao dịch
+        self.by_symbol = {}             # symbol -> set trade_id
+        self.index = TriggerIndex()
+        self.in_flight = set()          # giao dịch đang được handler xử lý
+        self.failures = {}              # trade_id -> (số lần lỗi liên tiếp, thời điểm monotonic được thử lại)
+        self.ticks = 0
+        self.triggers = 0
+        self.running = False
+        prices.add_listener(self.on_price)
+
+    @classmethod
+    def is_live(cls, trade: Dict[str, Any]) -> bool:
+        return bool(trade) and trade.get('status') in cls.LIVE_STATUSES and trade.get('filled_at') is not None
+
+    @staticmethod
+    def stop_level(trade: Dict[str, Any]):
+        """Stoploss hiện tại (đã dời sau TP1/TP2), mặc định là sl_price."""
+        return trade.get('current_sl') or trade['sl_price']
+
+    @classmethod
+    def crossed(cls, trade: Dict[str, Any], price: float) -> str:
+        """Ngưỡng bị vượt tại giá price theo thứ tự của update_position: TP1, TP2 rồi SL."""
+        is_buy = trade['side'] == 'Buy'
+        if trade['status'] == 'FILLED' and trade.get('tp1_price') is not None:
+            if (price >= trade['tp1_price']) if is_buy else (price <= trade['tp1_price']):
+                return 'TP1_HIT'
+        if trade['status'] == 'TP1_HIT' and trade.get('tp2_price') is not None:
+            if (price >= trade['tp2_price']) if is_buy else (price <= trade['tp2_price']):
+                return 'TP2_HIT'
+        stop = cls.stop_level(trade)
+        if (price <= stop) if is_buy else (price >= stop):
+            return 'CLOSED'
+        return None
+
+    def start(self, trades: List[Dict[str, Any]]):
+        """Nạp các giao dịch đang mở và bắt đầu nhận giá theo tick."""
+        self.running = True
+        for trade in trades:
+            self.track(trade)
+        with self.lock:
+            symbols = list(self.by_symbol)
+        for symbol in symbols:
+            self.prices.watch(symbol, 'positions')
+        logger.info(f"Position manager tracking {len(self.trades)} trades on {len(symbols)} symbols")
+
+    def stop(self):
+        self.running = False
+
+    def track(self, trade: Dict[str, Any]):
+        """Thêm hoặc cập nhật giao dịch; giao dịch không còn mở vị thế sẽ bị bỏ khỏi chỉ mục."""
+        if not self.is_live(trade):
+            if trade:
+                self.untrack(trade['id'])
+            return
+        symbol = trade['symbol']
+        with self.lock:
+            self.trades[trade['id']] = dict(trade)
+            self.by_symbol.setdefault(symbol, set()).add(trade['id'])
+            self.index.add(trade)
+        if self.running:
+            self.prices.watch(symbol, 'positions')
+
+    def untrack(self, trade_id: int):
+        with self.lock:
+            trade = self.trades.pop(trade_id, None)
+            if trade is None:
+                return
+            self.index.remove(trade_id)
+            self.failures.pop(trade_id, None)
+            symbol = trade['symbol']
+            ids = self.by_symbol.get(symbol)
+            if ids is not None:
+                ids.discard(trade_id)
+            released = not ids
+            if released:
+                self.by_symbol.pop(symbol, None)
+        if released:
+            self.prices.unwatch(symbol, 'positions')
+
+    def untrack_symbol(self, symbol: str):
+        with self.lock:
+            trade_ids = list(self.by_symbol.get(symbol, ()))
+        for trade_id in trade_ids:
+            self.untrack(trade_id)
+
+    def on_price(self, symbol: str, price: float):
+        """Kiểm tra ngưỡng của các giao dịch trên symbol, giao cho handler các giao dịch bị vượt ngưỡng."""
+        if not self.running:
+            return
+        triggered = []
+        now = time.monotonic()
+        with self.lock:
+            self.ticks += 1
+            for trade_id in self.index.crossed(symbol, price):
+                if trade_id in self.in_flight:
+                    continue
+                failure = self.failures.get(trade_id)
+                if failure and now < failure[1]:
+                    continue
+                trade = self.trades[trade_id]
+                if self.crossed(trade, price):
+                    self.in_flight.add(trade_id)
+                    triggered.append(dict(trade))
+            self.triggers += len(triggered)
+        for trade in triggered:
+            self.executor.submit(self._run_handler, trade, price)
+
+    def _run_handler(self, trade: Dict[str, Any], price: float):
+        trade_id = trade['id']
+        failed = True
+        try:
+            result = self.handler(trade_id, price, trade=trade)
+            failed = isinstance(result, dict) and 'error' in result
+        except Exception as e:
+            logger.error(f"Error updating position {trade_id} at {price}: {str(e)}", exc_info=True)
+        finally:
+            with self.lock:
+                self.in_flight.discard(trade_id)
+                if not failed:
+                    self.failures.pop(trade_id, None)
+                elif trade_id in self.trades:
+                    count = self.failures.get(trade_id, (0, 0))[0] + 1
+                    delay = min(self.RETRY_BASE * 2 ** (count - 1), self.RETRY_MAX)
+                    self.failures[trade_id] = (count, time.monotonic() + delay)
+                    logger.warning(f"Trade {trade_id}: update failed {count} time(s), retrying in {delay:.0f}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'tracked_trades': len(self.trades),
+                'symbols': sorted(self.by_symbol),
+                'in_flight': len(self.in_flight),
+                'backoff': len(self.failures),
+                'ticks': self.ticks,
+                'triggers': self.triggers
+            }
+
+
 class TradingBot:
-    def __init__(self, testnet: bool = True):
-        """Khởi tạo bot với kết nối Bybit API, WebSocket và MySQL."""
+    def __init__(self, testnet: bool = True, start_jobs: bool = True):
+        """
+        Khởi tạo bot với kết nối Bybit API, WebSocket và MySQL.
+
+        start_jobs=False dùng cho tiến trình chỉ đặt lệnh (signal_worker.py): không chạy các công
+        việc định kỳ vì tiến trình API đã chạy chúng.
+        """
         self.running = True
         self.testnet = testnet
         try:
-            self.client = HTTP(
-                testnet=testnet,
-                api_key=os.getenv('BYBIT_API_KEY'),
-                api_secret=os.getenv('BYBIT_API_SECRET')
+            self.rate_limiter = RateLimiter(
+                ip_limit=float(os.getenv('RATE_LIMIT_IP_PER_SECOND', 120)),
+                critical_reserve=float(os.getenv('RATE_LIMIT_CRITICAL_RESERVE', 20))
             )
+            self.order_event_workers = int(os.getenv('ORDER_EVENT_WORKERS', 4))
+            exchange_workers = int(os.getenv('EXCHANGE_WORKERS', 8))
+            signal_concurrency = int(os.getenv('SIGNAL_CONCURRENCY', 4))
+            # Sự kiện của lệnh tạo trong khoảng này (giây) mà chưa ánh xạ được tới giao dịch thì được thử lại
+            self.order_event_retry_window = float(os.getenv('ORDER_EVENT_RETRY_WINDOW', 10))
+            # Mỗi luồng có thể gọi sàn đồng thời giữ một kết nối keep-alive, cộng thêm cho API và lịch trình
+            default_http_pool_size = exchange_workers + self.order_event_workers + signal_concurrency + 4
+            self.http_session = http_transport.create_session(
+                pool_size=int(os.getenv('HTTP_POOL_SIZE', default_http_pool_size)),
+                dns_ttl=float(os.getenv('DNS_CACHE_TTL', 300))
+            )
+            self.client = self.create_http_client()
+            # Mỗi luồng của các pool worker có thể giữ một kết nối: sự kiện lệnh, exchange (cập nhật vị thế
+            # theo tick), tín hiệu, lịch trình và executor đọc của chế độ ASGI, cộng thêm cho các luồng API.
+            # mysql-connector giới hạn pool ở 32 kết nối, phần vượt quá chờ ở semaphore của get_db_connection
+            default_pool_size = min(32, (
+                exchange_workers + self.order_event_workers + signal_concurrency
+                + int(os.getenv('SCHEDULER_WORKERS', 4)) + int(os.getenv('ASGI_READ_WORKERS', 8)) + 4
+            ))
             self.db_config = {
                 'host': os.getenv('DB_HOST', 'localhost'),
                 'user': os.getenv('DB_USER', 'homestead'),
                 'password': os.getenv('DB_PASSWORD', 'secret'),
                 'database': os.getenv('DB_NAME', 'auto_trader'),
                 'pool_name': 'trading_pool',
-                'pool_size': 5,
-                'pool_reset_session': True,
+                'pool_size': int(os.getenv('DB_POOL_SIZE', default_pool_size)),
+                'pool_reset_session': os.getenv('DB_POOL_RESET_SESSION', '0') == '1',
                 'autocommit': True
             }
             self.db_pool = None
             self.init_db_pool()
-            ws_endpoint = 'wss://stream-testnet.bybit.com/v5/public/linear' if testnet else 'wss://stream.bybit.com/v5/public/linear'
-            self.ws = WebSocket(
+            # BYBIT_WS_*_URL dùng để trỏ tới sàn giả lập (mock_bybit.py)
+            ws_endpoint = os.getenv('BYBIT_WS_PUBLIC_URL') or ('wss://stream-testnet.bybit.com/v5/public/linear' if testnet else 'wss://stream.bybit.com/v5/public/linear')
+            self.ws = EndpointWebSocket(
+                ws_endpoint,
                 testnet=testnet,
                 channel_type='linear'
             )
-            ws_endpoint_private = 'wss://stream-testnet.bybit.com/v5/private' if testnet else 'wss://stream.bybit.com/v5/private'
+            ws_endpoint_private = os.getenv('BYBIT_WS_PRIVATE_URL') or ('wss://stream-testnet.bybit.com/v5/private' if testnet else 'wss://stream.bybit.com/v5/private')
             print(ws_endpoint_private, testnet)
-            self.ws_private = WebSocket(
+            self.ws_private = EndpointWebSocket(
+                ws_endpoint_private,
                 testnet=testnet,
                 channel_type='private',
                 api_key=os.getenv('BYBIT_API_KEY'),
                 api_secret=os.getenv('BYBIT_API_SECRET')
             )
             self.active_trades = {}
+            self.instruments = InstrumentCache(self.client, ttl=int(os.getenv('INSTRUMENT_CACHE_TTL', 3600)))
+            self.instruments.start()
+            # Đánh dấu luồng của exchange_executor để _run_concurrently không submit lồng nhau vào chính pool này
+            self.exchange_thread = threading.local()
+            self.exchange_executor = ThreadPoolExecutor(
+                max_workers=exchange_workers,
+                thread_name_prefix='exchange',
+                initializer=setattr,
+                initargs=(self.exchange_thread, 'active', True)
+            )
+            self.metrics_lock = threading.Lock()
+            self.pre_trade_timings = deque(maxlen=200)
+            self.account_state = AccountStateCache()
+            self.trade_cache = TradeCache(max_size=int(os.getenv('TRADE_CACHE_SIZE', 5000)))
+            self.order_mirror = OrderMirror()
+            self.mirror_position_loads = set()      # symbol đang tải vị thế cho order_mirror
+            self.order_dispatcher = OrderEventDispatcher(
+                self.process_order_event,
+                workers=self.order_event_workers,
+                retry_window=self.order_event_retry_window
+            )
+            self.prices = PriceCache(self.client, self.ws, max_age=float(os.getenv('PRICE_CACHE_MAX_AGE', 5)))
+            self.position_manager = PositionManager(self.prices, self.update_position, self.exchange_executor)
+            self.signal_executor = SymbolExecutor(concurrency=signal_concurrency)
+            self.order_sync_lock = threading.Lock()
+            self.order_sync_stats = {}
+            self.cancel_job_lock = threading.Lock()
+            self.cancel_job_stats = {}
+            self.order_expiry = OrderExpiryQueue(
+                self.cancel_stale_trades,
+                max_age=float(os.getenv('ORDER_MAX_AGE_MINUTES', 60)) * 60
+            )
+            self.scheduler = JobScheduler(
+                workers=int(os.getenv('SCHEDULER_WORKERS', 4)),
+                max_jitter=float(os.getenv('SCHEDULER_MAX_JITTER', 5))
+            )
             signal.signal(signal.SIGINT, self.shutdown)
             signal.signal(signal.SIGTERM, self.shutdown)
             logger.info("TradingBot initialized successfully")
-            self.schedule_jobs()
-            # Khởi động luồng cho schedule
-            self.start_schedule_thread()
+            if start_jobs:
+                self.schedule_jobs()
+                self.start_schedule_thread()
+                self.order_expiry.start(self.load_open_trades())
         except Exception as e:
             logger.error(f"Initialization error: {str(e)}")
             raise
@@ -115,6 +1372,20 @@ class TradingBot:
             logger.error(f"Lỗi trong quá trình lấy số dư tài khoản: {str(e)}")
             return {}
 
+    def create_http_client(self) -> RateLimitedHTTP:
+        """Client REST Bybit dùng transport HTTP chung và rate limiter chung của bot."""
+        client = HTTP(
+            testnet=self.testnet,
+            api_key=os.getenv('BYBIT_API_KEY'),
+            api_secret=os.getenv('BYBIT_API_SECRET'),
+            return_response_headers=True
+        )
+        client.client = self.http_session
+        # BYBIT_REST_URL dùng để trỏ tới sàn giả lập (mock_bybit.py)
+        if os.getenv('BYBIT_REST_URL'):
+            client.endpoint = os.getenv('BYBIT_REST_URL').rstrip('/')
+        return RateLimitedHTTP(client, self.rate_limiter)
+
     def init_db_pool(self):
         """Khởi tạo connection pool cho database."""
         try:
@@ -129,32 +1400,197 @@ class TradingBot:
                 pool_size=pool_size,
                 **db_config
             )
+            # Pool của mysql-connector báo lỗi ngay khi hết kết nối, semaphore giúp luồng chờ đến lượt
+            self.db_slots = threading.BoundedSemaphore(pool_size)
+            self.db_pool_stats = {
+                'checkouts': 0,
+                'timeouts': 0,
+                'in_use': 0,
+                'wait_times': deque(maxlen=1000)
+            }
+            self.db_pool_lock = threading.Lock()
             logger.info(f"Initialized MySQL connection pool with {pool_size} connections")
         except Error as e:
             logger.error(f"Error initializing database pool: {str(e)}")
             raise
 
-    def get_db_connection(self, retries=3, delay=1):
-        """Lấy kết nối từ pool với cơ chế retry tự động."""
+    def get_db_connection(self, retries=3, delay=1, timeout=30):
+        """Lấy kết nối từ pool với cơ chế retry tự động, chờ tối đa timeout giây khi pool đang bận."""
+        started = time.monotonic()
+        if not self.db_slots.acquire(timeout=timeout):
+            with self.db_pool_lock:
+                self.db_pool_stats['timeouts'] += 1
+            raise Error(f"Timed out waiting {timeout}s for a database connection")
+
         attempt = 0
         last_exception = None
         
         while attempt < retries:
             try:
+                # Pool tự kiểm tra và kết nối lại khi lấy kết nối ra
                 connection = self.db_pool.get_connection()
-                if connection.is_connected():
-                    return connection
+                with self.db_pool_lock:
+                    self.db_pool_stats['checkouts'] += 1
+                    self.db_pool_stats['in_use'] += 1
+                    self.db_pool_stats['wait_times'].append(time.monotonic() - started)
+                return connection
             except Error as e:
                 last_exception = e
                 logger.warning(f"Failed to get database connection (attempt {attempt + 1}/{retries}): {str(e)}")
                 time.sleep(delay)
                 attempt += 1
         
+        self.db_slots.release()
         logger.error(f"Failed to get database connection after {retries} attempts")
         if last_exception:
             raise last_exception
         raise Error("Failed to get database connection")
 
+    def release_db_connection(self, connection):
+        """Trả kết nối về pool."""
+        try:
+            connection.close()
+        except:
+            pass
+        finally:
+            with self.db_pool_lock:
+                self.db_pool_stats['in_use'] -= 1
+            self.db_slots.release()
+
+    @contextmanager
+    def db_session(self):
+        """
+        Unit of work: các câu lệnh trong khối with chạy trên cùng một kết nối, trong một transaction.
+
+        Commit khi khối with kết thúc bình thường, rollback khi có exception. Không gọi REST của sàn
+        trong khối with: kết nối và transaction bị giữ suốt thời gian chờ sàn.
+
+        Ví dụ:
+            with self.db_session() as session:
+                trade = self.get_trade_by_id(trade_id, session=session)
+                session.execute("UPDATE trades SET ... WHERE id = %s", (trade_id,), fetch=False)
+        """
+        connection = self.get_db_connection()
+        session = DBSession(connection)
+        rolled_back = False
+        try:
+            connection.start_transaction()
+            yield session
+            connection.commit()
+        except Exception:
+            rolled_back = True
+            try:
+                connection.rollback()
+            except:
+                pass
+            # Các thay đổi đã ghi vào cache không còn đúng sau rollback
+            for trade_id in session.touched_trades:
+                self.trade_cache.invalidate(trade_id)
+            raise
+        finally:
+            self.release_db_connection(connection)
+            if rolled_back:
+                # Đọc lại bản đã commit sau khi trả kết nối, không lấy kết nối thứ hai trong lúc còn giữ kết nối này
+                for trade_id in session.touched_trades:
+                    try:
+                        self.refresh_tracked_trade(trade_id)
+                    except Exception as e:
+                        logger.error(f"Error refreshing trade {trade_id} after rollback: {str(e)}")
+
+    @contextmanager
+    def session_scope(self, session: DBSession = None):
+        """Dùng session đang mở của caller nếu có, nếu không mở db_session mới cho khối with."""
+        if session is not None:
+            yield session
+            return
+        with self.db_session() as session:
+            yield session
+
+    def lock_trade_status(self, trade_id: int, session: DBSession) -> Optional[str]:
+        """Khóa dòng giao dịch tới hết transaction (SELECT ... FOR UPDATE) và trả về trạng thái hiện tại."""
+        rows = session.execute("SELECT status FROM trades WHERE id = %s FOR UPDATE", (trade_id,))
+        return rows[0]['status'] if rows else None
+
+    def run_query(self, query, params=None, fetch=True, session=None):
+        """Thực thi câu lệnh trong session nếu có, nếu không thì dùng execute_query (tự commit)."""
+        if session is not None:
+            return session.execute(query, params, fetch=fetch)
+        return self.execute_query(query, params, fetch=fetch, commit=not fetch)
+
+    def cache_trade_update(self, trade_id: int, fields: Dict[str, Any], session: DBSession = None):
+        """Ghi các cột vừa UPDATE vào TradeCache và chỉ mục của PositionManager."""
+        self.trade_cache.update(trade_id, fields)
+        if session is not None:
+            session.touched_trades.add(trade_id)
+        self.refresh_tracked_trade(trade_id, session)
+
+    def refresh_tracked_trade(self, trade_id: int, session: DBSession = None):
+        """
+        Đồng bộ giao dịch vào PositionManager: theo dõi khi đã khớp, bỏ theo dõi khi đã đóng.
+
+        Khi cache không có giao dịch, dòng được đọc qua session (nếu có) để thấy các thay đổi chưa commit.
+        """
+        trade = self.trade_cache.get(trade_id)
+        if trade is None:
+            trade = self.get_trade_by_id(trade_id, session=session)
+        if trade is not None:
+            self.position_manager.track(trade)
+
+    def load_live_trades(self) -> List[Dict[str, Any]]:
+        """Các giao dịch đã khớp và chưa đóng, dùng để dựng lại chỉ mục của PositionManager."""
+        trades = self.execute_query(
+            """
+            SELECT * FROM trades
+            WHERE status IN ('FILLED', 'TP1_HIT', 'TP2_HIT')
+            AND filled_at IS NOT NULL
+            """,
+            fetch=True
+        ) or []
+        for trade in trades:
+            self.trade_cache.put(trade)
+        return trades
+
+    def cache_inserted_trade(self, trade_id: int, insert_params: tuple):
+        """Nạp giao dịch vừa insert vào TradeCache, các cột còn lại lấy giá trị mặc định của bảng."""
+        columns = (
+            'order_id', 'symbol', 'side', 'entry_price', 'quantity', 'position_size',
+            'leverage', 'tp1_price', 'tp2_price', 'tp3_price', 'sl_price',
+            'current_sl', 'current_tp', 'strategy_type', 'status', 'bot_name'
+        )
+        now = datetime.now()
+        trade = {
+            'id': trade_id,
+            'tp1_order_id': None,
+            'tp2_order_id': None,
+            'tp3_order_id': None,
+            'pnl': 0,
+            'pnl_percent': 0,
+            'created_at': now,
+            'updated_at': now,
+            'closed_at': None,
+            'filled_at': None
+        }
+        trade.update(zip(columns, insert_params))
+        self.trade_cache.put({column: TradeCache.normalize(column, value) for column, value in trade.items()})
+
+    def get_db_pool_stats(self) -> Dict[str, Any]:
+        """Thời gian chờ lấy kết nối (ms) và số kết nối đang dùng."""
+        with self.db_pool_lock:
+            wait_times = sorted(self.db_pool_stats['wait_times'])
+            stats = {
+                'pool_size': self.db_config['pool_size'],
+                'in_use': self.db_pool_stats['in_use'],
+                'checkouts': self.db_pool_stats['checkouts'],
+                'timeouts': self.db_pool_stats['timeouts']
+            }
+        if wait_times:
+            stats['wait_ms'] = {
+                'p50': round(wait_times[len(wait_times) // 2] * 1000, 2),
+                'p99': round(wait_times[min(len(wait_times) - 1, int(len(wait_times) * 0.99))] * 1000, 2),
+                'max': round(wait_times[-1] * 1000, 2)
+            }
+        return stats
+
     def execute_query(self, query, params=None, fetch=True, commit=False, max_retries=3, retry_delay=1):
         """
         Thực thi câu query với kết nối từ pool.
@@ -244,11 +1680,8 @@ class TradingBot:
                     except:
                         pass
                 
-                if connection and connection.is_connected():
-                    try:
-                        connection.close()
-                    except:
-                        pass
+                if connection:
+                    self.release_db_connection(connection)
         
         # Nếu vượt quá số lần thử lại
         error_msg = f"Failed to execute query after {max_retries} attempts"
@@ -341,43 +1774,15 @@ class TradingBot:
                     logger.warning(f"Failed to fetch open orders: {response.get('retMsg', 'Unknown error')}")
             except Exception as e:
                 logger.warning(f"Error checking/closing open orders: {str(e)}")
-            # Kiểm tra và thiết lập chế độ vị thế
-            try:
-                self.client.switch_position_mode(category='linear', mode=3, symbol=signal['symbol'])
-                logger.info(f"Switched to Hedge Mode for {signal['symbol']}")
-            except Exception as e:
-                logger.warning(f"Failed to switch to Hedge Mode: {str(e)}")
-            
-            response = self.client.get_instruments_info(category="linear", symbol=signal['symbol'])
-            instrument = response["result"]["list"][0]
-            qty_step = float(instrument['lotSizeFilter']['qtyStep'])
 
-            positions = self.client.get_positions(category='linear', symbol=signal['symbol'])
-
-            quantity = math.floor(quantity / qty_step) * qty_step
+            quantity = self.instruments.round_qty(signal['symbol'], quantity)
             # Xác định positionIdx dựa trên chế độ
             position_idx = 1 if side == 'Buy' else 2 
 
-            # Thiết lập đòn bẩy
+            # Kiểm tra và thiết lập chế độ vị thế, đòn bẩy (bỏ qua nếu cache đã khớp)
             leverage = signal.get('leverage', 5)
-            try:
-                current_leverage = positions['result']['list'][0].get('leverage', '1')
-                if current_leverage != str(leverage):
-                    leverage_response = self.client.set_leverage(
-                        category='linear',
-                        symbol=signal['symbol'],
-                        buyLeverage=str(leverage),
-                        sellLeverage=str(leverage)
-                    )
-                    if leverage_response.get('retCode', -1) == 0:
-                        logger.info(f"Leverage set to {leverage}x for {signal['symbol']}")
-                    else:
-                        logger.warning(f"Failed to set leverage: {leverage_response.get('retMsg', 'Unknown error')}")
-                else:
-                    logger.info(f"Leverage already at {leverage}x for {signal['symbol']}")
-            except Exception as e:
-                logger.warning(f"Failed to set leverage: {str(e)}")
-          
+            self.sync_account_state(signal['symbol'], leverage)
+
             order = self.client.place_order(
                 category='linear',
                 symbol=signal['symbol'],
@@ -386,7 +1791,7 @@ class TradingBot:
                 qty=f"{round(quantity, 8)}",
                 timeInForce='GTC',
                 positionIdx=position_idx,
-                stopLoss=f"{signal['sl_price']}",
+                stopLoss=f"{self.instruments.round_price(signal['symbol'], signal['sl_price'])}",
                 reduceOnly=False
             )
 
@@ -427,17 +1832,209 @@ class TradingBot:
                     fetch=False,
                     commit=True
                 )
+                self.cache_inserted_trade(trade_id, insert_params)
+                self.register_trade_orders(trade_id, {'entry': order_id})
                 self.active_trades[trade_id] = signal['symbol']
+                self.order_expiry.add(trade_id, order_id, signal['symbol'])
                 logger.info(f"Order created: {order_id}, Trade ID: {trade_id}, Bot: {bot_name}")
                 return {'trade_id': trade_id, 'order_id': order_id, 'status': 'OPEN', 'bot_name': bot_name}
             else:
                 logger.error(f"Order creation failed: {order['retMsg']}")
                 return {'error': order['retMsg']}
 
-        except Exception as e:
-            logger.error(f"Error creating order: {str(e)}")
-            return {'error': str(e)}
+        except Exception as e:
+            logger.error(f"Error creating order: {str(e)}")
+            return {'error': str(e)}
+
+
+    def _close_existing_position(self, symbol: str, position: Dict[str, Any]) -> Dict[str, Any]:
+        """Đóng một vị thế bằng lệnh Market reduce-only."""
+        close_response = self.client.place_order(
+            category='linear',
+            symbol=symbol,
+            side='Buy' if position['side'] == 'Sell' else 'Sell',
+            orderType='Market',
+            qty=str(position['size']),
+            reduceOnly=True,
+            positionIdx=int(position.get('positionIdx', 0))
+        )
+        if close_response.get('retCode', 0) == 0:
+            logger.info(f"Đã đóng vị thế cho {symbol}, side: {position['side']}, qty: {position['size']}")
+        else:
+            logger.warning(f"Không thể đóng vị thế cho {symbol}: {close_response.get('retMsg', 'Lỗi không xác định')}")
+        return close_response
+
+    def _cancel_existing_order(self, symbol: str, order: Dict[str, Any]) -> Dict[str, Any]:
+        """Hủy một lệnh đang mở của symbol."""
+        cancel_response = self.client.cancel_order(
+            category='linear',
+            symbol=symbol,
+            orderId=order['orderId']
+        )
+        if cancel_response.get('retCode', 0) == 0:
+            logger.info(f"Closed existing order {order['orderId']} for {symbol}, side: {order['side']}")
+        else:
+            logger.warning(f"Failed to close order {order['orderId']}: {cancel_response.get('retMsg', 'Unknown error')}")
+        return cancel_response
+
+    def _switch_hedge_mode(self, symbol: str):
+        """Chuyển symbol sang Hedge Mode."""
+        try:
+            self.client.switch_position_mode(category='linear', mode=3, symbol=symbol)
+            self.account_state.set_mode(symbol, AccountStateCache.HEDGE_MODE)
+            logger.info(f"Switched to Hedge Mode for {symbol}")
+        except Exception as e:
+            if '110025' in str(e):  # Position mode is not modified
+                self.account_state.set_mode(symbol, AccountStateCache.HEDGE_MODE)
+                return
+            logger.warning(f"Failed to switch to Hedge Mode: {str(e)}")
+
+    def _ensure_leverage(self, symbol: str, leverage: int):
+        """Đặt đòn bẩy cho cả hai chiều của symbol."""
+        try:
+            leverage_response = self.client.set_leverage(
+                category='linear',
+                symbol=symbol,
+                buyLeverage=str(leverage),
+                sellLeverage=str(leverage)
+            )
+            if leverage_response.get('retCode', -1) == 0:
+                self.account_state.set_leverage(symbol, leverage)
+                logger.info(f"Leverage set to {leverage}x for {symbol}")
+            else:
+                logger.warning(f"Failed to set leverage: {leverage_response.get('retMsg', 'Unknown error')}")
+        except Exception as e:
+            if '110043' in str(e):  # Leverage not modified
+                self.account_state.set_leverage(symbol, leverage)
+                return
+            logger.warning(f"Failed to set leverage: {str(e)}")
+
+    def sync_account_state(self, symbol: str, leverage: int):
+        """
+        Đảm bảo symbol ở Hedge Mode với đúng đòn bẩy, chỉ gọi API khi trạng thái trong cache khác.
+
+        Nếu cache chưa có trạng thái của symbol thì lấy từ get_positions một lần.
+        """
+        state = self.account_state.get(symbol)
+        if 'mode' not in state or 'leverage' not in state:
+            try:
+                response = self.client.get_positions(category='linear', symbol=symbol)
+                if response.get('retCode', -1) == 0:
+                    for position in response.get('result', {}).get('list', []):
+                        self.account_state.update_from_position(position)
+            except Exception as e:
+                logger.warning(f"Could not get position info for {symbol}: {str(e)}")
+
+        tasks = []
+        if not self.account_state.is_hedge_mode(symbol):
+            tasks.append((self._switch_hedge_mode, symbol))
+        if not self.account_state.leverage_matches(symbol, leverage):
+            tasks.append((self._ensure_leverage, symbol, leverage))
+        else:
+            logger.info(f"Leverage already at {leverage}x for {symbol}")
+        if tasks:
+            self._run_concurrently(tasks)
+
+    def _run_concurrently(self, tasks: List[tuple]) -> List[Any]:
+        """
+        Chạy các lời gọi API độc lập song song trên exchange_executor, trả về kết quả theo thứ tự.
+
+        Khi được gọi từ chính một luồng của exchange_executor (ví dụ cancel_orders_batch trong
+        cancel_stale_trades), các lời gọi chạy tuần tự trên luồng đó: worker chờ các task xếp sau
+        mình trong cùng pool sẽ làm pool deadlock khi mọi worker cùng chờ.
+        """
+        if getattr(self.exchange_thread, 'active', False):
+            futures = None
+        else:
+            futures = [self.exchange_executor.submit(func, *args) for func, *args in tasks]
+        results = []
+        for index, (func, *args) in enumerate(tasks):
+            try:
+                results.append(futures[index].result() if futures else func(*args))
+            except Exception as e:
+                logger.warning(f"Exchange call failed: {str(e)}")
+                results.append(e)
+        return results
+
+    def prepare_symbol(self, symbol: str, side: str, leverage: int, timings: Dict[str, float] = None):
+        """
+        Chuẩn bị symbol trước khi đặt lệnh mới theo pipeline.
+
+        1. snapshot: lấy vị thế, lệnh mở và thông số hợp đồng song song
+        2. flatten: đóng các vị thế và hủy các lệnh cùng side song song
+        3. account: chuyển Hedge Mode và đặt đòn bẩy song song, chỉ khi cache trạng thái khác
+
+        Args:
+            symbol (str): Mã giao dịch
+            side (str): Side của lệnh mới (Buy/Sell)
+            leverage (int): Đòn bẩy mong muốn
+            timings (dict, optional): Nơi ghi thời gian (giây) của từng giai đoạn
+        """
+        timings = timings if timings is not None else {}
+
+        stage_started = time.monotonic()
+        positions_response, orders_response, _ = self._run_concurrently([
+            (functools.partial(self.client.get_positions, category='linear', symbol=symbol), ),
+            (functools.partial(self.client.get_open_orders, category='linear', symbol=symbol, side=side), ),
+            (self.instruments.get, symbol)
+        ])
+        timings['snapshot'] = time.monotonic() - stage_started
+
+        positions = []
+        if isinstance(positions_response, dict) and positions_response.get('retCode', -1) == 0:
+            positions = positions_response.get('result', {}).get('list', [])
+            for position in positions:
+                self.account_state.update_from_position(position)
+        else:
+            logger.warning(f"Không thể lấy danh sách vị thế: {positions_response.get('retMsg', 'Lỗi không xác định') if isinstance(positions_response, dict) else positions_response}")
+
+        orders = []
+        if isinstance(orders_response, dict) and orders_response.get('retCode', -1) == 0:
+            orders = orders_response.get('result', {}).get('list', [])
+        else:
+            logger.warning(f"Failed to fetch open orders: {orders_response.get('retMsg', 'Unknown error') if isinstance(orders_response, dict) else orders_response}")
 
+        stage_started = time.monotonic()
+        tasks = [
+            (self._close_existing_position, symbol, position)
+            for position in positions
+            if position['symbol'] == symbol and float(position['size']) > 0
+        ]
+        tasks += [
+            (self._cancel_existing_order, symbol, order)
+            for order in orders
+            if order['symbol'] == symbol and order['side'] == side
+        ]
+        if tasks:
+            self._run_concurrently(tasks)
+        timings['flatten'] = time.monotonic() - stage_started
+
+        stage_started = time.monotonic()
+        self.sync_account_state(symbol, leverage)
+        timings['account'] = time.monotonic() - stage_started
+
+    def record_pre_trade_timings(self, symbol: str, timings: Dict[str, float]):
+        """Lưu và ghi log thời gian từng giai đoạn trước khi đặt lệnh."""
+        with self.metrics_lock:
+            self.pre_trade_timings.append(timings)
+        logger.info(
+            f"Pre-trade timings for {symbol}: " +
+            ", ".join(f"{stage}={duration * 1000:.1f}ms" for stage, duration in timings.items())
+        )
+
+    def get_pre_trade_stats(self) -> Dict[str, Any]:
+        """Thời gian trung bình và lớn nhất (ms) của từng giai đoạn trên các lệnh gần đây."""
+        with self.metrics_lock:
+            samples = list(self.pre_trade_timings)
+        stats = {'samples': len(samples)}
+        for stage in ('snapshot', 'flatten', 'account', 'place', 'total'):
+            values = [sample[stage] for sample in samples if stage in sample]
+            if values:
+                stats[stage] = {
+                    'avg_ms': round(sum(values) / len(values) * 1000, 2),
+                    'max_ms': round(max(values) * 1000, 2)
+                }
+        return stats
 
     def create_order_best(self, signal: Dict[str, Any], type: str) -> Dict[str, Any]:
         """Tạo lệnh giao dịch trên Bybit với Take Profit và Stop Loss, vị thế 30 USDT."""
@@ -460,95 +2057,20 @@ class TradingBot:
                 raise ValueError("Side must be either 'Buy' or 'Sell'")
             bot_name = signal.get('bot', 'Unknown')
 
-            try:
-                # Kiểm tra các vị thế hiện tại
-                response = self.client.get_positions(
-                    category='linear',
-                    symbol=signal['asset']
-                )
-                if response.get('retCode', -1) == 0:
-                    positions = response.get('result', {}).get('list', [])
-                    for position in positions:
-                        if position['symbol'] == signal['asset'] and float(position['size']) > 0:
-                            position_idx = int(position.get('positionIdx', 0))
-                            close_response = self.client.place_order(
-                                category='linear',
-                                symbol=signal['asset'],
-                                side='Buy' if position['side'] == 'Sell' else 'Sell',
-                                orderType='Market',
-                                qty=str(round(position['size'], 8)),
-                                reduceOnly=True,
-                                positionIdx=position_idx
-                            )
-                            
-                            if close_response.get('retCode', 0) == 0:
-                                logger.info(f"Đã đóng vị thế cho {signal['asset']}, side: {side}, qty: {position['size']}")
-                            else:
-                                logger.warning(f"Không thể đóng vị thế cho {signal['asset']}: {close_response.get('retMsg', 'Lỗi không xác định')}")
-                else:
-                    logger.warning(f"Không thể lấy danh sách vị thế: {response.get('retMsg', 'Lỗi không xác định')}")
-
-                # Kiểm tra và hủy các lệnh mở hiện tại
-                response = self.client.get_open_orders(
-                    category='linear',
-                    symbol=signal['asset'],
-                    side=side
-                )
-                if response.get('retCode', -1) == 0:
-                    orders = response.get('result', {}).get('list', [])
-                    for order in orders:
-                        if order['symbol'] == signal['asset'] and order['side'] == side:
-                            cancel_response = self.client.cancel_order(
-                                category='linear',
-                                symbol=signal['asset'],
-                                orderId=order['orderId']
-                            )
-                            if cancel_response.get('retCode', 0) == 0:
-                                logger.info(f"Closed existing order {order['orderId']} for {signal['asset']}, side: {side}")
-                            else:
-                                logger.warning(f"Failed to close order {order['orderId']}: {cancel_response.get('retMsg', 'Unknown error')}")
-                else:
-                    logger.warning(f"Failed to fetch open orders: {response.get('retMsg', 'Unknown error')}")
-            except Exception as e:
-                logger.warning(f"Error checking/closing open orders: {str(e)}")
-
-            # Kiểm tra và thiết lập chế độ vị thế
-            try:
-                self.client.switch_position_mode(category='linear', mode=3, symbol=signal['asset'])
-                logger.info(f"Switched to Hedge Mode for {signal['asset']}")
-            except Exception as e:
-                logger.warning(f"Failed to switch to Hedge Mode: {str(e)}")
-
-            # Lấy thông tin công cụ để xác định qty_step
-            response = self.client.get_instruments_info(category="linear", symbol=signal['asset'])
-            instrument = response["result"]["list"][0]
-            qty_step = float(instrument['lotSizeFilter']['qtyStep'])
+            leverage = signal.get('leverage', 5)
+            timings = {}
+            started_at = time.monotonic()
 
-            positions = self.client.get_positions(category='linear', symbol=signal['asset'])
+            # Chuẩn bị symbol: đóng vị thế, hủy lệnh cũ, chế độ vị thế và đòn bẩy
+            self.prepare_symbol(signal['asset'], side, leverage, timings)
 
-            quantity = math.floor(quantity / qty_step) * qty_step
+            # Làm tròn số lượng và giá theo thông số hợp đồng trong cache
+            quantity = self.instruments.round_qty(signal['asset'], quantity)
+            take_profit = self.instruments.round_price(signal['asset'], signal['tp3'])
+            stop_loss = self.instruments.round_price(signal['asset'], signal['stoploss'])
             # Xác định positionIdx dựa trên chế độ
             position_idx = 1 if side == 'Buy' else 2
-
-            # Thiết lập đòn bẩy
-            leverage = signal.get('leverage', 5)
-            try:
-                current_leverage = positions['result']['list'][0].get('leverage', '1')
-                if current_leverage != str(leverage):
-                    leverage_response = self.client.set_leverage(
-                        category='linear',
-                        symbol=signal['asset'],
-                        buyLeverage=str(leverage),
-                        sellLeverage=str(leverage)
-                    )
-                    if leverage_response.get('retCode', -1) == 0:
-                        logger.info(f"Leverage set to {leverage}x for {signal['asset']}")
-                    else:
-                        logger.warning(f"Failed to set leverage: {leverage_response.get('retMsg', 'Unknown error')}")
-                else:
-                    logger.info(f"Leverage already at {leverage}x for {signal['asset']}")
-            except Exception as e:
-                logger.warning(f"Failed to set leverage: {str(e)}")
+            stage_started = time.monotonic()
 
             # Đặt lệnh giao dịch
             if type == 'ema':
@@ -560,8 +2082,8 @@ class TradingBot:
                     qty=f"{round(quantity, 8)}",
                     timeInForce='GTC',
                     positionIdx=position_idx,
-                    takeProfit=f"{signal['tp3']}",
-                    stopLoss=f"{signal['stoploss']}",
+                    takeProfit=f"{take_profit}",
+                    stopLoss=f"{stop_loss}",
                     reduceOnly=False
                 )
             else:
@@ -571,13 +2093,16 @@ class TradingBot:
                     side=side,
                     orderType='Limit',  # Changed from 'Market' to 'Limit'
                     qty=f"{round(quantity, 8)}",
-                    price=f"{signal['entry1']}",  # Specify the desired entry price
+                    price=f"{self.instruments.round_price(signal['asset'], signal['entry1'])}",  # Specify the desired entry price
                     timeInForce='GTC',
                     positionIdx=position_idx,
-                    takeProfit=f"{signal['tp3']}",
-                    stopLoss=f"{signal['stoploss']}",
+                    takeProfit=f"{take_profit}",
+                    stopLoss=f"{stop_loss}",
                     reduceOnly=False
                 )
+            timings['place'] = time.monotonic() - stage_started
+            timings['total'] = time.monotonic() - started_at
+            self.record_pre_trade_timings(signal['asset'], timings)
             
             # Lưu vào cơ sở dữ liệu
             if order['retCode'] == 0:
@@ -628,6 +2153,10 @@ class TradingBot:
                     fetch=False,
                     commit=True
                 )
+                self.cache_inserted_trade(trade_id, insert_params)
+                self.register_trade_orders(trade_id, {'entry': order_id})
+                if type != 'ema':
+                    self.order_expiry.add(trade_id, order_id, signal['asset'])
                 
                 if type == 'ema':
                     self.place_tp_orders(trade_id=trade_id, symbol=signal['asset'], side=side, quantity=quantity, tp1_price=signal.get('tp1'), tp2_price=signal.get('tp2'), tp3_price=signal.get('tp3', 0), position_idx=position_idx, entry_price=signal['entry1'])
@@ -635,12 +2164,58 @@ class TradingBot:
                 return { 'order_id': order_id, 'status': 'OPEN', 'bot_name': bot_name}
             else:
                 logger.error(f"Order creation failed: {order['retMsg']}")
+                self.account_state.invalidate(signal['asset'])
                 return {'error': order['retMsg']}
 
         except Exception as e:
             logger.error(f"Error creating order: {str(e)}")
+            self.account_state.invalidate(signal.get('asset'))
             return {'error': str(e)}
 
+    def execute_signal(self, signal: Dict[str, Any], type: str) -> Future:
+        """Chạy create_order_best qua SymbolExecutor: tuần tự theo symbol, song song giữa các symbol."""
+        return self.signal_executor.submit(signal['asset'], self.create_order_best, signal, type)
+
+    def place_orders_batch(self, requests: List[Dict[str, Any]]) -> List[str]:
+        """
+        Đặt nhiều lệnh linear trong một request place_batch_order.
+
+        Nếu cả batch thất bại thì đặt từng lệnh song song.
+
+        Args:
+            requests (list): Tham số của từng lệnh, cùng định dạng với place_order (không có category)
+
+        Returns:
+            List[str]: orderId của từng lệnh theo thứ tự, None với lệnh đặt không thành công
+        """
+        try:
+            response = self.client.place_batch_order(category='linear', request=requests)
+            if response.get('retCode') == 0:
+                results = response.get('result', {}).get('list', [])
+                infos = response.get('retExtInfo', {}).get('list', [])
+                order_ids = []
+                for index in range(len(requests)):
+                    result = results[index] if index < len(results) else {}
+                    info = infos[index] if index < len(infos) else {}
+                    if info.get('code', 0) == 0 and result.get('orderId'):
+                        order_ids.append(result['orderId'])
+                    else:
+                        logger.warning(f"Batch order {index} rejected: {info.get('msg', 'Unknown error')}")
+                        order_ids.append(None)
+                return order_ids
+            logger.warning(f"Batch order failed, falling back to single orders: {response.get('retMsg', 'Unknown error')}")
+        except Exception as e:
+            logger.warning(f"Batch order failed, falling back to single orders: {str(e)}")
+
+        responses = self._run_concurrently([
+            (functools.partial(self.client.place_order, category='linear', **order_request), )
+            for order_request in requests
+        ])
+        return [
+            response['result']['orderId'] if isinstance(response, dict) and response.get('retCode') == 0 else None
+            for response in responses
+        ]
+
     def place_tp_orders(self, trade_id: int, symbol: str, side: str, quantity: float, tp1_price: float, tp2_price: float, tp3_price: float, position_idx: int, entry_price: float) -> Dict[str, Any]:
         """Đặt lệnh TP1, TP2, TP3, mỗi lệnh đóng 10 USDT."""
         try:
@@ -648,68 +2223,91 @@ class TradingBot:
             
             # Tính số lượng cho mỗi TP (10 USDT)
             tp1_quantity = 240 / entry_price  # Số lượng cho 10 USDT
-            tp1_quantity = round(math.floor(tp1_quantity / float(self.client.get_instruments_info(category="linear", symbol=symbol)["result"]["list"][0]['lotSizeFilter']['qtyStep'])) * float(self.client.get_instruments_info(category="linear", symbol=symbol)["result"]["list"][0]['lotSizeFilter']['qtyStep']), 8)
+            tp1_quantity = round(self.instruments.round_qty(symbol, tp1_quantity), 8)
 
             tp2_quantity = 50 / entry_price  # Số lượng cho 10 USDT
-            tp2_quantity = round(math.floor(tp2_quantity / float(self.client.get_instruments_info(category="linear", symbol=symbol)["result"]["list"][0]['lotSizeFilter']['qtyStep'])) * float(self.client.get_instruments_info(category="linear", symbol=symbol)["result"]["list"][0]['lotSizeFilter']['qtyStep']), 8)
+            tp2_quantity = round(self.instruments.round_qty(symbol, tp2_quantity), 8)
+
+            tp1_price = self.instruments.round_price(symbol, tp1_price)
+            tp2_price = self.instruments.round_price(symbol, tp2_price)
 
             print("is place tp ", tp1_quantity, tp2_quantity)
-            # Đặt lệnh TP1
-            tp1_order = self.client.place_order(
-                category='linear',
-                symbol=symbol,
-                side='Sell' if side == 'Buy' else 'Buy',
-                orderType='Limit',
-                qty=f"{tp1_quantity}",
-                price=f"{tp1_price}",
-                timeInForce='GTC',
-                positionIdx=position_idx,
-                reduceOnly=True
-            )
-            tp1_order_id = None
-            if tp1_order['retCode'] == 0:
-                tp1_order_id = tp1_order['result']['orderId']
+            # Đặt TP1, TP2 trong cùng một request batch
+            legs = [('tp1', tp1_quantity, tp1_price), ('tp2', tp2_quantity, tp2_price)]
+            order_ids = self.place_orders_batch([
+                {
+                    'symbol': symbol,
+                    'side': 'Sell' if side == 'Buy' else 'Buy',
+                    'orderType': 'Limit',
+                    'qty': f"{leg_quantity}",
+                    'price': f"{leg_price}",
+                    'timeInForce': 'GTC',
+                    'positionIdx': position_idx,
+                    'reduceOnly': True
+                }
+                for _, leg_quantity, leg_price in legs
+            ])
+
+            placed = {}
+            for (leg, _, leg_price), leg_order_id in zip(legs, order_ids):
+                if leg_order_id:
+                    placed[leg] = leg_order_id
+                    logger.info(f"{leg.upper()} order placed: {leg_order_id}, Symbol: {symbol}, Price: {leg_price}")
+                else:
+                    logger.warning(f"Failed to place {leg.upper()} order for trade {trade_id}")
+
+            # Ghi order id của các chân TP bằng một câu UPDATE
+            if placed:
                 self.execute_query(
-                    "UPDATE trades SET tp1_order_id = %s WHERE id = %s",
-                    (tp1_order_id, trade_id),
+                    f"UPDATE trades SET {', '.join(f'{leg}_order_id = %s' for leg in placed)} WHERE id = %s",
+                    (*placed.values(), trade_id),
                     commit=True
                 )
-                logger.info(f"TP1 order placed: {tp1_order_id}, Symbol: {symbol}, Price: {tp1_price}")
-            else:
-                logger.warning(f"Failed to place TP1 order: {tp1_order.get('retMsg', 'Unknown error')}")
-            
+                self.cache_trade_update(trade_id, {f'{leg}_order_id': leg_order_id for leg, leg_order_id in placed.items()})
+                self.register_trade_orders(trade_id, placed)
+
+            tp1_order_id = placed.get('tp1')
+            tp2_order_id = placed.get('tp2')
             print("order id tp1", tp1_order_id)
-            # Đặt lệnh TP2
-            tp2_order = self.client.place_order(
-                category='linear',
-                symbol=symbol,
-                side='Sell' if side == 'Buy' else 'Buy',
-                orderType='Limit',
-                qty=f"{tp2_quantity}",
-                price=f"{tp2_price}",
-                timeInForce='GTC',
-                positionIdx=position_idx,
-                reduceOnly=True
-            )
-            tp2_order_id = None
-            if tp2_order['retCode'] == 0:
-                tp2_order_id = tp2_order['result']['orderId']
-                self.execute_query(
-                    "UPDATE trades SET tp2_order_id = %s WHERE id = %s",
-                    (tp2_order_id, trade_id),
-                    commit=True
-                )
-                logger.info(f"TP2 order placed: {tp2_order_id}, Symbol: {symbol}, Price: {tp2_price}")
-            else:
-                logger.warning(f"Failed to place TP2 order: {tp2_order.get('retMsg', 'Unknown error')}")
-            
             print("order id tp2", tp2_order_id)
-            # Đặt lệnh TP3
 
             return {'tp1_order_id': tp1_order_id, 'tp2_order_id': tp2_order_id}
         except Exception as e:
             logger.error(f"Error placing TP orders: {str(e)}")
             return {'error': str(e)}
+    def register_trade_orders(self, trade_id: int, legs: Dict[str, str]) -> bool:
+        """
+        Ghi ánh xạ order_id -> trade vào bảng trade_orders.
+
+        Args:
+            trade_id (int): ID của giao dịch
+            legs (dict): Vai trò của lệnh ('entry', 'tp1', 'tp2', 'tp3') -> order_id
+
+        Returns:
+            bool: True nếu ghi thành công, False nếu có lỗi
+        """
+        legs = {leg: leg_order_id for leg, leg_order_id in legs.items() if leg_order_id}
+        if not trade_id or not legs:
+            return False
+        try:
+            params = []
+            for leg, leg_order_id in legs.items():
+                params.extend([leg_order_id, trade_id, leg])
+            self.execute_query(
+                f"""
+                INSERT INTO trade_orders (order_id, trade_id, leg)
+                VALUES {', '.join(['(%s, %s, %s)'] * len(legs))}
+                ON DUPLICATE KEY UPDATE trade_id = VALUES(trade_id), leg = VALUES(leg)
+                """,
+                tuple(params),
+                fetch=False,
+                commit=True
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error registering orders for trade {trade_id}: {str(e)}")
+            return False
+
     def check_order_status(self, trade_id: int) -> str:
         """Kiểm tra trạng thái lệnh trên Bybit."""
         try:
@@ -722,11 +2320,13 @@ class TradingBot:
             status = order['result']['list'][0]['orderStatus'] if order['retCode'] == 0 else 'CANCELLED'
             
             if status == 'Filled':
+                filled_at = datetime.now()
                 self.execute_query(
                     "UPDATE trades SET filled_at = %s WHERE id = %s",
-                    (datetime.now(), trade_id),
+                    (filled_at, trade_id),
                     commit=True
                 )
+                self.cache_trade_update(trade_id, {'filled_at': filled_at})
                 logger.info(f"Trade {trade_id}: Order filled")
                 
             return status
@@ -734,10 +2334,17 @@ class TradingBot:
             logger.error(f"Error checking order status for trade {trade_id}: {str(e)}")
             return 'ERROR'
 
-    def update_position(self, trade_id: int, current_price: float) -> Dict[str, Any]:
-        """Cập nhật trạng thái vị thế dựa trên giá thị trường."""
+    def update_position(self, trade_id: int, current_price: float, session: DBSession = None,
+                        trade: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Cập nhật trạng thái vị thế dựa trên giá thị trường (trade: giao dịch đã đọc sẵn, nếu có).
+
+        Lệnh gọi sàn chạy trước; sau đó câu SELECT khóa dòng và các câu UPDATE của bước chuyển trạng
+        thái chạy trong một transaction (session của caller nếu có), không giữ kết nối trong lúc chờ
+        sàn. Khi chạy trong session của caller, lỗi được ném ra để session rollback.
+        """
         try:
-            trade = self.get_trade_by_id(trade_id)
+            trade = trade or self.get_trade_by_id(trade_id, session=session)
             if not trade:
                 logger.error(f"Trade {trade_id} not found")
                 return {'error': 'Trade not found'}
@@ -749,23 +2356,22 @@ class TradingBot:
             if trade['status'] not in ['FILLED', 'TP1_HIT', 'TP2_HIT']:
                 return {'status': trade['status'], 'message': 'Position not in valid state for updating (must be FILLED, TP1_HIT, or TP2_HIT)'}
 
+            current_price = float(current_price)
             if trade['side'] == 'Buy':
-                pnl = (current_price - trade['entry_price']) * trade['quantity'] * trade['leverage']
+                pnl = (current_price - float(trade['entry_price'])) * float(trade['quantity']) * trade['leverage']
             else:
-                pnl = (trade['entry_price'] - current_price) * trade['quantity'] * trade['leverage']
-            pnl_percent = (pnl / trade['position_size']) * 100
+                pnl = (float(trade['entry_price']) - current_price) * float(trade['quantity']) * trade['leverage']
+            pnl_percent = (pnl / float(trade['position_size'])) * 100
 
-            if trade['side'] == 'Buy':
-                hit_tp1 = current_price >= trade['tp1_price']
-                hit_tp2 = current_price >= trade['tp2_price']
-                hit_sl = current_price <= trade['sl_price']
-            else:
-                hit_tp1 = current_price <= trade['tp1_price']
-                hit_tp2 = current_price <= trade['tp2_price']
-                hit_sl = current_price >= trade['sl_price']
+            # Cùng điều kiện với PositionManager khi chạy theo tick
+            action = PositionManager.crossed(trade, current_price)
+            hit_tp1 = action == 'TP1_HIT'
+            hit_tp2 = action == 'TP2_HIT'
+            hit_sl = action == 'CLOSED'
 
             if hit_tp1 and trade['status'] == 'FILLED':
-                self.update_stoploss(trade_id, trade['entry_price'])
+                # Câu UPDATE bên dưới ghi luôn current_sl, chỉ cần dời SL trên sàn
+                self.set_exchange_stoploss(trade, trade['entry_price'])
            
                 update_tp1_query = """
                     UPDATE trades 
@@ -776,17 +2382,25 @@ class TradingBot:
                         updated_at = %s
                     WHERE id = %s
                 """
-                self.execute_query(
-                    query=update_tp1_query,
-                    params=(trade['entry_price'], pnl, pnl_percent, datetime.now(), trade_id),
-                    fetch=False,
-                    commit=True
-                )
+                with self.session_scope(session) as db:
+                    if self.lock_trade_status(trade_id, db) != trade['status']:
+                        return self._position_changed(trade_id, db)
+                    updated_at = datetime.now()
+                    self.run_query(
+                        query=update_tp1_query,
+                        params=(trade['entry_price'], pnl, pnl_percent, updated_at, trade_id),
+                        fetch=False,
+                        session=db
+                    )
+                    self.cache_trade_update(trade_id, {
+                        'status': 'TP1_HIT', 'current_sl': trade['entry_price'], 'pnl': pnl,
+                        'pnl_percent': pnl_percent, 'updated_at': updated_at
+                    }, db)
                 logger.info(f"Trade {trade_id}: TP1 hit, SL moved to entry")
                 return {'status': 'TP1_HIT', 'message': 'Stoploss moved to entry', 'pnl': pnl}
             
             if hit_tp2 and trade['status'] == 'TP1_HIT':
-                self.update_stoploss(trade_id, trade['tp1_price'])
+                self.set_exchange_stoploss(trade, trade['tp1_price'])
                 
                 update_tp2_query = """
                     UPDATE trades 
@@ -797,17 +2411,28 @@ class TradingBot:
                         updated_at = %s
                     WHERE id = %s
                 """
-                self.execute_query(
-                    query=update_tp2_query,
-                    params=(trade['tp1_price'], pnl, pnl_percent, datetime.now(), trade_id),
-                    fetch=False,
-                    commit=True
-                )
+                with self.session_scope(session) as db:
+                    if self.lock_trade_status(trade_id, db) != trade['status']:
+                        return self._position_changed(trade_id, db)
+                    updated_at = datetime.now()
+                    self.run_query(
+                        query=update_tp2_query,
+                        params=(trade['tp1_price'], pnl, pnl_percent, updated_at, trade_id),
+                        fetch=False,
+                        session=db
+                    )
+                    self.cache_trade_update(trade_id, {
+                        'status': 'TP2_HIT', 'current_sl': trade['tp1_price'], 'pnl': pnl,
+                        'pnl_percent': pnl_percent, 'updated_at': updated_at
+                    }, db)
                 logger.info(f"Trade {trade_id}: TP2 hit, SL moved to TP1")
                 return {'status': 'TP2_HIT', 'message': 'Stoploss moved to TP1', 'pnl': pnl}
 
             if hit_sl:
-                self.close_position(trade_id, 1.0, current_price)
+                closed = self.close_exchange_position(trade, 1.0)
+                if closed is None:
+                    # Vị thế vẫn mở trên sàn: giữ trạng thái để lần sau thử đóng lại
+                    return {'error': 'Failed to close position on exchange'}
                 update_closed_query = """
                     UPDATE trades 
                     SET status = 'CLOSED', 
@@ -816,12 +2441,21 @@ class TradingBot:
                         pnl_percent = %s 
                     WHERE id = %s
                 """
-                self.execute_query(
-                    query=update_closed_query,
-                    params=(datetime.now(), pnl, pnl_percent, trade_id),
-                    fetch=False,
-                    commit=True
-                )
+                with self.session_scope(session) as db:
+                    if self.lock_trade_status(trade_id, db) != trade['status']:
+                        return self._position_changed(trade_id, db)
+                    if closed == 'PLACED':
+                        self.record_position_close(trade_id, trade, 1.0, current_price, session=db)
+                    closed_at = datetime.now()
+                    self.run_query(
+                        query=update_closed_query,
+                        params=(closed_at, pnl, pnl_percent, trade_id),
+                        fetch=False,
+                        session=db
+                    )
+                    self.cache_trade_update(trade_id, {
+                        'status': 'CLOSED', 'closed_at': closed_at, 'pnl': pnl, 'pnl_percent': pnl_percent
+                    }, db)
                 logger.info(f"Trade {trade_id}: Hit stoploss, position closed")
                 return {'status': 'CLOSED', 'message': 'Position closed at stoploss', 'pnl': pnl}
 
@@ -829,41 +2463,59 @@ class TradingBot:
             return {'status': trade['status'], 'message': 'No update required', 'pnl': pnl}
 
         except Exception as e:
+            if session is not None:
+                raise
             logger.error(f"Error updating position {trade_id}: {str(e)}")
             return {'error': str(e)}
 
-    def update_stoploss(self, trade_id: int, new_sl: float) -> bool:
-        """Cập nhật stoploss cho giao dịch."""
+    def _position_changed(self, trade_id: int, session: DBSession) -> Dict[str, Any]:
+        """Giao dịch đã đổi trạng thái trong lúc chờ sàn (sự kiện lệnh xử lý trước): bỏ qua bước chuyển."""
+        self.trade_cache.invalidate(trade_id)
+        self.refresh_tracked_trade(trade_id, session)
+        logger.info(f"Trade {trade_id}: status changed while updating position, skipped")
+        return {'status': 'CHANGED', 'message': 'Trade status changed concurrently'}
+
+    def update_stoploss(self, trade_id: int, new_sl: float, session: DBSession = None,
+                        trade: Dict[str, Any] = None) -> bool:
+        """Cập nhật stoploss cho giao dịch, dùng lại `trade` nếu caller đã đọc sẵn."""
         try:
-            trade = self.get_trade_by_id(trade_id)
+            trade = trade or self.get_trade_by_id(trade_id, session=session)
             if not trade:
                 logger.error(f"Trade {trade_id} not found")
                 return False
 
-            self.client.set_trading_stop(
-                category='linear',
-                symbol=trade['symbol'],
-                stopLoss=str(new_sl),
-                side=trade['side'],
-                positionIdx=1 if trade['side'] == "Buy" else 2
-            )
+            self.set_exchange_stoploss(trade, new_sl)
 
-            self.execute_query(
+            self.run_query(
                 query="""
                     UPDATE trades SET current_sl = %s WHERE id = %s
                 """,
                 params=(new_sl, trade_id),
                 fetch=False,
-                commit=True
+                session=session
             )
+            self.cache_trade_update(trade_id, {'current_sl': new_sl}, session)
             logger.info(f"Trade {trade_id}: Stoploss updated to {new_sl}")
             return True
 
         except Exception as e:
+            if session is not None:
+                raise
             logger.error(f"Error updating stoploss for trade {trade_id}: {str(e)}")
             return False
 
-    def close_position(self, trade_id: int, percentage: float, current_price: float) -> bool:
+    def set_exchange_stoploss(self, trade: Dict[str, Any], new_sl: float):
+        """Dời stoploss của vị thế trên sàn, không ghi database."""
+        self.client.set_trading_stop(
+            category='linear',
+            symbol=trade['symbol'],
+            stopLoss=str(self.instruments.round_price(trade['symbol'], new_sl)),
+            side=trade['side'],
+            positionIdx=1 if trade['side'] == "Buy" else 2
+        )
+
+    def close_position(self, trade_id: int, percentage: float, current_price: float, session: DBSession = None,
+                       trade: Dict[str, Any] = None) -> bool:
         """
         Đóng một phần hoặc toàn bộ vị thế.
         
@@ -871,159 +2523,192 @@ class TradingBot:
             trade_id (int): ID của giao dịch cần đóng
             percentage (float): Tỷ lệ đóng vị thế (từ 0.0 đến 1.0)
             current_price (float): Giá hiện tại để tính lãi/lỗ
+            session (DBSession, optional): Session đang mở của caller; lỗi được ném ra để session rollback
+            trade (Dict[str, Any], optional): Giao dịch caller đã đọc sẵn, tránh đọc lại database
             
         Returns:
             bool: True nếu đóng vị thế thành công, False nếu có lỗi
         """
         try:
             # Lấy thông tin giao dịch
-            trade = self.get_trade_by_id(trade_id)
+            trade = trade or self.get_trade_by_id(trade_id, session=session)
             if not trade:
                 logger.error(f"Không tìm thấy giao dịch {trade_id}")
                 return False
 
-            from decimal import Decimal, ROUND_DOWN
+            result = self.close_exchange_position(trade, percentage)
+            if result is None:
+                return False
+            if result == 'FLAT':
+                # Cập nhật trạng thái giao dịch là đã đóng
+                return self.update_trade_status(trade_id, 'CLOSED', datetime.now(), session=session, trade=trade)
+            return self.record_position_close(trade_id, trade, percentage, current_price, session=session)
+
+        except Exception as e:
+            if session is not None:
+                raise
+            logger.error(f"Lỗi khi đóng vị thế cho giao dịch {trade_id}: {str(e)}", exc_info=True)
+            return False
+
+    def close_exchange_position(self, trade: Dict[str, Any], percentage: float) -> Optional[str]:
+        """
+        Đặt lệnh reduce-only đóng một phần vị thế trên sàn, không ghi database.
+
+        Returns:
+            str: 'PLACED' nếu đã đặt lệnh đóng, 'FLAT' nếu vị thế trên sàn đã về 0; None nếu có lỗi
+        """
+        from decimal import Decimal, ROUND_DOWN
+
+        quantity = Decimal(str(trade['quantity'])).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
+        
+        # Tính toán số lượng cần đóng
+        close_qty = float((quantity * Decimal(str(percentage))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN))
+        opposite_side = 'Sell' if trade['side'].lower() == 'buy' else 'Buy'
+        # Lấy thông tin vị thế hiện tại
+        try:
+            position_info = self.client.get_positions(
+                category='linear',
+                symbol=trade['symbol']
+            )
+        except Exception as e:
+            logger.error(f"Lỗi khi lấy thông tin vị thế từ Bybit: {str(e)}")
+            return None
+        
+        position_idx = 0  # Mặc định là One-Way Mode
+        position_size = 0.0
+        
+        if position_info.get('retCode') == 0 and position_info.get('result'):
+            positions = position_info['result'].get('list', [])
+            if positions:
+                # Lấy position_idx và kích thước vị thế hiện tại
+                for position in positions:
+                    if position.get('side') == trade['side'] and float(Decimal(str(position.get('size', 0)))) > 0:
+                        position_idx = int(position.get('positionIdx', 0))
+                        position_size = float(Decimal(str(position.get('size', 0))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN))
+                       
+                        break
+        # Kiểm tra nếu vị thế đã về 0 hoặc không tồn tại
+        if position_size <= 0 or close_qty <= 0:
+            logger.warning(f"Vị thế {trade['symbol']} đã đóng hoặc không tồn tại. Đang cập nhật trạng thái...")
+            return 'FLAT'
+            
+        # Đảm bảo không đóng nhiều hơn số lượng hiện có
+        close_qty = min(close_qty, position_size)
+        
+        # Đặt lệnh đóng vị thế với position_idx
+        try:
+            order_result = self.client.place_order(
+                category='linear',
+                symbol=trade['symbol'],
+                side=opposite_side,
+                orderType='Market',
+                qty=str(round(close_qty, 8)),
+                reduceOnly=True,
+                positionIdx=position_idx
+            )
+            logger.info(f"Đã đặt lệnh đóng vị thế: {order_result}")
+        except Exception as e:
+            if '110017' in str(e):  # Lỗi position is zero
+                logger.warning(f"Vị thế {trade['symbol']} đã đóng. Đang cập nhật trạng thái...")
+                return 'FLAT'
+            logger.error(f"Lỗi khi đặt lệnh đóng vị thế: {str(e)}")
+            return None
+        return 'PLACED'
+
+    def record_position_close(self, trade_id: int, trade: Dict[str, Any], percentage: float, current_price: float,
+                              session: DBSession = None) -> bool:
+        """Ghi phần vị thế đã đóng trên sàn (số lượng còn lại, PnL, trạng thái) vào database."""
+        from decimal import Decimal, ROUND_DOWN
+
+        quantity = Decimal(str(trade['quantity'])).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
+        entry_price = Decimal(str(trade['entry_price'])).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
+        current_price_dec = Decimal(str(current_price)).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
+        leverage = Decimal(str(trade.get('leverage', 1))).quantize(Decimal('0.01'), rounding=ROUND_DOWN)
+
+        # Tính toán lợi nhuận
+        try:
+            if trade['side'].lower() == 'buy':
+                pnl = float(((current_price_dec - entry_price) * quantity * leverage * Decimal(str(percentage))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN))
+            else:
+                pnl = float(((entry_price - current_price_dec) * quantity * leverage * Decimal(str(percentage))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN))
+        except Exception as e:
+            logger.error(f"Lỗi khi tính toán lợi nhuận: {str(e)}")
+            pnl = 0.0
+
+        # Chuyển đổi tất cả giá trị sang Decimal để tính toán
+        try:
+            current_pnl = Decimal(str(trade.get('pnl', 0))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
+            position_size = Decimal(str(trade.get('position_size', 0))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
             
-            # Chuyển đổi tất cả giá trị số sang Decimal để đảm bảo tính toán chính xác
-            quantity = Decimal(str(trade['quantity'])).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
-            entry_price = Decimal(str(trade['entry_price'])).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
-            current_price_dec = Decimal(str(current_price)).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
-            leverage = Decimal(str(trade.get('leverage', 1))).quantize(Decimal('0.01'), rounding=ROUND_DOWN)
+            # Tính toán số lượng và kích thước còn lại
+            remaining_percentage = (Decimal('1') - Decimal(str(percentage))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
+            remaining_qty = float((Decimal(str(trade['quantity'])) * remaining_percentage).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN))
+            remaining_size = float((position_size * remaining_percentage).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN))
             
-            # Tính toán số lượng cần đóng
-            close_qty = float((quantity * Decimal(str(percentage))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN))
-            opposite_side = 'Sell' if trade['side'].lower() == 'buy' else 'Buy'
-            # Lấy thông tin vị thế hiện tại
-            try:
-                position_info = self.client.get_positions(
-                    category='linear',
-                    symbol=trade['symbol']
-                )
-            except Exception as e:
-                logger.error(f"Lỗi khi lấy thông tin vị thế từ Bybit: {str(e)}")
-                return False
+            # Cập nhật trạng thái
+            status = 'CLOSED' if float(percentage) >= 1.0 else trade['status']
+            closed_at = datetime.now() if float(percentage) >= 1.0 else None
             
-            position_idx = 0  # Mặc định là One-Way Mode
-            position_size = 0.0
+            # Tính toán PnL mới
+            new_pnl = (current_pnl + Decimal(str(pnl))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
+            pnl_percent = float((new_pnl / position_size * Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_DOWN)) if position_size != 0 else 0.0
             
-            if position_info.get('retCode') == 0 and position_info.get('result'):
-                positions = position_info['result'].get('list', [])
-                if positions:
-                    # Lấy position_idx và kích thước vị thế hiện tại
-                    for position in positions:
-                        if position.get('side') == trade['side'] and float(Decimal(str(position.get('size', 0)))) > 0:
-                            position_idx = int(position.get('positionIdx', 0))
-                            position_size = float(Decimal(str(position.get('size', 0))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN))
-                           
-                            break
-            # Kiểm tra nếu vị thế đã về 0 hoặc không tồn tại
-            if position_size <= 0 or close_qty <= 0:
-                logger.warning(f"Vị thế {trade['symbol']} đã đóng hoặc không tồn tại. Đang cập nhật trạng thái...")
-                # Cập nhật trạng thái giao dịch là đã đóng
-                return self.update_trade_status(trade_id, 'CLOSED', datetime.now())
-                
-            # Đảm bảo không đóng nhiều hơn số lượng hiện có
-            close_qty = min(close_qty, position_size)
+            # Cập nhật cơ sở dữ liệu sử dụng execute_query
+            update_query = """
+                UPDATE trades 
+                SET quantity = %s, 
+                    position_size = %s, 
+                    status = %s, 
+                    closed_at = %s, 
+                    pnl = %s, 
+                    pnl_percent = %s, 
+                    updated_at = %s 
+                WHERE id = %s
+            """
+            update_params = (
+                remaining_qty, 
+                remaining_size, 
+                status, 
+                closed_at,
+                float(new_pnl),
+                pnl_percent,
+                datetime.now(), 
+                trade_id
+            )
             
-            # Đặt lệnh đóng vị thế với position_idx
-            try:
-                order_result = self.client.place_order(
-                    category='linear',
-                    symbol=trade['symbol'],
-                    side=opposite_side,
-                    orderType='Market',
-                    qty=str(round(close_qty, 8)),
-                    reduceOnly=True,
-                    positionIdx=position_idx
-                )
-                logger.info(f"Đã đặt lệnh đóng vị thế: {order_result}")
-            except Exception as e:
-                if '110017' in str(e):  # Lỗi position is zero
-                    logger.warning(f"Vị thế {trade['symbol']} đã đóng. Đang cập nhật trạng thái...")
-                    return self.update_trade_status(trade_id, 'CLOSED', datetime.now())
-                logger.error(f"Lỗi khi đặt lệnh đóng vị thế: {str(e)}")
+            # Thực thi câu lệnh UPDATE
+            rows_affected = self.run_query(
+                query=update_query,
+                params=update_params,
+                fetch=False,
+                session=session
+            )
+            
+            if not rows_affected or rows_affected <= 0:
+                logger.error(f"Không thể cập nhật thông tin giao dịch {trade_id}")
                 return False
-
-            # Tính toán lợi nhuận
-            try:
-                if trade['side'].lower() == 'buy':
-                    pnl = float(((current_price_dec - entry_price) * quantity * leverage * Decimal(str(percentage))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN))
-                else:
-                    pnl = float(((entry_price - current_price_dec) * quantity * leverage * Decimal(str(percentage))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN))
-            except Exception as e:
-                logger.error(f"Lỗi khi tính toán lợi nhuận: {str(e)}")
-                pnl = 0.0
-
-            # Chuyển đổi tất cả giá trị sang Decimal để tính toán
-            try:
-                current_pnl = Decimal(str(trade.get('pnl', 0))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
-                position_size = Decimal(str(trade.get('position_size', 0))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
-                
-                # Tính toán số lượng và kích thước còn lại
-                remaining_percentage = (Decimal('1') - Decimal(str(percentage))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
-                remaining_qty = float((Decimal(str(trade['quantity'])) * remaining_percentage).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN))
-                remaining_size = float((position_size * remaining_percentage).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN))
-                
-                # Cập nhật trạng thái
-                status = 'CLOSED' if float(percentage) >= 1.0 else trade['status']
-                closed_at = datetime.now() if float(percentage) >= 1.0 else None
-                
-                # Tính toán PnL mới
-                new_pnl = (current_pnl + Decimal(str(pnl))).quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)
-                pnl_percent = float((new_pnl / position_size * Decimal('100')).quantize(Decimal('0.01'), rounding=ROUND_DOWN)) if position_size != 0 else 0.0
-                
-                # Cập nhật cơ sở dữ liệu sử dụng execute_query
-                update_query = """
-                    UPDATE trades 
-                    SET quantity = %s, 
-                        position_size = %s, 
-                        status = %s, 
-                        closed_at = %s, 
-                        pnl = %s, 
-                        pnl_percent = %s, 
-                        updated_at = %s 
-                    WHERE id = %s
-                """
-                update_params = (
-                    remaining_qty, 
-                    remaining_size, 
-                    status, 
-                    closed_at,
-                    float(new_pnl),
-                    pnl_percent,
-                    datetime.now(), 
-                    trade_id
-                )
-                
-                # Thực thi câu lệnh UPDATE
-                rows_affected = self.execute_query(
-                    query=update_query,
-                    params=update_params,
-                    fetch=False,
-                    commit=True
-                )
-                
-                if not rows_affected or rows_affected <= 0:
-                    logger.error(f"Không thể cập nhật thông tin giao dịch {trade_id}")
-                    return False
-                    
-                
-                logger.info(f"Đã đóng {float(percentage)*100:.2f}% vị thế cho giao dịch {trade_id}")
-                
-                # Nếu đã đóng toàn bộ vị thế, xóa khỏi danh sách giao dịch đang hoạt động
-                if float(percentage) >= 1.0:
-                    self.active_trades.pop(trade_id, None)
-                    
-                return True
+            self.cache_trade_update(trade_id, dict(zip(
+                ('quantity', 'position_size', 'status', 'closed_at', 'pnl', 'pnl_percent', 'updated_at'),
+                update_params[:-1]
+            )), session)
                 
-            except Exception as e:
-                logger.error(f"Lỗi khi cập nhật cơ sở dữ liệu: {str(e)}", exc_info=True)
-                return False
+            
+            logger.info(f"Đã đóng {float(percentage)*100:.2f}% vị thế cho giao dịch {trade_id}")
+            
+            # Nếu đã đóng toàn bộ vị thế, xóa khỏi danh sách giao dịch đang hoạt động
+            if float(percentage) >= 1.0:
+                self.active_trades.pop(trade_id, None)
                 
+            return True
+            
         except Exception as e:
-            logger.error(f"Lỗi khi đóng vị thế cho giao dịch {trade_id}: {str(e)}", exc_info=True)
+            if session is not None:
+                raise
+            logger.error(f"Lỗi khi cập nhật cơ sở dữ liệu: {str(e)}", exc_info=True)
             return False
-    def update_trade_status(self, trade_id: int, status: str, closed_at: datetime = None) -> bool:
+
+    def update_trade_status(self, trade_id: int, status: str, closed_at: datetime = None, session: DBSession = None,
+                            trade: Dict[str, Any] = None) -> bool:
         """
         Cập nhật trạng thái giao dịch trong cơ sở dữ liệu.
         
@@ -1031,13 +2716,15 @@ class TradingBot:
             trade_id (int): ID của giao dịch cần cập nhật
             status (str): Trạng thái mới của giao dịch
             closed_at (datetime, optional): Thời gian đóng giao dịch nếu có
+            session (DBSession, optional): Session đang mở để chạy chung transaction
+            trade (Dict[str, Any], optional): Giao dịch caller đã đọc sẵn
             
         Returns:
             bool: True nếu cập nhật thành công, False nếu có lỗi
         """
         try:
             # Kiểm tra xem trade_id có tồn tại không
-            trade = self.get_trade_by_id(trade_id)
+            trade = trade or self.get_trade_by_id(trade_id, session=session)
             if not trade:
                 logger.error(f"Cannot update status: Trade {trade_id} not found")
                 return False
@@ -1045,14 +2732,17 @@ class TradingBot:
             # Xây dựng câu lệnh UPDATE động dựa trên tham số truyền vào
             update_fields = ["status = %s"]
             params = [status]
+            cached_fields = {'status': status}
             
             if closed_at is not None:
                 update_fields.append("closed_at = %s")
                 params.append(closed_at)
+                cached_fields['closed_at'] = closed_at
                 
             # Thêm updated_at
             update_fields.append("updated_at = %s")
             params.append(datetime.now())
+            cached_fields['updated_at'] = params[-1]
             
             # Thêm trade_id vào params cho mệnh đề WHERE
             params.append(trade_id)
@@ -1064,14 +2754,15 @@ class TradingBot:
                 WHERE id = %s
             """
             
-            rows_affected = self.execute_query(
+            rows_affected = self.run_query(
                 query=query,
                 params=tuple(params),
                 fetch=False,
-                commit=True
+                session=session
             )
             
             if rows_affected and rows_affected > 0:
+                self.cache_trade_update(trade_id, cached_fields, session)
                 logger.info(f"Successfully updated trade {trade_id} status to '{status}'")
             
                 return True
@@ -1080,6 +2771,8 @@ class TradingBot:
             return False
             
         except Exception as e:
+            if session is not None:
+                raise
             logger.error(
                 f"Error updating trade {trade_id} status to '{status}'. "
                 f"Error: {str(e)}",
@@ -1094,26 +2787,11 @@ class TradingBot:
             List[Dict[str, Any]]: Danh sách các giao dịch với thông tin chi tiết
         """
         try:
-            # Sử dụng unified_trading để lấy lịch sử giao dịch
-            if hasattr(self, 'unified_client'):
-                response = self.unified_client.get_executions(
-                    category="linear",
-                    limit=100,
-                    recv_window=5000
-                )
-            else:
-                # Fallback nếu chưa khởi tạo unified_client
-                from pybit.unified_trading import HTTP
-                self.unified_client = HTTP(
-                    testnet=self.testnet,
-                    api_key=os.getenv('BYBIT_API_KEY'),
-                    api_secret=os.getenv('BYBIT_API_SECRET')
-                )
-                response = self.unified_client.get_executions(
-                    category="linear",
-                    limit=100,
-                    recv_window=5000
-                )
+            response = self.client.get_executions(
+                category="linear",
+                limit=100,
+                recv_window=5000
+            )
 
             if response.get('retCode') != 0:
                 logger.error(f"Error fetching trades from Bybit: {response.get('retMsg', 'Unknown error')}")
@@ -1189,6 +2867,194 @@ class TradingBot:
             logger.error(f"Error fetching trades from Bybit: {str(e)}", exc_info=True)
             return []
 
+    def get_position_snapshot(self, client=None) -> Dict[str, Any]:
+        """
+        Lấy toàn bộ vị thế USDT bằng một lần gọi get_positions(settleCoin='USDT').
+
+        Args:
+            client (HTTP, optional): Client dùng để gọi API, mặc định là self.client
+
+        Returns:
+            Dict[str, Any]: Snapshot với 'positions' là các vị thế được đánh chỉ mục theo
+                            (symbol, positionIdx)
+        """
+        client = client or self.client
+        snapshot = {'positions': {}, 'missing': {}, 'client': client}
+        params = {'category': 'linear', 'settleCoin': 'USDT', 'limit': 200}
+        try:
+            while True:
+                response = client.get_positions(**params)
+                if response.get('retCode') != 0:
+                    logger.warning(f"Could not get position snapshot: {response.get('retMsg', 'Unknown error')}")
+                    break
+                result = response.get('result', {})
+                for pos in result.get('list', []):
+                    snapshot['positions'][(pos.get('symbol'), pos.get('positionIdx'))] = pos
+                cursor = result.get('nextPageCursor')
+                if not cursor:
+                    break
+                params['cursor'] = cursor
+        except Exception as e:
+            logger.warning(f"Could not get position snapshot: {str(e)}")
+        return snapshot
+
+    def _load_symbol_positions(self, client, symbol: str) -> Dict[Any, Dict[str, Any]]:
+        """Lấy vị thế của một symbol, đánh chỉ mục theo positionIdx."""
+        positions = {}
+        try:
+            pos_response = client.get_positions(category='linear', symbol=symbol)
+            if pos_response.get('retCode') == 0:
+                for pos in pos_response.get('result', {}).get('list', []):
+                    if pos.get('symbol') == symbol:
+                        positions.setdefault(pos.get('positionIdx'), pos)
+        except Exception as e:
+            logger.warning(f"Could not get position info for {symbol}: {str(e)}")
+        return positions
+
+    def _find_position(self, snapshot: Dict[str, Any], symbol: str, position_idx) -> Dict[str, Any]:
+        """Tìm vị thế trong snapshot; symbol chưa có vị thế thì lấy riêng một lần cho mỗi symbol."""
+        position = snapshot['positions'].get((symbol, position_idx))
+        if position is not None or not symbol:
+            return position
+
+        # settleCoin chỉ trả về vị thế có size > 0, cần đòn bẩy của symbol chưa mở vị thế
+        if symbol not in snapshot['missing']:
+            if snapshot.get('client') is None:
+                return None
+            snapshot['missing'][symbol] = self._load_symbol_positions(snapshot['client'], symbol)
+        return snapshot['missing'][symbol].get(position_idx)
+
+    def _position_fields(self, snapshot: Dict[str, Any], order: Dict[str, Any]) -> tuple:
+        """Trả về (leverage, stop_loss, pnl, take_profit) của vị thế ứng với lệnh."""
+        leverage = 1
+        stop_loss = 0
+        pnl = 0
+        take_profit = 0
+        try:
+            pos = self._find_position(snapshot, order.get('symbol'), order.get('positionIdx'))
+            if pos:
+                leverage = int(float(pos.get('leverage', 1)))
+                stop_loss = float(pos.get('stopLoss', 0)) if pos.get('stopLoss') else 0
+                pnl = float(pos.get('unrealisedPnl', 0)) if pos.get('unrealisedPnl') else 0
+                take_profit = float(pos.get('takeProfit', 0)) if pos.get('takeProfit') else 0
+        except Exception as e:
+            logger.warning(f"Could not get position info for {order.get('symbol')}: {str(e)}")
+        return leverage, stop_loss, pnl, take_profit
+
+    def format_order(self, order: Dict[str, Any], snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """Chuyển lệnh Bybit sang định dạng trả về của /api/v1/trades."""
+        leverage, stop_loss, pnl, take_profit = self._position_fields(snapshot, order)
+
+        # Lấy stop loss từ order nếu có
+        if 'stopLoss' in order and order['stopLoss']:
+            stop_loss = float(order['stopLoss'])
+
+        if order.get('orderStatus') == 'Untriggered':
+            price = float(order.get('triggerPrice', 0))
+        else:
+            price = float(order.get('price', 0)) if order.get('price') else 0
+
+        return {
+            'order_id': order.get('orderId', ''),
+            'symbol': order.get('symbol', 'UNKNOWN'),
+            'side': order.get('side', 'BUY'),
+            'entry_price': price,
+            'quantity': float(order.get('qty', 0)) if order.get('qty') else 0,
+            'status': OrderMirror.display_status(order),
+            'order_type': order.get('orderType', 'UNKNOWN'),
+            'bot_name': order.get('orderLinkId', 'N/A'),
+            'take_profit': take_profit,
+            'leverage': leverage,
+            'stop_loss': stop_loss,
+            'pnl': pnl,
+            'created_at': datetime.fromtimestamp(int(order.get('createdTime', '0')) / 1000).isoformat(),
+            'updated_at': datetime.fromtimestamp(int(order.get('updatedTime', '0')) / 1000).isoformat()
+        }
+
+    def seed_order_mirror(self, page_size: int = 50):
+        """Nạp bản sao lệnh từ REST: toàn bộ lệnh mở, lịch sử lệnh gần nhất và vị thế."""
+        try:
+            orders = []
+            params = {'category': 'linear', 'settleCoin': 'USDT', 'limit': page_size}
+            while True:
+                response = self.client.get_open_orders(**params)
+                if response.get('retCode') != 0:
+                    logger.error(f"Error fetching open orders: {response.get('retMsg', 'Unknown error')}")
+                    break
+                result = response.get('result', {})
+                orders.extend(result.get('list', []))
+                if not result.get('nextPageCursor'):
+                    break
+                params['cursor'] = result['nextPageCursor']
+
+            history_count = 0
+            params = {'category': 'linear', 'limit': page_size}
+            while history_count < self.order_mirror.history_limit:
+                response = self.client.get_order_history(**params)
+                if response.get('retCode') != 0:
+                    logger.error(f"Error fetching order history: {response.get('retMsg', 'Unknown error')}")
+                    break
+                result = response.get('result', {})
+                history_orders = result.get('list', [])
+                orders.extend(history_orders)
+                history_count += len(history_orders)
+                if not history_orders or not result.get('nextPageCursor'):
+                    break
+                params['cursor'] = result['nextPageCursor']
+
+            snapshot = self.get_position_snapshot(self.client)
+            for order in orders:
+                self._find_position(snapshot, order.get('symbol'), order.get('positionIdx'))
+
+            self.order_mirror.seed(orders, snapshot)
+            logger.info(f"Order mirror seeded with {len(self.order_mirror.orders)} orders")
+        except Exception as e:
+            logger.error(f"Error seeding order mirror: {str(e)}", exc_info=True)
+
+    def _ensure_mirror_positions(self, symbol: str):
+        """
+        Lấy vị thế cho symbol mới xuất hiện trên stream để dashboard không phải gọi REST.
+
+        Lời gọi REST chạy trên exchange_executor, không chặn luồng callback của private WebSocket;
+        mỗi symbol chỉ có một lần tải đang chạy.
+        """
+        if not symbol or self.order_mirror.has_symbol_positions(symbol):
+            return
+        with self.order_mirror.lock:
+            if symbol in self.mirror_position_loads:
+                return
+            self.mirror_position_loads.add(symbol)
+        self.exchange_executor.submit(self._load_mirror_positions, symbol)
+
+    def _load_mirror_positions(self, symbol: str):
+        try:
+            positions = self._load_symbol_positions(self.client, symbol)
+            with self.order_mirror.lock:
+                self.order_mirror.snapshot['missing'][symbol] = positions
+        except Exception as e:
+            logger.error(f"Error loading positions for {symbol}: {str(e)}")
+        finally:
+            with self.order_mirror.lock:
+                self.mirror_position_loads.discard(symbol)
+
+    def get_orders(self, bot_name: str = None, status: str = None, symbol: str = None) -> List[Dict[str, Any]]:
+        """
+        Lấy danh sách lệnh từ bản sao trong bộ nhớ, lọc bằng chỉ mục.
+
+        Khi bản sao chưa được nạp (WebSocket chưa chạy) thì lấy trực tiếp qua get_all_orders.
+        """
+        if not self.order_mirror.seeded:
+            trades = self.get_all_orders(symbol=symbol)
+            if bot_name:
+                trades = [trade for trade in trades if bot_name.lower() in trade['bot_name'].lower()]
+            if status:
+                trades = [trade for trade in trades if trade['status'] == status]
+            return trades
+
+        orders = self.order_mirror.query(symbol=symbol, bot_name=bot_name, status=status)
+        with self.order_mirror.lock:
+            return [self.format_order(order, self.order_mirror.snapshot) for order in orders]
+
     def get_all_orders(self, symbol: str = None, order_id: str = None, limit: int = 100) -> List[Dict[str, Any]]:
         """
         Lấy danh sách tất cả các lệnh (OPEN, FILLED, CANCELLED) từ Bybit API.
@@ -1202,16 +3068,12 @@ class TradingBot:
             List[Dict[str, Any]]: Danh sách các lệnh với thông tin chi tiết
         """
         try:
-            if not hasattr(self, 'unified_client') or self.unified_client is None:
-                self.unified_client = HTTP(
-                    testnet=self.testnet,
-                    api_key=os.getenv('BYBIT_API_KEY'),
-                    api_secret=os.getenv('BYBIT_API_SECRET')
-                )
-
             orders_list = []
             seen_order_ids = set()  # Tránh trùng lặp order_id
 
+            # Lấy snapshot vị thế một lần cho cả lệnh mở và lịch sử lệnh
+            position_snapshot = self.get_position_snapshot(self.client)
+
             # 1. Lấy lệnh mở từ /v5/order/realtime
             order_params = {'category': 'linear', 'limit': limit, 'settleCoin': 'USDT'}
             if symbol:
@@ -1220,7 +3082,7 @@ class TradingBot:
                 order_params['orderId'] = order_id
 
             try:
-                open_orders_response = self.unified_client.get_open_orders(**order_params)
+                open_orders_response = self.client.get_open_orders(**order_params)
             except Exception as e:
                 logger.error(f"Error fetching open orders: {str(e)}")
                 return []
@@ -1232,26 +3094,8 @@ class TradingBot:
                 for order in open_orders:
                     created_time = datetime.fromtimestamp(int(order.get('createdTime', '0')) / 1000).isoformat()
                     updated_time = datetime.fromtimestamp(int(order.get('updatedTime', '0')) / 1000).isoformat()
-                    leverage = 1
-                    stop_loss = 0
-                    pnl = 0
-                    take_profit = 0
                     price = float(order.get('triggerPrice', 0)) if order.get('orderStatus') == 'Untriggered' else float(order.get('price', 0))
-                    try:
-                        # Sử dụng get_positions thay vì get_position_list
-                        pos_response = self.unified_client.get_positions(category='linear', symbol=order.get('symbol'))
-
-                        if pos_response.get('retCode') == 0:
-                            for pos in pos_response.get('result', {}).get('list', []):
-                                if pos.get('symbol') == order.get('symbol') and pos.get('positionIdx') == order.get('positionIdx'):
-                                    leverage = int(float(pos.get('leverage', 1)))
-                                    stop_loss = float(pos.get('stopLoss', 0)) if pos.get('stopLoss') else 0
-                                    pnl = float(pos.get('unrealisedPnl', 0)) if pos.get('unrealisedPnl') else 0
-                                    take_profit = float(pos.get('takeProfit', 0)) if pos.get('takeProfit') else 0
-                                    break
-                               
-                    except Exception as e:
-                        logger.warning(f"Could not get position info for {order.get('symbol')}: {str(e)}")
+                    leverage, stop_loss, pnl, take_profit = self._position_fields(position_snapshot, order)
 
                     # Lấy stop loss từ order nếu có
                     if 'stopLoss' in order and order['stopLoss']:
@@ -1283,30 +3127,14 @@ class TradingBot:
             if order_id:
                 history_params['orderId'] = order_id
 
-            history_response = self.unified_client.get_order_history(**history_params)
+            history_response = self.client.get_order_history(**history_params)
             if history_response.get('retCode') == 0:
                 history_orders = history_response.get('result', {}).get('list', [])
                 for order in history_orders:
                     if order['orderId'] not in seen_order_ids:
                         created_time = datetime.fromtimestamp(int(order.get('createdTime', '0')) / 1000).isoformat()
                         updated_time = datetime.fromtimestamp(int(order.get('updatedTime', '0')) / 1000).isoformat()
-                        leverage = 1
-                        stop_loss = 0
-                        pnl = 0
-                        take_profit = 0
-                        try:
-                            # Sử dụng get_positions thay vì get_position_list
-                            pos_response = self.unified_client.get_positions(category='linear', symbol=order.get('symbol'))
-                            if pos_response.get('retCode') == 0:
-                                for pos in pos_response.get('result', {}).get('list', []):
-                                    if pos.get('symbol') == order.get('symbol') and pos.get('positionIdx') == order.get('positionIdx'):
-                                        leverage = int(float(pos.get('leverage', 1)))
-                                        stop_loss = float(pos.get('stopLoss', 0)) if pos.get('stopLoss') else 0
-                                        take_profit = float(pos.get('takeProfit', 0)) if pos.get('takeProfit') else 0
-                                        pnl = float(pos.get('unrealisedPnl', 0)) if pos.get('unrealisedPnl') else 0
-                                        break
-                        except Exception as e:
-                            logger.warning(f"Could not get position info for {order.get('symbol')}: {str(e)}")
+                        leverage, stop_loss, pnl, take_profit = self._position_fields(position_snapshot, order)
 
                         # Lấy stop loss từ order nếu có
                         if 'stopLoss' in order and order['stopLoss']:
@@ -1342,27 +3170,328 @@ class TradingBot:
             logger.error(f"Error fetching orders from Bybit: {str(e)}", exc_info=True)
             return []
 
-    def get_trade_by_id(self, trade_id: int) -> Dict[str, Any]:
+    @staticmethod
+    def _decimal_or_none(value):
+        return Decimal(str(value)) if value not in (None, '') else None
+
+    def _exchange_order_row(self, order: Dict[str, Any]) -> tuple:
+        return (
+            order['orderId'],
+            order.get('orderLinkId') or '',
+            order.get('symbol'),
+            order.get('side'),
+            order.get('orderType', ''),
+            order.get('orderStatus', ''),
+            OrderMirror.display_status(order),
+            self._decimal_or_none(order.get('price')),
+            self._decimal_or_none(order.get('triggerPrice')),
+            self._decimal_or_none(order.get('qty')) or 0,
+            self._decimal_or_none(order.get('cumExecQty')),
+            self._decimal_or_none(order.get('avgPrice')),
+            self._decimal_or_none(order.get('stopLoss')),
+            self._decimal_or_none(order.get('takeProfit')),
+            int(order.get('positionIdx') or 0),
+            1 if order.get('reduceOnly') else 0,
+            int(order.get('createdTime') or 0),
+            int(order.get('updatedTime') or 0)
+        )
+
+    def _exchange_execution_row(self, execution: Dict[str, Any]) -> tuple:
+        return (
+            execution['execId'],
+            execution.get('orderId', ''),
+            execution.get('symbol'),
+            execution.get('side'),
+            execution.get('execType') or 'Trade',
+            self._decimal_or_none(execution.get('execPrice')) or 0,
+            self._decimal_or_none(execution.get('execQty')) or 0,
+            self._decimal_or_none(execution.get('execFee')),
+            1 if execution.get('isMaker') else 0,
+            int(execution.get('execTime') or 0)
+        )
+
+    def upsert_exchange_orders(self, orders: List[Dict[str, Any]], session: DBSession) -> int:
+        """Ghi một trang order history vào exchange_orders, bản của sàn luôn ghi đè bản đang lưu."""
+        rows = [self._exchange_order_row(order) for order in orders if order.get('orderId')]
+        if not rows:
+            return 0
+        session.execute_many(
+            """
+            INSERT INTO exchange_orders (
+                order_id, order_link_id, symbol, side, order_type, order_status, status,
+                price, trigger_price, qty, cum_exec_qty, avg_price, stop_loss, take_profit,
+                position_idx, reduce_only, created_time, updated_time
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                order_link_id = VALUES(order_link_id), order_type = VALUES(order_type),
+                order_status = VALUES(order_status), status = VALUES(status), price = VALUES(price),
+                trigger_price = VALUES(trigger_price), qty = VALUES(qty), cum_exec_qty = VALUES(cum_exec_qty),
+                avg_price = VALUES(avg_price), stop_loss = VALUES(stop_loss), take_profit = VALUES(take_profit),
+                updated_time = VALUES(updated_time)
+            """,
+            rows
+        )
+        return len(rows)
+
+    def upsert_exchange_executions(self, executions: List[Dict[str, Any]], session: DBSession) -> int:
+        """Ghi một trang executions vào exchange_executions; execId đã có thì bỏ qua."""
+        rows = [self._exchange_execution_row(execution) for execution in executions if execution.get('execId')]
+        if not rows:
+            return 0
+        session.execute_many(
+            """
+            INSERT IGNORE INTO exchange_executions (
+                exec_id, order_id, symbol, side, exec_type, exec_price, exec_qty, exec_fee, is_maker, exec_time
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            rows
+        )
+        return len(rows)
+
+    def _load_sync_mark(self, key: str):
+        result = self.execute_query(
+            "SELECT setting_value FROM system_settings WHERE setting_key = %s",
+            (key,),
+            fetch=True
+        )
+        if result and result[0]['setting_value']:
+            return int(result[0]['setting_value'])
+        return None
+
+    def _sync_exchange_stream(self, key: str, fetch, upsert, page_size: int) -> Dict[str, Any]:
+        """
+        Đồng bộ một luồng dữ liệu (order history hoặc executions) từ mốc đã lưu tới hiện tại.
+
+        Duyệt từng cửa sổ thời gian (Bybit giới hạn startTime..endTime tối đa 7 ngày), mỗi cửa sổ
+        lấy hết các trang theo nextPageCursor. Mỗi trang được ghi và mốc được lưu trong cùng một
+        transaction, nên lần chạy bị ngắt giữa chừng tiếp tục từ cửa sổ chưa xong.
+        """
+        window_ms = 7 * 24 * 3600 * 1000
+        # Dữ liệu cũ hơn lag_ms coi như sàn đã ghi đủ; phần mới hơn được quét lại ở lần sau
+        lag_ms = int(float(os.getenv('ORDER_SYNC_LAG', 5)) * 1000)
+        now_ms = int(time.time() * 1000)
+        mark = self._load_sync_mark(key)
+        if mark is None:
+            mark = now_ms - int(float(os.getenv('ORDER_SYNC_LOOKBACK_DAYS', 7)) * 24 * 3600 * 1000)
+
+        stats = {'rows': 0, 'pages': 0, 'from': mark}
+        start = mark
+        while start < now_ms:
+            end = min(start + window_ms, now_ms)
+            params = {'category': 'linear', 'startTime': start, 'endTime': end, 'limit': page_size}
+            while True:
+                response = fetch(**params)
+                if response.get('retCode') != 0:
+                    logger.error(f"Error syncing {key}: {response.get('retMsg', 'Unknown error')}")
+                    stats['error'] = response.get('retMsg', 'Unknown error')
+                    return stats
+                result = response.get('result', {})
+                items = result.get('list', [])
+                cursor = result.get('nextPageCursor')
+                with self.db_session() as session:
+                    stats['rows'] += upsert(items, session)
+                    if not cursor or not items:
+                        # Cửa sổ đã lấy hết: lưu mốc mới trong cùng transaction với trang cuối. Cửa sổ cuối
+                        # chỉ tiến tới end - lag_ms: dòng có thời gian mới hơn có thể chưa hiện trên sàn,
+                        # lần sau quét lại (upsert không ghi trùng)
+                        mark = max(start, end - lag_ms) if end >= now_ms else end
+                        session.execute(
+                            """
+                            INSERT INTO system_settings (setting_key, setting_value) VALUES (%s, %s)
+                            ON DUPLICATE KEY UPDATE setting_value = VALUES(setting_value)
+                            """,
+                            (key, str(mark)),
+                            fetch=False
+                        )
+                stats['pages'] += 1
+                if not cursor or not items:
+                    break
+                params['cursor'] = cursor
+            start = end
+        stats['to'] = mark
+        return stats
+
+    def sync_exchange_orders(self, page_size: int = 50) -> Dict[str, Any]:
+        """
+        Đồng bộ tăng dần order history và executions của Bybit vào exchange_orders / exchange_executions.
+
+        Chỉ lấy dữ liệu có updatedTime (execTime) từ mốc đã lưu trong system_settings, nên mỗi lần
+        chạy chỉ tải phần thay đổi thay vì cùng 100 lệnh gần nhất như get_all_orders.
+        """
+        if not self.order_sync_lock.acquire(blocking=False):
+            logger.info("Exchange order sync already running, skipped")
+            return {}
+        started = time.monotonic()
+        try:
+            stats = {
+                'orders': self._sync_exchange_stream(
+                    'exchange_orders_synced_until', self.client.get_order_history,
+                    self.upsert_exchange_orders, page_size
+                ),
+                'executions': self._sync_exchange_stream(
+                    'exchange_executions_synced_until', self.client.get_executions,
+                    self.upsert_exchange_executions, min(page_size * 2, 100)
+                )
+            }
+            stats['duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+            stats['finished_at'] = datetime.now().isoformat()
+            logger.info(
+                f"Synced {stats['orders']['rows']} orders, {stats['executions']['rows']} executions "
+                f"in {stats['duration_ms']} ms"
+            )
+            self.order_sync_stats = stats
+            return stats
+        except Exception as e:
+            logger.error(f"Error syncing exchange orders: {str(e)}", exc_info=True)
+            return {'error': str(e)}
+        finally:
+            self.order_sync_lock.release()
+
+    @staticmethod
+    def _keyset(cursor: str) -> tuple:
+        """Cursor dạng '<thời gian ms>:<id>' của dòng cuối trang trước."""
+        time_ms, _, row_id = (cursor or '').partition(':')
+        if not time_ms.isdigit() or not row_id:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        return int(time_ms), row_id
+
+    def query_exchange_orders(self, symbol: str = None, bot_name: str = None, status: str = None,
+                              cursor: str = None, limit: int = 50) -> Dict[str, Any]:
+        """
+        Lấy lịch sử lệnh đã đồng bộ, mới cập nhật trước, phân trang keyset theo (updated_time, order_id).
+
+        Mỗi bộ lọc có index (cột lọc, updated_time, order_id) nên trang sau chỉ đọc limit dòng
+        tiếp theo trong index thay vì OFFSET. bot_name lọc theo tiền tố của orderLinkId.
+
+        Returns:
+            Dict[str, Any]: {'list': [...], 'nextCursor': cursor của trang sau hoặc None}
+        """
+        limit = max(1, min(int(limit), 200))
+        conditions, params = [], []
+        if symbol:
+            conditions.append("symbol = %s")
+            params.append(symbol)
+        if status:
+            conditions.append("status = %s")
+            params.append(status)
+        if bot_name:
+            conditions.append("order_link_id LIKE %s")
+            params.append(bot_name.replace('%', r'\%').replace('_', r'\_') + '%')
+        if cursor:
+            updated_time, order_id = self._keyset(cursor)
+            conditions.append("(updated_time < %s OR (updated_time = %s AND order_id < %s))")
+            params.extend([updated_time, updated_time, order_id])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        rows = self.execute_query(
+            f"""
+            SELECT * FROM exchange_orders {where}
+            ORDER BY updated_time DESC, order_id DESC
+            LIMIT %s
+            """,
+            tuple(params) + (limit + 1,),
+            fetch=True
+        ) or []
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1]['updated_time']}:{rows[-1]['order_id']}"
+
+        orders = []
+        for row in rows:
+            price = row['trigger_price'] if row['order_status'] == 'Untriggered' else row['price']
+            orders.append({
+                'order_id': row['order_id'],
+                'symbol': row['symbol'],
+                'side': row['side'],
+                'entry_price': float(price) if price is not None else 0,
+                'quantity': float(row['qty']),
+                'filled_quantity': float(row['cum_exec_qty']) if row['cum_exec_qty'] is not None else 0,
+                'avg_price': float(row['avg_price']) if row['avg_price'] is not None else 0,
+                'status': row['status'],
+                'order_type': row['order_type'],
+                'bot_name': row['order_link_id'] or 'N/A',
+                'take_profit': float(row['take_profit']) if row['take_profit'] is not None else 0,
+                'stop_loss': float(row['stop_loss']) if row['stop_loss'] is not None else 0,
+                'reduce_only': bool(row['reduce_only']),
+                'created_at': datetime.fromtimestamp(row['created_time'] / 1000).isoformat(),
+                'updated_at': datetime.fromtimestamp(row['updated_time'] / 1000).isoformat()
+            })
+        return {'list': orders, 'nextCursor': next_cursor}
+
+    def query_exchange_executions(self, symbol: str = None, order_id: str = None,
+                                  cursor: str = None, limit: int = 50) -> Dict[str, Any]:
+        """Lấy các lần khớp lệnh đã đồng bộ, mới nhất trước, phân trang keyset theo (exec_time, exec_id)."""
+        limit = max(1, min(int(limit), 200))
+        conditions, params = [], []
+        if order_id:
+            conditions.append("order_id = %s")
+            params.append(order_id)
+        if symbol:
+            conditions.append("symbol = %s")
+            params.append(symbol)
+        if cursor:
+            exec_time, exec_id = self._keyset(cursor)
+            conditions.append("(exec_time < %s OR (exec_time = %s AND exec_id < %s))")
+            params.extend([exec_time, exec_time, exec_id])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        rows = self.execute_query(
+            f"""
+            SELECT * FROM exchange_executions {where}
+            ORDER BY exec_time DESC, exec_id DESC
+            LIMIT %s
+            """,
+            tuple(params) + (limit + 1,),
+            fetch=True
+        ) or []
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1]['exec_time']}:{rows[-1]['exec_id']}"
+
+        executions = [{
+            'exec_id': row['exec_id'],
+            'order_id': row['order_id'],
+            'symbol': row['symbol'],
+            'side': row['side'],
+            'exec_type': row['exec_type'],
+            'price': float(row['exec_price']),
+            'quantity': float(row['exec_qty']),
+            'fee': float(row['exec_fee']) if row['exec_fee'] is not None else 0,
+            'is_maker': bool(row['is_maker']),
+            'exec_time': datetime.fromtimestamp(row['exec_time'] / 1000).isoformat()
+        } for row in rows]
+        return {'list': executions, 'nextCursor': next_cursor}
+
+    def get_trade_by_id(self, trade_id: int, session: DBSession = None) -> Dict[str, Any]:
         """
         Lấy thông tin giao dịch từ cơ sở dữ liệu.
         
         Args:
             trade_id (int): ID của giao dịch cần lấy thông tin
+            session (DBSession, optional): Session đang mở để đọc trên cùng kết nối
             
         Returns:
             Dict[str, Any]: Thông tin giao dịch dưới dạng dictionary nếu tìm thấy,
                           None nếu không tìm thấy hoặc có lỗi
         """
+        cached = self.trade_cache.get(trade_id)
+        if cached is not None:
+            return cached
         try:
-            result = self.execute_query(
+            result = self.run_query(
                 "SELECT * FROM trades WHERE id = %s",
                 (trade_id,),
                 fetch=True,
-                commit=False
+                session=session
             )
             
             # Nếu có kết quả, trả về dòng đầu tiên dưới dạng dict
             if result and len(result) > 0:
+                self.trade_cache.put(result[0])
                 return dict(result[0])
                 
             logger.warning(f"Trade with ID {trade_id} not found")
@@ -1373,7 +3502,8 @@ class TradingBot:
             return None
 
     def log_update(self, trade_id: int, status: str, price: float = None, sl_price: float = None,
-                   tp_price: float = None, pnl: float = None, notes: str = None) -> bool:
+                   tp_price: float = None, pnl: float = None, notes: str = None,
+                   session: DBSession = None, trade: Dict[str, Any] = None) -> bool:
         """
         Ghi lịch sử cập nhật vào bảng trade_updates.
         
@@ -1385,19 +3515,21 @@ class TradingBot:
             tp_price (float, optional): Giá take profit
             pnl (float, optional): Lợi nhuận/thua lỗ
             notes (str, optional): Ghi chú thêm
+            session (DBSession, optional): Session đang mở để chạy chung transaction
+            trade (Dict[str, Any], optional): Giao dịch caller đã đọc sẵn
             
         Returns:
             bool: True nếu ghi log thành công, False nếu có lỗi
         """
         try:
             # Kiểm tra xem trade_id có tồn tại không
-            trade = self.get_trade_by_id(trade_id)
+            trade = trade or self.get_trade_by_id(trade_id, session=session)
             if not trade:
                 logger.error(f"Cannot log update: Trade {trade_id} not found")
                 return False
                 
             # Thực hiện câu lệnh INSERT
-            result = self.execute_query(
+            result = self.run_query(
                 """
                 INSERT INTO trade_updates 
                 (trade_id, status, price, sl_price, tp_price, pnl, notes, created_at)
@@ -1414,7 +3546,7 @@ class TradingBot:
                     datetime.now()
                 ),
                 fetch=False,
-                commit=True
+                session=session
             )
             
             if result and result > 0:
@@ -1432,6 +3564,214 @@ class TradingBot:
             )
             return False
 
+    def get_active_trade_ids(self, symbol: str, side: str) -> List[int]:
+        """Id các giao dịch đã khớp và chưa đóng của một vị thế, đọc qua index (symbol, side, status)."""
+        result = self.execute_query(
+            """
+            SELECT id FROM trades
+            WHERE symbol = %s AND side = %s AND status IN ('FILLED', 'TP1_HIT', 'TP2_HIT')
+            """,
+            (symbol, side)
+        ) or []
+        return [row['id'] for row in result]
+
+    def close_position_trades(self, order: Dict[str, Any], status: str) -> int:
+        """
+        Đánh dấu các giao dịch bị đóng bởi lệnh TP/SL của vị thế.
+
+        Vị thế được xác định từ sự kiện: positionIdx 1 / 2 là Buy / Sell (Hedge Mode), positionIdx 0
+        thì vị thế ngược side với lệnh đóng. TP/SL đặt bằng set_trading_stop thuộc về cả vị thế,
+        không thuộc giao dịch nào, nên mọi giao dịch đang mở ở side đó của symbol đều bị đóng.
+
+        Returns:
+            int: Số giao dịch được cập nhật
+        """
+        symbol = order.get('symbol')
+        position_idx = int(order.get('positionIdx') or 0)
+        if position_idx in (1, 2):
+            side = 'Buy' if position_idx == 1 else 'Sell'
+        else:
+            side = 'Sell' if order.get('side') == 'Buy' else 'Buy'
+
+        trade_ids = self.get_active_trade_ids(symbol, side)
+        if not trade_ids:
+            logger.info(f"{status} on {symbol} {side}: no active trades")
+            return 0
+
+        closed_at = datetime.now()
+        placeholders = ', '.join(['%s'] * len(trade_ids))
+        rows_affected = self.execute_query(
+            f"""
+            UPDATE trades
+            SET status = %s, closed_at = %s
+            WHERE id IN ({placeholders}) AND status IN ('FILLED', 'TP1_HIT', 'TP2_HIT')
+            """,
+            (status, closed_at) + tuple(trade_ids),
+            fetch=False,
+            commit=True
+        )
+        for trade_id in trade_ids:
+            self.trade_cache.invalidate(trade_id)
+            self.position_manager.untrack(trade_id)
+        logger.info(f"{status} on {symbol} {side}: closed trades {trade_ids} ({rows_affected} rows)")
+        return rows_affected or 0
+
+    def apply_tp_fill(self, trade: Dict[str, Any], status: str, tp_price: float, new_sl: float):
+        """
+        Ghi lệnh TP1/TP2 đã khớp: dời stoploss trên sàn trước, sau đó khóa dòng, ghi current_sl,
+        status và current_tp trong cùng một transaction.
+        """
+        trade_id = trade['id']
+        try:
+            self.set_exchange_stoploss(trade, new_sl)
+            moved = True
+        except Exception as e:
+            logger.error(f"Error updating stoploss for trade {trade_id}: {str(e)}")
+            moved = False
+
+        fields = {'status': status, 'current_tp': tp_price}
+        if moved:
+            fields['current_sl'] = new_sl
+        with self.db_session() as session:
+            if self.lock_trade_status(trade_id, session) != trade['status']:
+                # update_position đã ghi bước chuyển này theo giá
+                self._position_changed(trade_id, session)
+                return
+            session.execute(
+                "UPDATE trades SET status = %s, current_tp = %s, current_sl = COALESCE(%s, current_sl) WHERE id = %s",
+                (status, tp_price, fields.get('current_sl'), trade_id),
+                fetch=False
+            )
+            self.cache_trade_update(trade_id, fields, session)
+        logger.info(f"Trade {trade_id}: {status}, SL moved to {new_sl}" if moved else f"Trade {trade_id}: {status}")
+
+    def process_order_event(self, order: Dict[str, Any]) -> bool:
+        """
+        Áp dụng một sự kiện lệnh từ private WebSocket vào bảng trades.
+
+        Returns:
+            bool: False nếu lệnh vừa đặt (trong order_event_retry_window giây) chưa có giao dịch tương ứng
+                  (cần thử lại sau), True nếu đã xử lý xong hoặc sự kiện không thuộc giao dịch nào
+        """
+        order_id = order.get('orderId')
+        status = order.get('orderStatus')
+        symbol = order.get('symbol')
+        side = order.get('side')
+        orderStoploss = order.get('stopOrderType')
+
+        # TP/SL của vị thế khớp: lệnh thuộc cả vị thế, không ánh xạ tới giao dịch nào, nên không cần
+        # tra trade_orders; đóng các giao dịch đang mở của đúng vị thế đó
+        if orderStoploss in ('StopLoss', 'TakeProfit'):
+            if status == 'Filled':
+                self.close_position_trades(order, 'STOPLOSS' if orderStoploss == 'StopLoss' else 'TAKEPROFIT')
+            return True
+
+        # Tra cứu giao dịch qua bảng ánh xạ trade_orders (khóa chính order_id)
+        result = self.execute_query(
+            """
+            SELECT t.id, t.symbol, t.side, t.quantity, t.entry_price, 
+                   t.tp1_price, t.tp2_price, t.tp3_price, t.order_id,
+                   t.tp1_order_id, t.tp2_order_id, t.tp3_order_id, t.status,
+                   t.current_sl, t.filled_at, t.created_at, o.leg
+            FROM trade_orders o
+            JOIN trades t ON t.id = o.trade_id
+            WHERE o.order_id = %s
+            """,
+            (order_id,)
+        )
+        if not result:
+            # Ánh xạ có thể chưa được ghi (register_trade_orders lỗi sau khi insert): tra các cột order id có index
+            result = self.execute_query(
+                """
+                SELECT *, 'entry' AS leg FROM trades WHERE order_id = %s
+                UNION ALL SELECT *, 'tp1' AS leg FROM trades WHERE tp1_order_id = %s
+                UNION ALL SELECT *, 'tp2' AS leg FROM trades WHERE tp2_order_id = %s
+                UNION ALL SELECT *, 'tp3' AS leg FROM trades WHERE tp3_order_id = %s
+                LIMIT 1
+                """,
+                (order_id,) * 4
+            )
+            if result:
+                self.register_trade_orders(result[0]['id'], {result[0]['leg']: order_id})
+
+        if not result:
+            # Lệnh vừa đặt có thể chưa được ánh xạ: entry được insert sau place_order, TP1/TP2
+            # (reduce-only) được ghi sau khi place_orders_batch trả về nên có thể khớp trước đó.
+            # Lệnh cũ hơn cửa sổ thử lại (đóng vị thế, lệnh tay) không thuộc giao dịch nào
+            created_ms = int(order.get('createdTime') or 0)
+            age = time.time() - created_ms / 1000 if created_ms else None
+            if age is None or age > self.order_event_retry_window:
+                logger.info(f"No trade found for order_id {order_id}, ignored")
+                return True
+            logger.info(f"No trade found for order_id {order_id}, retrying")
+            return False
+            
+        trade = result[0]
+        trade_id = trade['id']
+        print("trade_id", trade)
+
+        if order_id == trade['order_id']:
+            if status in OrderMirror.ACTIVE_STATUSES:
+                # Lệnh entry đặt từ tiến trình khác (signal_worker) chỉ được đưa vào hàng đợi hết hạn ở đây
+                if trade['status'] == 'OPEN':
+                    self.order_expiry.add(trade_id, order_id, symbol, created_at=trade['created_at'])
+            else:
+                # Lệnh entry đã khớp hoặc bị hủy, không còn cần hết hạn
+                self.order_expiry.remove(trade_id)
+        
+        if status == 'Filled':
+            if order_id == trade['order_id']:
+                if trade['filled_at'] is not None:
+                    logger.info(f"Trade {trade_id}: Order {order_id} already processed as FILLED")
+                    return True
+                
+                # Lệnh chính (entry) đã khớp
+                filled_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                self.execute_query(
+                    "UPDATE trades SET status = %s, filled_at = %s WHERE id = %s",
+                    ('FILLED', filled_time, trade_id),
+                    commit=True
+                )
+                self.cache_trade_update(trade_id, {'status': 'FILLED', 'filled_at': filled_time})
+                logger.info(f"Trade {trade_id}: Order {order_id} filled")
+
+                # Đặt lệnh TP1, TP2, TP3
+                position_idx = 1 if side == 'Buy' else 2
+                tp_result = self.place_tp_orders(
+                    trade_id=trade_id,
+                    symbol=symbol,
+                    side=side,
+                    quantity=float(trade['quantity']),
+                    tp1_price=float(trade['tp1_price']),
+                    tp2_price=float(trade['tp2_price']),
+                    tp3_price=float(trade['tp3_price']),
+                    position_idx=position_idx,
+                    entry_price=float(trade['entry_price'])
+                )
+                logger.info(f"TP orders placed for trade {trade_id}: {tp_result}")
+                return True
+
+            elif order_id == trade['tp1_order_id'] and trade['current_sl'] != trade['entry_price'] and trade['status'] == 'FILLED':
+                # TP1 đã khớp, dời stoploss lên entry price
+                self.apply_tp_fill(trade, 'TP1_HIT', trade['tp1_price'], trade['entry_price'])
+                return True
+
+            elif order_id == trade['tp2_order_id'] and trade['status'] == 'TP1_HIT' and trade['current_sl'] != trade['tp1_price']:
+                # TP2 đã khớp, dời stoploss lên TP1
+                self.apply_tp_fill(trade, 'TP2_HIT', trade['tp2_price'], trade['tp1_price'])
+                return True
+
+        elif status == 'Cancelled' and trade['order_id'] == order_id:
+            # Xử lý lệnh bị hủy
+            self.execute_query(
+                "UPDATE trades SET status = %s WHERE id = %s",
+                ('CANCELLED', trade_id),
+                commit=True
+            )
+            self.cache_trade_update(trade_id, {'status': 'CANCELLED'})
+            logger.info(f"Trade {trade_id}: Order {order_id} cancelled")
+        return True
+
     def start_websocket(self):
         """Khởi động WebSocket để theo dõi giá và trạng thái lệnh."""
         try:
@@ -1439,143 +3779,34 @@ class TradingBot:
                 try:
                     data = msg.get('data', [])
                     print("data order", data)
+
+                    # Cập nhật bản sao lệnh trước khi xử lý trạng thái giao dịch
+                    for order in data:
+                        if order.get('category', 'linear') == 'linear':
+                            self.order_mirror.upsert(order)
+                            self._ensure_mirror_positions(order.get('symbol'))
                     
                     for order in data:
-                        order_id = order.get('orderId')
-                        status = order.get('orderStatus')
-                        symbol = order.get('symbol')
-                        side = order.get('side')
-                        orderStoploss = order.get('stopOrderType')
-                        time.sleep(15)
-                        result = self.execute_query(
-                            """
-                            SELECT id, symbol, side, quantity, entry_price, 
-                                   tp1_price, tp2_price, tp3_price, order_id,
-                                   tp1_order_id, tp2_order_id, tp3_order_id, status,
-                                   current_sl, filled_at
-                            FROM trades
-                            WHERE order_id = %s 
-                               OR tp1_order_id = %s 
-                               OR tp2_order_id = %s 
-                               OR tp3_order_id = %s
-                            """,
-                            (order_id, order_id, order_id, order_id)
-                        )
-
-                        trade_order_id = None
-
-                        if result:
-                            trade = result[0]
-                            trade_order_id = trade['order_id']
-
-                        # Xử lý stop loss
-                        if orderStoploss == 'StopLoss' and order_id == trade_order_id:
-                            self.execute_query(
-                                """
-                                UPDATE trades 
-                                SET status = %s 
-                                WHERE symbol = %s 
-                                AND status != 'CANCELLED' 
-                                AND status != 'STOPLOSS'
-                                """,
-                                ('STOPLOSS', symbol),
-                                commit=True
-                            )
-                            continue
-                        
-                        # Xử lý take profit
-                        if orderStoploss == 'TakeProfit' and order_id == trade_order_id:
-                            self.execute_query(
-                                """
-                                UPDATE trades 
-                                SET status = %s 
-                                WHERE symbol = %s 
-                                AND status != 'CANCELLED' 
-                                AND status != 'TAKEPROFIT'
-                                """,
-                                ('TAKEPROFIT', symbol),
-                                commit=True
-                            )
-                            continue
-                        
-                        # Lấy thông tin trade từ database
-                       
-                        
-                        if not result:
-                            logger.info(f"No trade found for order_id {order_id}")
-                            continue
-                            
-                        trade = result[0]
-                        trade_id = trade['id']
-                        print("trade_id", trade)
-                        
-                        if status == 'Filled':
-                            if order_id == trade['order_id']:
-                                if trade['filled_at'] is not None:
-                                    logger.info(f"Trade {trade_id}: Order {order_id} already processed as FILLED")
-                                    continue
-                                
-                                # Lệnh chính (entry) đã khớp
-                                filled_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                                self.execute_query(
-                                    "UPDATE trades SET status = %s, filled_at = %s WHERE id = %s",
-                                    ('FILLED', filled_time, trade_id),
-                                    commit=True
-                                )
-                                logger.info(f"Trade {trade_id}: Order {order_id} filled")
-
-                                # Đặt lệnh TP1, TP2, TP3
-                                position_idx = 1 if side == 'Buy' else 2
-                                tp_result = self.place_tp_orders(
-                                    trade_id=trade_id,
-                                    symbol=symbol,
-                                    side=side,
-                                    quantity=float(trade['quantity']),
-                                    tp1_price=float(trade['tp1_price']),
-                                    tp2_price=float(trade['tp2_price']),
-                                    tp3_price=float(trade['tp3_price']),
-                                    position_idx=position_idx,
-                                    entry_price=float(trade['entry_price'])
-                                )
-                                logger.info(f"TP orders placed for trade {trade_id}: {tp_result}")
-                                continue
-
-                            elif order_id == trade['tp1_order_id'] and trade['current_sl'] != trade['entry_price'] and trade['status'] == 'FILLED':
-                                # TP1 đã khớp, dời stoploss lên entry price
-                                self.update_stoploss(trade_id, trade['entry_price'])
-                                self.execute_query(
-                                    "UPDATE trades SET status = %s, current_tp = %s WHERE id = %s",
-                                    ('TP1_HIT', trade['tp1_price'], trade_id),
-                                    commit=True
-                                )
-                                logger.info(f"Trade {trade_id}: TP1 hit, SL moved to {trade['entry_price']}")
-                                continue
-
-                            elif order_id == trade['tp2_order_id'] and trade['status'] == 'TP1_HIT' and trade['current_sl'] != trade['tp1_price']:
-                                # TP2 đã khớp, dời stoploss lên TP1
-                                self.update_stoploss(trade_id, trade['tp1_price'])
-                                self.execute_query(
-                                    "UPDATE trades SET status = %s, current_tp = %s WHERE id = %s",
-                                    ('TP2_HIT', trade['tp2_price'], trade_id),
-                                    commit=True
-                                )
-                               
-                                logger.info(f"Trade {trade_id}: TP2 hit, SL moved to {trade['tp1_price']}")
-                                continue
-
-                        elif status == 'Cancelled' and trade['order_id'] == order_id:
-                            # Xử lý lệnh bị hủy
-                            self.execute_query(
-                                "UPDATE trades SET status = %s WHERE id = %s",
-                                ('CANCELLED', trade_id),
-                                commit=True
-                            )
-                            logger.info(f"Trade {trade_id}: Order {order_id} cancelled")
-
+                        self.order_dispatcher.submit(order)
                 except Exception as e:
                     logger.error(f"Error in order WebSocket: {str(e)}")
 
+            def handle_position_message(msg):
+                try:
+                    for position in msg.get('data', []):
+                        if position.get('category', 'linear') == 'linear':
+                            self.order_mirror.update_position(position)
+                            self.account_state.update_from_position(position)
+                except Exception as e:
+                    logger.error(f"Error in position WebSocket: {str(e)}")
+
+            self.order_dispatcher.start()
             self.ws_private.order_stream(callback=handle_order_message)
+            self.ws_private.position_stream(callback=handle_position_message)
+
+            # Nạp snapshot sau khi đã đăng ký stream để không bỏ sót sự kiện
+            self.seed_order_mirror()
+            self.position_manager.start(self.load_live_trades())
 
             logger.info("WebSocket started")
             while self.running:
@@ -1642,68 +3873,189 @@ class TradingBot:
             # Đánh dấu để chắc chắn các tài nguyên đã được giải phóng
             print(1234)
             self.running = False
-    def check_and_cancel_old_orders(self):
-        # Thời điểm hiện tại
-            current_time = datetime.now()
-            # Thời điểm 30 phút trước
-            thirty_minutes_ago = current_time - timedelta(minutes=60)
-
-            # Truy vấn các giao dịch có trạng thái OPEN và được tạo trước 30 phút
-            query = """
-                SELECT id, order_id, symbol, created_at, status
-                FROM trades
-                WHERE status = 'OPEN'
-                AND created_at <= %s
+    def cancel_orders_batch(self, symbol: str, order_ids: List[str]) -> List[str]:
+        """
+        Hủy nhiều lệnh của một symbol bằng cancel_batch_order, mỗi request tối đa 10 lệnh.
+
+        Nếu cả batch thất bại thì hủy từng lệnh qua _run_concurrently (tuần tự khi đang chạy trên
+        exchange_executor, như trong cancel_stale_trades).
+
+        Returns:
+            List[str]: orderId của các lệnh đã hủy thành công
+        """
+        cancelled = []
+        for start in range(0, len(order_ids), 10):
+            chunk = order_ids[start:start + 10]
+            try:
+                response = self.client.cancel_batch_order(
+                    category='linear',
+                    request=[{'symbol': symbol, 'orderId': order_id} for order_id in chunk]
+                )
+                if response.get('retCode') == 0:
+                    results = response.get('result', {}).get('list', [])
+                    infos = response.get('retExtInfo', {}).get('list', [])
+                    for index, order_id in enumerate(chunk):
+                        info = infos[index] if index < len(infos) else {}
+                        result = results[index] if index < len(results) else {}
+                        if info.get('code', 0) == 0 and result.get('orderId'):
+                            cancelled.append(order_id)
+                        else:
+                            logger.warning(f"Batch cancel of {order_id} for {symbol} rejected: {info.get('msg', 'Unknown error')}")
+                    continue
+                logger.warning(f"Batch cancel failed for {symbol}, falling back to single cancels: {response.get('retMsg', 'Unknown error')}")
+            except Exception as e:
+                logger.warning(f"Batch cancel failed for {symbol}, falling back to single cancels: {str(e)}")
+
+            responses = self._run_concurrently([(self.cancel_order, symbol, order_id) for order_id in chunk])
+            cancelled.extend(
+                order_id for order_id, response in zip(chunk, responses)
+                if isinstance(response, dict) and response.get('retCode', -1) == 0
+            )
+        return cancelled
+
+    def mark_trades_cancelled(self, trade_ids: List[int]) -> int:
+        """Chuyển các giao dịch còn OPEN sang CANCELLED bằng một câu UPDATE, trả về số dòng cập nhật."""
+        if not trade_ids:
+            return 0
+        now = datetime.now()
+        placeholders = ', '.join(['%s'] * len(trade_ids))
+        rows_affected = self.execute_query(
+            f"""
+            UPDATE trades
+            SET status = 'CANCELLED', closed_at = %s, updated_at = %s
+            WHERE id IN ({placeholders}) AND status = 'OPEN'
+            """,
+            (now, now) + tuple(trade_ids),
+            fetch=False,
+            commit=True
+        )
+        # Lệnh có thể vừa khớp trước khi bị hủy (status không còn OPEN), nạp lại từ database khi cần
+        for trade_id in trade_ids:
+            self.trade_cache.invalidate(trade_id)
+        return rows_affected or 0
+
+    def load_open_trades(self) -> List[Dict[str, Any]]:
+        """Các giao dịch đang chờ khớp, dùng để dựng lại hàng đợi hết hạn khi khởi động."""
+        return self.execute_query(
             """
-            print(f"Retrieved 0 trades with filters bot_name='', status='all'")
+            SELECT id, order_id, symbol, created_at
+            FROM trades
+            WHERE status = 'OPEN' AND order_id IS NOT NULL
+            """,
+            fetch=True
+        ) or []
+
+    def cancel_stale_trades(self, trades: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Hủy lệnh entry của các giao dịch quá hạn.
+
+        Lệnh được gom theo symbol và hủy bằng cancel_batch_order, các symbol chạy song song trên
+        exchange_executor; các giao dịch đã hủy được cập nhật bằng một câu UPDATE.
+        """
+        started = time.monotonic()
+        by_symbol = {}
+        trade_ids = {}
+        for trade in trades:
+            if trade['order_id']:
+                by_symbol.setdefault(trade['symbol'], []).append(trade['order_id'])
+                trade_ids[trade['order_id']] = trade['id']
+
+        results = self._run_concurrently([
+            (self.cancel_orders_batch, symbol, order_ids) for symbol, order_ids in by_symbol.items()
+        ])
+        cancelled = [
+            trade_ids[order_id]
+            for result in results if isinstance(result, list)
+            for order_id in result
+        ]
+        updated = self.mark_trades_cancelled(cancelled)
+
+        duration = time.monotonic() - started
+        stats = {
+            'stale': len(trades),
+            'symbols': len(by_symbol),
+            'cancelled': len(cancelled),
+            'updated': updated,
+            'duration_ms': round(duration * 1000, 1),
+            'cancels_per_second': round(len(cancelled) / duration, 1) if duration > 0 else 0,
+            'finished_at': datetime.now().isoformat()
+        }
+        self.cancel_job_stats = stats
+        logger.info(
+            f"Cancelled {len(cancelled)}/{len(trades)} stale orders across {len(by_symbol)} symbols "
+            f"in {stats['duration_ms']} ms ({stats['cancels_per_second']} cancels/s)"
+        )
+        return stats
+
+    def check_and_cancel_old_orders(self, max_age_minutes: int = 60) -> Dict[str, Any]:
+        """
+        Quét bảng trades và hủy các lệnh entry còn OPEN quá max_age_minutes phút.
+
+        OrderExpiryQueue hủy từng lệnh đúng hạn; lần quét này (qua index status, created_at) chạy
+        thưa để bắt các lệnh lọt khỏi hàng đợi, ví dụ lệnh hủy thất bại hoặc sự kiện New bị mất.
+        """
+        if not self.cancel_job_lock.acquire(blocking=False):
+            logger.info("check_and_cancel_old_orders already running, skipped")
+            return {}
+        try:
+            cutoff = datetime.now() - timedelta(minutes=max_age_minutes)
             trades = self.execute_query(
-                query=query,
-                params=(thirty_minutes_ago,),
+                query="""
+                    SELECT id, order_id, symbol, created_at, status
+                    FROM trades
+                    WHERE status = 'OPEN'
+                    AND created_at <= %s
+                """,
+                params=(cutoff,),
                 fetch=True,
                 commit=False
             )
-
-            print(f"Retrieved {len(trades) if trades else 0} trades with filters bot_name='', status='all'")
-
             if not trades:
-                logger.info("No OPEN trades older than 30 minutes found")
-                return
+                logger.info(f"No OPEN trades older than {max_age_minutes} minutes found")
+                return {}
             for trade in trades:
-                trade_id = trade['id']
-                order_id = trade['order_id']
-                symbol = trade['symbol']
-                try:
-                    # Hủy lệnh trên Bybit
-                    cancel_response = self.cancel_order(symbol, order_id)
-                    if cancel_response.get('retCode', -1) == 0:
-                        # Cập nhật trạng thái giao dịch trong cơ sở dữ liệu
-                        self.update_trade_status(trade_id, 'CANCELLED', datetime.now())
-                       
-                except Exception as e:
-                    logger.error(f"Error processing trade {trade_id}: {str(e)}")
+                self.order_expiry.remove(trade['id'])
+            return self.cancel_stale_trades(trades)
+        except Exception as e:
+            logger.error(f"Error in check_and_cancel_old_orders: {str(e)}", exc_info=True)
+            return {'error': str(e)}
+        finally:
+            self.cancel_job_lock.release()
+
     def schedule_jobs(self):
-        """Lên lịch các công việc định kỳ."""
-        schedule.every(10).minutes.do(self.check_and_cancel_old_orders)
-        logger.info("Scheduled job to check and cancel old orders every 5 minutes")
+        """
+        Đăng ký các công việc định kỳ; có thể thêm công việc khác lúc đang chạy qua self.scheduler.
 
-    def run_scheduled_jobs(self):
-        """Chạy các công việc định kỳ trong một luồng riêng."""
-        logger.info("Starting run_scheduled_jobs")
-        while self.running:
-            try:
-                schedule.run_pending()
-                time.sleep(60)
-            except Exception as e:
-                logger.error(f"Error in run_scheduled_jobs: {str(e)}")
+        Lệnh entry quá hạn được OrderExpiryQueue hủy khi tới deadline; order_expiry_sweep chỉ là lần
+        quét dự phòng với chu kỳ dài.
+        """
+        self.scheduler.add_job(
+            'order_sync',
+            self.sync_exchange_orders,
+            interval=float(os.getenv('ORDER_SYNC_INTERVAL', 60)),
+            delay=5,
+            jitter=1
+        )
+        self.scheduler.add_job(
+            'order_expiry_sweep',
+            lambda: self.check_and_cancel_old_orders(self.order_expiry.max_age / 60),
+            interval=float(os.getenv('ORDER_EXPIRY_SWEEP_INTERVAL', 900)),
+            jitter=5
+        )
 
     def start_schedule_thread(self):
-        """Khởi động luồng riêng cho lịch trình."""
-        schedule_thread = threading.Thread(target=self.run_scheduled_jobs, daemon=True)
-        schedule_thread.start()
-        logger.info("Schedule thread started")
+        """Khởi động luồng điều phối của scheduler."""
+        self.scheduler.start()
+
     def stop_websocket(self):
         """Dừng WebSocket an toàn."""
         self.running = False
+        self.scheduler.stop()
+        self.order_expiry.stop()
+        self.order_dispatcher.stop()
+        self.position_manager.stop()
+        self.signal_executor.shutdown()
+        self.instruments.stop()
         try:
             if self.ws:
                 self.ws.exit()
@@ -1717,6 +4069,23 @@ class TradingBot:
             self.ws = None
             self.ws_private = None
             logger.info("WebSocket connections fully closed")
+    def get_metrics(self) -> Dict[str, Any]:
+        """Các chỉ số vận hành của bot."""
+        return {
+            'order_events': self.order_dispatcher.get_stats(),
+            'signals': self.signal_executor.get_stats(),
+            'rate_limits': self.rate_limiter.get_stats(),
+            'http': http_transport.get_stats(self.http_session),
+            'positions': self.position_manager.get_stats(),
+            'prices': self.prices.get_stats(),
+            'pre_trade': self.get_pre_trade_stats(),
+            'db_pool': self.get_db_pool_stats(),
+            'order_sync': self.order_sync_stats,
+            'stale_orders': self.cancel_job_stats,
+            'jobs': self.scheduler.get_stats(),
+            'order_expiry': self.order_expiry.get_stats()
+        }
+
     def safe_float(self, value, default=0.0):
         """Chuyển đổi an toàn giá trị sang float, thrtrả về giá trị mặc định nếu lỗi."""
         if value is None or value == '':
@@ -1730,6 +4099,14 @@ class TradingBot:
         """Lấy thông tin tài khoản từ Bybit."""
         try:
             response = self.client.get_wallet_balance(accountType="UNIFIED")
+            return self.parse_account_info(response)
+        except Exception as e:
+            logger.error(f"Lỗi trong get_account_info: {str(e)}", exc_info=True)
+            return {}
+
+    def parse_account_info(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        """Chuyển response get_wallet_balance thành thông tin số dư USDT."""
+        try:
             if response.get('retCode') == 0:
                 result = response.get('result', {})
                 usdt_balance = next(
@@ -1771,6 +4148,18 @@ class TradingBot:
         Returns:
             List[Dict[str, Any]]: Danh sách các vị thế với thông tin chi tiết
         """
+        try:
+            response = self.client.get_positions(
+                category="linear",  # Spot/linear/option
+                settleCoin="USDT"   # Chỉ lấy vị thế USDT
+            )
+            return self.parse_positions(response)
+        except Exception as e:
+            self.logger.error(f"Lỗi trong get_positions: {str(e)}", exc_info=True)
+            return []
+
+    def parse_positions(self, response: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Chuyển response get_positions thành danh sách vị thế đang mở."""
         def safe_float(value, default=0.0):
             """Chuyển đổi an toàn giá trị sang float"""
             if value is None or value == '':
@@ -1779,13 +4168,8 @@ class TradingBot:
                 return float(value)
             except (ValueError, TypeError):
                 return default
-                
+
         try:
-            response = self.client.get_positions(
-                category="linear",  # Spot/linear/option
-                settleCoin="USDT"   # Chỉ lấy vị thế USDT
-            )
-            
             if response.get('retCode') == 0 and 'result' in response:
                 positions = []
                 for pos in response['result'].get('list', []):